@@ -0,0 +1,662 @@
+"""Voice agent worker (LiveKit): appointment booking, lab report lookup and symptom triage.
+
+    python agent.py start
+"""
+from dotenv import load_dotenv
+load_dotenv()
+import os
+import asyncio
+import json
+import sys
+import threading
+from datetime import datetime
+import aiohttp
+from openai import AsyncOpenAI
+from livekit import agents
+from livekit.agents import Agent, AgentSession, RoomInputOptions, RunContext, function_tool
+from livekit.plugins import openai, silero, cartesia
+from livekit.plugins import noise_cancellation
+from livekit.plugins import groq
+from backends import get_storage
+from appointments import CLINIC_OPENING_TIME, CLINIC_CLOSING_TIME, nearest_free_slots, search_dates
+from io_pool import run_blocking, STORAGE_WRITE_TIMEOUT
+from report_ids import normalize_report_id, is_valid_report_id, is_legacy_report_id
+from tts_cache import PhraseAudioCache
+from telemetry import TurnMetrics, timed_tool
+from capacity import WorkerLoad, monitor_loop_lag, AGENT_LOAD_THRESHOLD, AGENT_NUM_IDLE_PROCESSES
+
+# Approximate tokens the report summary may use in the agent's context
+REPORT_LOOKUP_TOKEN_BUDGET = int(os.getenv('REPORT_LOOKUP_TOKEN_BUDGET', '300'))
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about 4 characters per token for English text)"""
+    return (len(text) + 3) // 4
+
+def format_user_reports(user_id: str, user_reports: list, token_budget: int = None) -> str:
+    """Compact report summary for the voice agent, capped at token_budget.
+
+    Lists each parameter with its value and a normal/abnormal flag, plus the
+    concerns. Abnormal parameters are listed first so they survive the cap;
+    explanations are left to explain_report_parameter.
+    """
+    if token_budget is None:
+        token_budget = REPORT_LOOKUP_TOKEN_BUDGET
+    if not user_reports:
+        return f"I couldn't find any reports for ID {user_id}. Please double-check the Report ID and try again, or contact our office for assistance."
+    
+    lines = [f"{len(user_reports)} report(s) for ID {user_id}."]
+    omitted = 0
+    for idx, report in enumerate(user_reports, 1):
+        report_lines = [f"Report {idx}: {report.get('test_type') or 'Unknown Test'}, {report.get('timestamp') or 'date not available'}"]
+        if report['concerns']:
+            report_lines.append(f"Concerns: {' | '.join(report['concerns'])}")
+        levels = sorted(report['levels'], key=lambda level: not level['abnormal'])
+        report_lines += [
+            f"- {level['name']}: {level['value']} (normal {level['reference_range'] or 'N/A'}) "
+            f"{'ABNORMAL' if level['abnormal'] else 'normal'}"
+            for level in levels
+        ]
+        for line in report_lines:
+            # Once one line doesn't fit, drop the rest so reports are never shown out of order
+            if omitted or estimate_tokens('\n'.join(lines + [line])) > token_budget:
+                omitted += 1
+            else:
+                lines.append(line)
+    if omitted:
+        lines.append(f"({omitted} more line(s) not shown; ask about a parameter by name for details.)")
+    lines.append("Use explain_report_parameter for what a parameter measures and what the patient's level means.")
+    return '\n'.join(lines)
+
+def format_parameter_explanation(user_id: str, parameter_name: str, levels: list) -> str:
+    """Full explanation of one named parameter for the voice agent"""
+    if not levels:
+        return f"No parameter called {parameter_name} was found in the reports for ID {user_id}. Check the name against the report summary."
+    
+    result = ""
+    for level in levels:
+        result += f"{level['name']}: {level['value']} (normal range: {level['reference_range'] or 'N/A'}), {'abnormal' if level['abnormal'] else 'normal'}\n"
+        if level['what_it_is']:
+            result += f"What it measures: {level['what_it_is']}\n"
+        if level['your_level_means']:
+            result += f"What the level means: {level['your_level_means']}\n"
+        if level['why_it_matters']:
+            result += f"Why it matters: {level['why_it_matters']}\n"
+        if level['possible_causes']:
+            result += f"Possible causes: {level['possible_causes']}\n"
+        result += "\n"
+    return result.strip()
+
+
+@function_tool
+@timed_tool
+async def check_appointment_availability(
+    date: str,
+    time: str
+) -> str:
+    """
+    Check if a specific date and time slot is available for booking.
+    
+    Args:
+        date: Appointment date in format YYYY-MM-DD
+        time: Appointment time in format HH:MM (24-hour format)
+    
+    Returns:
+        Availability status message
+    """
+    try:
+        if await run_blocking(get_storage().is_slot_booked, date, time):
+            return f"UNAVAILABLE: The time slot on {date} at {time} is already booked. Please choose a different date or time."
+        
+        return f"AVAILABLE: The time slot on {date} at {time} is available for booking."
+    
+    except Exception as e:
+        return f"I apologize, but I couldn't check availability at the moment: {str(e)}. Let's proceed and I'll note your preferred time."
+
+
+@function_tool
+@timed_tool
+async def find_available_slots(
+    date: str,
+    end_date: str = "",
+    preferred_time: str = "",
+    opening_time: str = CLINIC_OPENING_TIME,
+    closing_time: str = CLINIC_CLOSING_TIME,
+    count: int = 3
+) -> str:
+    """
+    Find the free appointment slots nearest a requested date and time, in one call.
+    
+    Args:
+        date: First date to search, in format YYYY-MM-DD
+        end_date: Last date to search (YYYY-MM-DD); leave empty to search the following week
+        preferred_time: Preferred time in format HH:MM (24-hour); leave empty for the earliest slots
+        opening_time: Clinic opening time, HH:MM (24-hour)
+        closing_time: Clinic closing time, HH:MM (24-hour)
+        count: Number of slots to return
+    
+    Returns:
+        The nearest free slots, closest to the requested date and time first
+    """
+    try:
+        dates = search_dates(date, end_date or None)
+        booked = await run_blocking(get_storage().booked_between, dates[0], dates[-1])
+        slots = nearest_free_slots(booked, dates, preferred_time, max(1, min(count, 10)), opening_time, closing_time)
+        if not slots:
+            return f"NO AVAILABLE SLOTS between {dates[0]} and {dates[-1]}. Ask the patient for a later date."
+        
+        return "AVAILABLE SLOTS: " + "; ".join(f"{slot_date} at {slot_time}" for slot_date, slot_time in slots)
+    
+    except ValueError as e:
+        return f"I couldn't search those dates: {str(e)}. Please use YYYY-MM-DD dates and HH:MM times."
+    except Exception as e:
+        return f"I apologize, but I couldn't search for free slots at the moment: {str(e)}. Let's try a specific date and time instead."
+
+
+@function_tool
+@timed_tool
+async def save_appointment_to_sheet(
+    name: str,
+    email: str,
+    appointment_type: str,
+    date: str,
+    time: str
+) -> str:
+    """
+    Save appointment details after confirming availability.
+    
+    Args:
+        name: Patient's full name
+        email: Patient's email address
+        appointment_type: Type of appointment (e.g., "General Checkup", "Physical", "Consultation")
+        date: Appointment date in format YYYY-MM-DD
+        time: Appointment time in format HH:MM
+    
+    Returns:
+        Confirmation message
+    """
+    try:
+        booked = await run_blocking(get_storage().book_appointment, {
+            'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'name': name,
+            'email': email,
+            'appointment_type': appointment_type,
+            'date': date,
+            'time': time,
+        }, timeout=STORAGE_WRITE_TIMEOUT)
+        if not booked:
+            return f"ERROR: This time slot was just booked by someone else. Please choose a different time."
+        
+        return f"Appointment successfully booked for {name} on {date} at {time}. Confirmation will be sent to {email}."
+    
+    except TimeoutError:
+        # The save keeps running in the background and usually completes; booking again would double-book
+        return f"PENDING: The booking for {name} on {date} at {time} is still being saved. Do not book it again. Tell the patient it is being processed and a confirmation will be sent to {email}."
+    except Exception as e:
+        return f"I apologize, but there was an error saving your appointment: {str(e)}. Please contact our office directly."
+
+
+@function_tool
+@timed_tool
+async def lookup_user_reports(
+    user_id: str
+) -> str:
+    """
+    Look up a compact summary of all medical reports for a specific user.
+    
+    Args:
+        user_id: The Report ID the patient read out (7 letters and digits, e.g. "7K3M9QX")
+    
+    Returns:
+        Each parameter with its value and a normal/abnormal flag, plus concerns, or an error message
+    """
+    try:
+        report_id = normalize_report_id(user_id)
+        if not (is_valid_report_id(report_id) or is_legacy_report_id(report_id)):
+            return f"The Report ID {user_id} doesn't look right. Report IDs are 7 letters and numbers; please ask the patient to read it again, one character at a time."
+        
+        return await run_blocking(get_storage().lookup_reports, report_id, format_user_reports)
+        
+    except Exception as e:
+        return f"I apologize, but I encountered an error retrieving your reports: {str(e)}. Please try again or contact our office for assistance."
+
+
+@function_tool
+@timed_tool
+async def explain_report_parameter(
+    user_id: str,
+    parameter_name: str
+) -> str:
+    """
+    Get the detailed explanation of one test parameter from a patient's report.
+    
+    Args:
+        user_id: The Report ID the patient read out
+        parameter_name: Parameter name exactly as listed by lookup_user_reports (e.g. "Hemoglobin")
+    
+    Returns:
+        What the parameter measures, what the patient's level means, why it matters and possible causes
+    """
+    try:
+        report_id = normalize_report_id(user_id)
+        if not (is_valid_report_id(report_id) or is_legacy_report_id(report_id)):
+            return f"The Report ID {user_id} doesn't look right. Report IDs are 7 letters and numbers; please ask the patient to read it again, one character at a time."
+        
+        levels = await run_blocking(get_storage().get_parameter, report_id, parameter_name)
+        return format_parameter_explanation(report_id, parameter_name, levels)
+        
+    except Exception as e:
+        return f"I apologize, but I encountered an error retrieving that result: {str(e)}. Please try again or contact our office for assistance."
+
+
+# Phrases spoken word for word, so their audio can be synthesized once and cached
+GREETING = "Hello! I'm Luna, your hospital assistant. I can help you book an appointment, explain your lab report, or discuss any symptoms you're experiencing. What would you like help with today?"
+EMERGENCY_REFERRAL = "I understand this is concerning. Based on what you've described, I strongly recommend going to the emergency room immediately or calling emergency services. This needs urgent medical attention. Would you like me to help arrange anything?"
+# Optional JSON list of further phrases to pre-synthesize
+TTS_PHRASES_FILE = os.getenv('TTS_PHRASES_FILE')
+
+def load_canned_phrases() -> list:
+    phrases = [GREETING, EMERGENCY_REFERRAL]
+    if TTS_PHRASES_FILE:
+        try:
+            with open(TTS_PHRASES_FILE, 'r', encoding='utf-8') as f:
+                phrases += [str(text) for text in json.load(f)]
+        except (OSError, ValueError) as e:
+            print(f"Error reading {TTS_PHRASES_FILE}: {str(e)}")
+    return phrases
+
+CANNED_PHRASES = load_canned_phrases()
+
+# Shared by every agent; each flow agent adds only its own section below
+COMMON_INSTRUCTIONS = """
+# Hospital Assistant - Luna
+
+## Core Identity
+You are Luna, a warm and professional hospital assistant. You help patients with appointment booking, lab report explanations and initial symptom assessment.
+
+## Response Style
+- Be warm, empathetic, and professional
+- Use a conversational, natural tone
+- Keep responses brief (1-3 sentences) for smooth voice interaction
+- Use natural filler words occasionally like "Great", "Perfect", "Wonderful", "I understand"
+- Ask ONE question at a time - don't rush
+- Acknowledge information before moving forward
+
+## Switching Topics
+- If the patient asks for something outside your current task, call the matching transfer tool straight away without announcing it
+
+## Error Handling
+- If tools return errors, apologize warmly and offer to help manually
+- Stay calm and helpful even with technical issues
+- For medical advice, always prioritize patient safety
+"""
+
+ROUTER_INSTRUCTIONS = """
+## Your Task
+Find out what the patient needs, then hand over:
+- Booking an appointment: call transfer_to_booking
+- Understanding a lab report or test results: call transfer_to_lab_reports
+- Symptoms, feeling unwell, or whether to come in: call transfer_to_triage
+"""
+
+BOOKING_INSTRUCTIONS = """
+## APPOINTMENT BOOKING
+
+### Information to Collect (in order):
+1. **Full Name** - Patient's complete name
+2. **Email Address** - Valid email for confirmation
+3. **Appointment Type** - Choose from:
+   - General Checkup
+   - Physical Examination
+   - Specialist Consultation
+   - Follow-up Visit
+   - Other (ask them to specify)
+4. **Preferred Date** - In format like "December 15, 2024" or "15th December"
+5. **Preferred Time** - In format like "2:30 PM" or "14:30"
+
+### Booking Flow:
+1. **Name**: Ask for their name (skip anything they already told you)
+2. **Email**: After confirming name, ask for email
+3. **Appointment Type**: Ask what type of appointment they need
+4. **Date**: Ask for their preferred date
+5. **Time**: Ask for their preferred time
+6. **Check Availability**: Use check_appointment_availability tool to verify the slot is free
+   - If UNAVAILABLE: Call find_available_slots with the same date and time, then offer the patient the nearest options in one reply
+   - If the patient is flexible or asks what's free, use find_available_slots directly
+   - If AVAILABLE: Proceed to confirmation
+7. **Confirmation**: Summarize ALL details and ask for final confirmation
+8. **Save**: Once confirmed, use save_appointment_to_sheet tool to book
+
+### Important Guidelines:
+- Always validate email format (contains @ and domain)
+- For dates, accept natural language but convert to YYYY-MM-DD format for tools
+- For times, accept 12-hour or 24-hour format, convert to HH:MM (24-hour) for tools
+- **CRITICAL**: After collecting date and time, IMMEDIATELY use check_appointment_availability
+- Only call save_appointment_to_sheet AFTER getting explicit confirmation AND verifying availability
+"""
+
+LAB_REPORT_INSTRUCTIONS = """
+## LAB REPORT EXPLANATIONS
+
+### Flow:
+1. **Ask for Report ID**: "I'd be happy to help explain your lab report. May I have your Report ID?"
+   - Report IDs are 7 letters and digits (e.g. "7K3M9QX"); ask them to read it one character at a time and repeat it back
+2. **Lookup Report**: Use lookup_user_reports tool with the provided ID; it returns a short summary with each value flagged normal or ABNORMAL
+3. **Explain Results**: Start with the abnormal values and concerns. Before explaining a parameter in depth, call explain_report_parameter with its name to get what it measures and what the patient's level means. Break down the report in simple, everyday language:
+   - Explain what each test measures (avoid medical jargon)
+   - Tell them what their specific numbers mean
+   - Indicate if values are in normal range
+   - Explain why each test matters for their health
+   - If there are concerns, mention them calmly and recommend discussing with their doctor
+
+### Explanation Guidelines:
+- **Use Simple Language**: Avoid medical jargon or explain it in simple terms
+  - Example: "Hemoglobin is like the delivery trucks in your blood - it carries oxygen"
+- **Be Clear About Normal vs Abnormal**: 
+  - "Your level is 14.2, which is within the normal range of 13.5-17.5"
+  - "Your level is 18.5, which is slightly above the normal range"
+- **Provide Context**: Explain why each value matters
+- **Stay Calm**: If results show concerns, be reassuring but honest
+- **Don't Diagnose**: Never diagnose conditions or prescribe treatments
+- **Recommend Doctor**: Always suggest discussing concerns with their doctor
+
+### Errors:
+- For missing reports, politely ask them to verify the ID
+"""
+
+TRIAGE_INSTRUCTIONS = """
+## INITIAL SYMPTOM ASSESSMENT
+
+### Purpose
+Provide preliminary guidance to help patients decide if they need immediate hospital care, can schedule a regular appointment, or can manage symptoms at home.
+
+### Assessment Flow:
+1. **Gather Basic Info**:
+   - What symptoms are they experiencing?
+   - When did symptoms start?
+   - How severe are the symptoms? (mild/moderate/severe)
+   - Any relevant medical history or current medications?
+   - Age of patient (if child, be more cautious)
+
+2. **Ask Clarifying Questions** based on symptoms:
+   - Fever: Temperature? How long? Other symptoms?
+   - Pain: Location? Scale 1-10? Constant or intermittent?
+   - Breathing issues: Difficulty level? Chest pain?
+   - Injury: How did it happen? Can they move the affected area?
+   - Digestive: Vomiting/diarrhea frequency? Blood present? Dehydration signs?
+
+### CRITICAL - IMMEDIATE HOSPITAL VISIT REQUIRED:
+If patient reports ANY of these, immediately advise going to hospital/emergency:
+- **Severe chest pain or pressure**
+- **Difficulty breathing or shortness of breath**
+- **Severe allergic reaction (swelling face/throat, difficulty breathing)**
+- **Uncontrolled bleeding**
+- **Signs of stroke (facial drooping, arm weakness, speech difficulty)**
+- **Severe head injury or loss of consciousness**
+- **High fever in infant under 3 months**
+- **Severe abdominal pain**
+- **Suicidal thoughts or severe mental health crisis**
+- **Suspected broken bones with deformity**
+- **Severe burns**
+- **Poisoning or overdose**
+
+**Response**: Call refer_to_emergency, which reads the standard emergency advice aloud. Don't repeat the advice yourself; wait for the patient's answer.
+
+### RECOMMEND SCHEDULING APPOINTMENT:
+For moderate symptoms that need medical attention but aren't emergencies:
+- Persistent fever (2-3 days) without improvement
+- Moderate pain that's manageable but concerning
+- Symptoms that are worsening gradually
+- New symptoms that need diagnosis
+- Follow-up needed for existing condition
+
+**Response**: "Based on your symptoms, I think it would be best to have a doctor examine you. It's not an emergency, but you should be seen soon. Would you like me to help you book an appointment?"
+
+### HOME CARE SUGGESTIONS:
+For mild symptoms that can be managed at home:
+- Common cold/flu with mild symptoms
+- Minor headaches
+- Mild fever in adults (under 102°F/39°C)
+- Minor cuts/scrapes
+- Mild indigestion
+- Muscle soreness from activity
+
+**Response format**:
+1. Acknowledge their concern
+2. Explain why home care is appropriate
+3. Provide 2-3 simple care suggestions
+4. Give clear signs to watch for that would require medical attention
+5. Offer to book appointment if symptoms don't improve
+
+**Example**: "It sounds like you have a common cold. For mild symptoms like this, home care usually works well. I'd suggest: getting plenty of rest, drinking lots of water, and you can take over-the-counter pain relievers if needed. If your fever goes above 102°F, symptoms last more than a week, or you have difficulty breathing, please come in to see us. Would you like me to note anything else?"
+
+### Important Safety Guidelines:
+- **Never diagnose** - Only provide guidance on urgency level
+- **When in doubt, err on the side of caution** - Suggest appointment or hospital visit
+- **Be especially careful with**:
+  - Children (lower threshold for recommending visit)
+  - Elderly patients (higher risk)
+  - Pregnant women (many symptoms need medical attention)
+  - Patients with chronic conditions (diabetes, heart disease, etc.)
+- **Always provide a safety net**: Tell them signs to watch for that would require coming in
+- **Don't recommend specific medications** - Only suggest they "can take over-the-counter medication if appropriate"
+- **Document conversation**: Mention they should call back or come in if anything changes
+
+### After Assessment:
+- If recommending hospital visit: Ask if they need help with anything
+- If recommending appointment: Offer to book immediately, then call transfer_to_booking
+- If suggesting home care: Remind them they can call back anytime if concerned
+
+## Remember
+- You're providing triage guidance, not medical diagnosis
+- Patient safety is the top priority
+- When uncertain, always recommend professional medical evaluation
+- Be warm and reassuring while being medically responsible
+"""
+
+
+class RouterAgent(Agent):
+    """Greets the caller and hands off to the agent for their request"""
+
+    def __init__(self, chat_ctx=None):
+        super().__init__(
+            instructions=COMMON_INSTRUCTIONS + ROUTER_INSTRUCTIONS,
+            tools=[transfer_to_booking, transfer_to_lab_reports, transfer_to_triage],
+            chat_ctx=chat_ctx,
+        )
+
+
+class FlowAgent(Agent):
+    """Agent for one flow; picks up the conversation where the previous agent left it"""
+
+    async def on_enter(self):
+        self.session.generate_reply()
+
+
+class BookingAgent(FlowAgent):
+    def __init__(self, chat_ctx=None):
+        super().__init__(
+            instructions=COMMON_INSTRUCTIONS + BOOKING_INSTRUCTIONS,
+            tools=[check_appointment_availability, find_available_slots, save_appointment_to_sheet,
+                   transfer_to_lab_reports, transfer_to_triage],
+            chat_ctx=chat_ctx,
+        )
+
+
+class LabReportAgent(FlowAgent):
+    def __init__(self, chat_ctx=None):
+        super().__init__(
+            instructions=COMMON_INSTRUCTIONS + LAB_REPORT_INSTRUCTIONS,
+            tools=[lookup_user_reports, explain_report_parameter,
+                   transfer_to_booking, transfer_to_triage],
+            chat_ctx=chat_ctx,
+        )
+
+
+class TriageAgent(FlowAgent):
+    def __init__(self, chat_ctx=None):
+        super().__init__(
+            instructions=COMMON_INSTRUCTIONS + TRIAGE_INSTRUCTIONS,
+            tools=[refer_to_emergency, transfer_to_booking, transfer_to_lab_reports],
+            chat_ctx=chat_ctx,
+        )
+
+
+def handoff_context(context: RunContext):
+    """Conversation so far, carried over to the next agent (its instructions replace the old ones)"""
+    return context.session.current_agent.chat_ctx.copy(exclude_instructions=True)
+
+
+@function_tool
+async def transfer_to_booking(context: RunContext):
+    """Hand the conversation to the appointment booking assistant. Call when the patient wants to book an appointment."""
+    return BookingAgent(chat_ctx=handoff_context(context))
+
+
+@function_tool
+async def transfer_to_lab_reports(context: RunContext):
+    """Hand the conversation to the lab report assistant. Call when the patient wants their lab report or test results explained."""
+    return LabReportAgent(chat_ctx=handoff_context(context))
+
+
+@function_tool
+async def transfer_to_triage(context: RunContext):
+    """Hand the conversation to the symptom assessment assistant. Call when the patient describes symptoms or asks whether to come in."""
+    return TriageAgent(chat_ctx=handoff_context(context))
+
+
+# Cartesia voice settings; together they key the cached phrase audio
+TTS_MODEL = "sonic-english"
+TTS_VOICE = "a0e99841-438c-4a64-b679-ae501e7d6091"  # Warm British Lady
+TTS_SPEED = 1.0
+TTS_EMOTION = ["positivity:high", "curiosity:high"]
+
+phrase_cache = PhraseAudioCache(f"cartesia:{TTS_MODEL}:{TTS_VOICE}:{TTS_SPEED}:{','.join(TTS_EMOTION)}")
+
+def build_tts(http_session: aiohttp.ClientSession = None):
+    return cartesia.TTS(
+        model=TTS_MODEL,
+        voice=TTS_VOICE,
+        speed=TTS_SPEED,
+        emotion=TTS_EMOTION,
+        http_session=http_session,
+    )
+
+async def render_canned_phrases():
+    """Synthesize the canned phrases missing from the disk cache (outside a job, so with our own HTTP session)"""
+    async with aiohttp.ClientSession() as http_session:
+        await phrase_cache.render(build_tts(http_session), CANNED_PHRASES)
+
+def say_phrase(session: AgentSession, text: str):
+    """Speak text from cached audio when we have it; otherwise synthesize it once, playing and caching the same audio"""
+    if phrase_cache.get(text) is not None:
+        return session.say(text, audio=phrase_cache.audio(text))
+    return session.say(text, audio=phrase_cache.record(session.tts, text))
+
+@function_tool
+@timed_tool
+async def refer_to_emergency(context: RunContext) -> str:
+    """
+    Tell the patient to go to the emergency room now. Call as soon as any emergency warning sign is mentioned.
+    
+    Returns:
+        Confirmation that the advice was spoken
+    """
+    say_phrase(context.session, EMERGENCY_REFERRAL)
+    return "The emergency advice has been read to the patient word for word. Wait for their answer and help with anything they need."
+
+# Groq serves both speech-to-text and the LLM, so they can share one connection pool
+GROQ_BASE_URL = os.getenv('GROQ_BASE_URL', 'https://api.groq.com/openai/v1')
+# Seconds the background connection warmup may take before it is abandoned
+WARMUP_TIMEOUT = float(os.getenv('WARMUP_TIMEOUT', '5'))
+
+def prewarm(proc: agents.JobProcess):
+    """Load per-process resources once, before this process is handed a job"""
+    proc.userdata['vad'] = silero.VAD.load()
+    if phrase_cache.load(CANNED_PHRASES) and os.getenv('CARTESIA_API_KEY'):
+        # No job event loop exists yet, so run the synthesis to completion here
+        try:
+            asyncio.run(render_canned_phrases())
+        except Exception as e:
+            print(f"Error pre-synthesizing canned phrases: {str(e)}")
+    # Retries are left to the LiveKit plugins, as with the clients they build themselves
+    proc.userdata['groq_client'] = AsyncOpenAI(
+        api_key=os.getenv('GROQ_API_KEY'), base_url=GROQ_BASE_URL, max_retries=0
+    )
+    # Each job runs in a fresh process; load the store here rather than on the caller's first tool use.
+    # In the background, so a slow sheet never holds up process startup; early tool calls join the load
+    threading.Thread(target=warm_storage, name='storage-warmup', daemon=True).start()
+
+def warm_storage():
+    try:
+        get_storage().warm()
+    except Exception as e:
+        print(f"Error loading storage: {str(e)}")
+
+async def warm_connections(groq_client: AsyncOpenAI, tts):
+    """Open the Groq and Cartesia connections while the room connects and the greeting plays"""
+    tts.prewarm()
+    try:
+        await asyncio.wait_for(groq_client.models.list(), timeout=WARMUP_TIMEOUT)
+    except asyncio.TimeoutError:
+        print(f"Groq connection warmup timed out after {WARMUP_TIMEOUT:g}s")
+    except Exception as e:
+        print(f"Error warming Groq connection: {str(e)}")
+
+async def entrypoint(ctx: agents.JobContext):
+    lag_monitor = asyncio.create_task(monitor_loop_lag())
+    groq_client = ctx.proc.userdata['groq_client']
+    tts = build_tts()
+    warmup = asyncio.create_task(warm_connections(groq_client, tts))
+    
+    async def stop_background_tasks():
+        lag_monitor.cancel()
+        warmup.cancel()
+    ctx.add_shutdown_callback(stop_background_tasks)
+    
+    session = AgentSession(
+        stt=openai.STT.with_groq(model="whisper-large-v3", language="en", client=groq_client),
+        llm=groq.LLM(model="llama-3.3-70b-versatile", client=groq_client),
+        tts=tts,
+        vad=ctx.proc.userdata['vad'],
+    )
+    
+    turn_metrics = TurnMetrics()
+    
+    @session.on("metrics_collected")
+    def on_metrics_collected(ev):
+        turn_metrics.record(ev.metrics)
+    
+    await session.start(
+        room=ctx.room,
+        agent=RouterAgent(),
+        room_input_options=RoomInputOptions(
+            close_on_disconnect=False,
+            noise_cancellation=noise_cancellation.BVCTelephony(),
+        ),
+    )
+    
+    # The warmup keeps running in the background; the caller should hear the greeting at once
+    await say_phrase(session, GREETING)
+
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == 'download-files':
+        if os.getenv('CARTESIA_API_KEY'):
+            asyncio.run(render_canned_phrases())
+        else:
+            print("CARTESIA_API_KEY not set; canned phrases will be synthesized when workers start")
+    
+    agents.cli.run_app(
+        agents.WorkerOptions(
+            entrypoint_fnc=entrypoint,
+            prewarm_fnc=prewarm,
+            load_fnc=WorkerLoad(),
+            load_threshold=AGENT_LOAD_THRESHOLD,
+            num_idle_processes=AGENT_NUM_IDLE_PROCESSES,
+            initialize_process_timeout=60,
+        )
+    )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+
+ANALYSIS_CACHE_DIR = os.getenv('ANALYSIS_CACHE_DIR', '.analysis_cache')
+# Total size of cached results on disk before least recently used entries are evicted
+ANALYSIS_CACHE_MAX_BYTES = int(os.getenv('ANALYSIS_CACHE_MAX_BYTES', str(256 * 1024 * 1024)))
+# Set to 0 to always call the model
+ANALYSIS_CACHE_ENABLED = os.getenv('ANALYSIS_CACHE_ENABLED', '1') == '1'
+
+
+class AnalysisCache:
+    """Disk cache of report analyses keyed by the SHA-256 of the uploaded image.
+
+    The key also covers how the image was prepared for the model and a
+    version string (prompt, model and schema), so changing any of them
+    naturally misses old entries. Entries are JSON files whose mtime marks
+    their last use; once the directory grows past max_bytes the least
+    recently used ones are evicted, whichever process wrote them. Hit/miss counters and the model time and tokens that hits saved
+    are kept in stats.db in the same directory, so they cover every API worker
+    process using it.
+    """
+
+    def __init__(self, version: str, directory: str = ANALYSIS_CACHE_DIR,
+                 max_bytes: int = ANALYSIS_CACHE_MAX_BYTES, enabled: bool = ANALYSIS_CACHE_ENABLED):
+        self.version = version
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def key(self, image_sha256: str, variant: str = '') -> str:
+        return hashlib.sha256(f"{self.version}:{image_sha256}:{variant}".encode('utf-8')).hexdigest()
+
+    def get(self, key: str):
+        """Return the cached payload dict for key, or None"""
+        if not self.enabled:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                payload = json.load(f)
+            os.utime(path)
+        except (FileNotFoundError, ValueError):
+            self._count(misses=1)
+            return None
+        self._count(hits=1, model_seconds=payload.get('model_seconds', 0.0), tokens=payload.get('total_tokens', 0))
+        return payload
+
+    def set(self, key: str, payload: dict):
+        """Store a JSON-serializable payload and evict old entries if over budget"""
+        if not self.enabled:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        data = json.dumps(payload).encode('utf-8')
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Error writing analysis cache entry: {str(e)}")
+            return
+        with self._lock:
+            self._evict(keep=key)
+
+    def stats(self) -> dict:
+        """Counters across every process sharing the directory, and what is on disk now"""
+        hits, misses, model_seconds_saved, tokens_saved = self._connection().execute(
+            'SELECT hits, misses, model_seconds_saved, tokens_saved FROM analysis_cache_stats'
+        ).fetchone()
+        found = self._scan()
+        lookups = hits + misses
+        return {
+            'enabled': self.enabled,
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / lookups, 4) if lookups else 0.0,
+            'entries': len(found),
+            'bytes': sum(size for _, _, size in found),
+            'max_bytes': self.max_bytes,
+            'model_seconds_saved': round(model_seconds_saved, 2),
+            'tokens_saved': tokens_saved,
+        }
+
+    def _count(self, hits: int = 0, misses: int = 0, model_seconds: float = 0.0, tokens: int = 0):
+        try:
+            self._connection().execute(
+                'UPDATE analysis_cache_stats SET hits = hits + ?, misses = misses + ?, '
+                'model_seconds_saved = model_seconds_saved + ?, tokens_saved = tokens_saved + ?',
+                (hits, misses, model_seconds, tokens)
+            )
+        except sqlite3.Error as e:
+            print(f"Error updating analysis cache stats: {str(e)}")
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(self.directory, exist_ok=True)
+            conn = sqlite3.connect(os.path.join(self.directory, 'stats.db'), timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS analysis_cache_stats (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    hits INTEGER NOT NULL DEFAULT 0,
+                    misses INTEGER NOT NULL DEFAULT 0,
+                    model_seconds_saved REAL NOT NULL DEFAULT 0,
+                    tokens_saved INTEGER NOT NULL DEFAULT 0
+                );
+                INSERT OR IGNORE INTO analysis_cache_stats (id) VALUES (1);
+            """)
+            self._local.conn = conn
+        return conn
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _scan(self) -> list:
+        """(mtime, key, size) of every entry on disk, including those other processes wrote"""
+        found = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith('.json'):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                found.append((stat.st_mtime, entry.name[:-len('.json')], stat.st_size))
+        return found
+
+    def _evict(self, keep: str):
+        """Delete least recently used entries, from every process, until the directory fits max_bytes"""
+        found = sorted(self._scan())
+        total = sum(size for _, _, size in found)
+        for _, key, size in found:
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                # Another process evicted it first
+                pass
+            total -= size
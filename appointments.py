@@ -0,0 +1,117 @@
+import os
+from datetime import date as Date, datetime, timedelta
+from sheets import SheetIndex
+
+# Seconds an availability answer may lag behind the sheet
+APPOINTMENT_INDEX_MAX_STALENESS = float(os.getenv('APPOINTMENT_INDEX_MAX_STALENESS', '30'))
+# Seconds between full re-downloads, to pick up rows edited or deleted by staff
+APPOINTMENT_INDEX_FULL_SYNC_INTERVAL = float(os.getenv('APPOINTMENT_INDEX_FULL_SYNC_INTERVAL', '900'))
+# Clinic hours (24-hour HH:MM), appointment length and the weekdays the clinic is open (0 = Monday)
+CLINIC_OPENING_TIME = os.getenv('CLINIC_OPENING_TIME', '09:00')
+CLINIC_CLOSING_TIME = os.getenv('CLINIC_CLOSING_TIME', '17:00')
+APPOINTMENT_SLOT_MINUTES = int(os.getenv('APPOINTMENT_SLOT_MINUTES', '30'))
+CLINIC_DAYS = {int(day) for day in os.getenv('CLINIC_DAYS', '0,1,2,3,4').split(',') if day.strip()}
+# Days searched when only a start date is given, and the most a range may span
+SLOT_SEARCH_DAYS = int(os.getenv('SLOT_SEARCH_DAYS', '7'))
+SLOT_SEARCH_MAX_DAYS = int(os.getenv('SLOT_SEARCH_MAX_DAYS', '31'))
+
+
+class SlotIndex(SheetIndex):
+    """In-memory index of booked (Date, Time) slots in the appointments sheet"""
+
+    def __init__(self, sheet_getter, max_staleness: float = APPOINTMENT_INDEX_MAX_STALENESS,
+                 full_sync_interval: float = APPOINTMENT_INDEX_FULL_SYNC_INTERVAL):
+        super().__init__(sheet_getter, max_staleness, full_sync_interval)
+        self._slots = {}
+
+    def is_booked(self, date: str, time_slot: str, max_staleness: float = None) -> bool:
+        """Return True if the slot is taken, syncing first if the index is too stale"""
+        self.ensure_fresh(max_staleness)
+        with self._lock:
+            return time_slot in self._slots.get(date, ())
+
+    def booked_times(self, date: str, max_staleness: float = None) -> set:
+        """Return the set of booked times on a date"""
+        self.ensure_fresh(max_staleness)
+        with self._lock:
+            return set(self._slots.get(date, ()))
+
+    def booked_between(self, start_date: str, end_date: str, max_staleness: float = None) -> dict:
+        """Return {date: set of booked times} for dates from start_date to end_date inclusive"""
+        self.ensure_fresh(max_staleness)
+        with self._lock:
+            return {d: set(times) for d, times in self._slots.items() if start_date <= d <= end_date}
+
+    def add(self, date: str, time_slot: str):
+        """Record a slot we just appended to the sheet"""
+        with self._lock:
+            self._slots.setdefault(date, set()).add(time_slot)
+
+    def _reset(self):
+        self._slots = {}
+        try:
+            self._date_col = self._header.index('Date')
+            self._time_col = self._header.index('Time')
+        except ValueError:
+            # Columns as written by save_appointment_to_sheet
+            self._date_col, self._time_col = 4, 5
+
+    def _index_row(self, row: list):
+        if len(row) > max(self._date_col, self._time_col):
+            self._slots.setdefault(row[self._date_col], set()).add(row[self._time_col])
+
+
+def parse_time(text: str):
+    """Minutes after midnight for '14:30', '9:30' or '2:30 PM'; None if unreadable"""
+    text = str(text).strip().upper().replace('.', '')
+    for fmt in ('%H:%M', '%I:%M %p', '%I:%M%p', '%I %p', '%I%p'):
+        try:
+            parsed = datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+        return parsed.hour * 60 + parsed.minute
+    return None
+
+
+def search_dates(start_date: str, end_date: str = None) -> list:
+    """ISO dates to search: start_date..end_date, or SLOT_SEARCH_DAYS from start_date; capped at SLOT_SEARCH_MAX_DAYS"""
+    start = Date.fromisoformat(start_date)
+    end = Date.fromisoformat(end_date) if end_date else start + timedelta(days=SLOT_SEARCH_DAYS - 1)
+    if end < start:
+        start, end = end, start
+    days = min((end - start).days + 1, SLOT_SEARCH_MAX_DAYS)
+    return [(start + timedelta(days=i)).isoformat() for i in range(days)]
+
+
+def nearest_free_slots(booked: dict, dates: list, preferred_time: str = None, count: int = 3,
+                       opening_time: str = CLINIC_OPENING_TIME, closing_time: str = CLINIC_CLOSING_TIME,
+                       slot_minutes: int = APPOINTMENT_SLOT_MINUTES, clinic_days: set = CLINIC_DAYS,
+                       now: datetime = None) -> list:
+    """The count free (date, 'HH:MM') slots nearest the first date and preferred time.
+
+    booked maps dates to booked times, as booked_between() returns. Slots are
+    ranked by day, then by distance from preferred_time (the opening time if
+    not given). Past slots and days the clinic is closed are skipped.
+    """
+    opening = parse_time(opening_time)
+    closing = parse_time(closing_time)
+    if opening is None or closing is None or closing <= opening:
+        raise ValueError(f"Invalid clinic hours {opening_time}-{closing_time}")
+    preferred = parse_time(preferred_time) if preferred_time else None
+    if preferred is None:
+        preferred = opening
+    now = now or datetime.now()
+
+    candidates = []
+    for day_offset, date in enumerate(dates):
+        if Date.fromisoformat(date).weekday() not in clinic_days:
+            continue
+        taken = {parse_time(t) for t in booked.get(date, ())}
+        for minute in range(opening, closing - slot_minutes + 1, slot_minutes):
+            if minute in taken:
+                continue
+            if datetime.fromisoformat(date) + timedelta(minutes=minute) <= now:
+                continue
+            candidates.append((day_offset, abs(minute - preferred), minute, date))
+    candidates.sort()
+    return [(date, f"{minute // 60:02d}:{minute % 60:02d}") for _, _, minute, date in candidates[:count]]
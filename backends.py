@@ -0,0 +1,43 @@
+import os
+import threading
+from sheets import registry as sheets_registry
+from storage import create_storage
+
+# Google Sheets Setup - Appointments
+APPOINTMENTS_SPREADSHEET_ID = os.getenv('GOOGLE_SHEET_ID')  # For appointments
+APPOINTMENTS_CREDENTIALS_FILE = os.getenv('GOOGLE_CREDENTIALS_FILE', 'credentials.json')
+
+# Google Sheets Setup - Lab Reports (different sheet and credentials)
+REPORTS_SPREADSHEET_ID = '1dB_zPHSp186qPkMLfXRhsc5ilsDJnfKMZqgtscw45js'
+REPORTS_CREDENTIALS_FILE = os.getenv('REPORTS_CREDENTIALS_FILE', 'reports_credentials.json')
+
+def get_appointments_sheets_client():
+    """Return the shared Google Sheets client for appointments"""
+    return sheets_registry.client(APPOINTMENTS_CREDENTIALS_FILE)
+
+def get_reports_sheets_client():
+    """Return the shared Google Sheets client for lab reports"""
+    return sheets_registry.client(REPORTS_CREDENTIALS_FILE)
+
+def get_appointments_google_sheet():
+    """Return the cached worksheet handle for appointments"""
+    return sheets_registry.worksheet(APPOINTMENTS_CREDENTIALS_FILE, APPOINTMENTS_SPREADSHEET_ID)
+
+def get_reports_google_sheet():
+    """Return the cached worksheet handle for lab reports"""
+    return sheets_registry.worksheet(REPORTS_CREDENTIALS_FILE, REPORTS_SPREADSHEET_ID)
+
+# Appointment and lab report store shared by the report API and the voice agent
+# (SQLite replicated to Sheets, or Sheets only). Built on first use, so processes that
+# only import this module (the agent supervisor, download-files) start no storage threads
+_storage = None
+_storage_lock = threading.Lock()
+
+def get_storage():
+    """Return this process's storage backend, creating it on first call"""
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                _storage = create_storage(get_appointments_google_sheet, get_reports_google_sheet)
+    return _storage
@@ -0,0 +1,72 @@
+"""Run a sip.py calling campaign against FakeLiveKitAPI and check its limits.
+
+    python -m benchmarks.campaign --numbers 200 --max-concurrent 20 --rate 10 --failure-rate 0.1
+
+Reports how long the campaign took, the peak number of simultaneous calls and
+the fastest dial rate seen, next to the configured limits.
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from collections import Counter
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--numbers', type=int, default=100, help='Numbers in the campaign')
+    parser.add_argument('--max-concurrent', type=int, default=10)
+    parser.add_argument('--rate', type=float, default=20.0, help='Calls per second')
+    parser.add_argument('--max-attempts', type=int, default=3)
+    parser.add_argument('--failure-rate', type=float, default=0.1, help='Share of dial attempts that fail')
+    parser.add_argument('--latency', type=float, default=0.02, help='Seconds per fake API call')
+    parser.add_argument('--call-seconds', default='0.5,2.0', help='Min,max call duration')
+    return parser.parse_args(argv)
+
+
+async def run(args):
+    import sip
+    from benchmarks.fakes import FakeLiveKitAPI
+
+    low, high = (float(x) for x in args.call_seconds.split(','))
+    fake = FakeLiveKitAPI(latency=args.latency, failure_rate=args.failure_rate, call_duration=(low, high))
+    entries = [{'phone_number': f"+1555{i:07d}", 'name': f"Patient {i}", 'reason': 'reminder'}
+               for i in range(args.numbers)]
+    results_path = os.path.join(tempfile.mkdtemp(prefix='campaign-bench-'), 'results.jsonl')
+
+    started = time.perf_counter()
+    results = await sip.run_campaign(
+        entries, fake, results_path,
+        max_concurrent=args.max_concurrent,
+        calls_per_second=args.rate,
+        max_attempts=args.max_attempts,
+        max_backoff=0.5,
+        poll_interval=0.1,
+        max_duration=high * 2,
+    )
+    elapsed = time.perf_counter() - started
+
+    with open(results_path, 'r', encoding='utf-8') as f:
+        logged = [json.loads(line) for line in f]
+    gaps = [b - a for a, b in zip(fake.dial_times, fake.dial_times[1:])]
+    print(json.dumps({
+        'numbers': args.numbers,
+        'seconds': round(elapsed, 2),
+        'statuses': dict(Counter(result['status'] for result in results)),
+        'dial_attempts': len(fake.dial_times),
+        'peak_active_calls': fake.peak_active_calls,
+        'max_concurrent': args.max_concurrent,
+        'min_dial_gap_ms': round(min(gaps) * 1000, 1) if gaps else None,
+        'configured_gap_ms': round(1000 / args.rate, 1),
+        'logged_results': len(logged),
+    }, indent=2))
+
+
+def main(argv=None):
+    asyncio.run(run(parse_args(argv)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+"""Measure how many agent sessions one node can carry before WorkerLoad reports it full.
+
+    python -m benchmarks.capacity --sessions 1,2,4,6,8,12 --seconds 20
+
+Each simulated session is its own process, like an agent job. It runs the
+per-call audio work that stays on the node: the Silero VAD over 16 kHz caller
+audio and resampling of 24 kHz TTS audio to 48 kHz, in real time. STT, the
+LLM and TTS synthesis run remotely and are left out. The BVCTelephony noise
+filter also runs on the node but only works against LiveKit Cloud, so it is
+not simulated; leave headroom for it. Each session also runs
+monitor_loop_lag, as entrypoint does. For every session count the table
+shows CPU, worst job event-loop lag, and the load the worker would report.
+
+Capacity is the most sessions for which that count and every smaller one
+kept its worst load under AGENT_LOAD_THRESHOLD, with the session limit left
+out. Use it to set AGENT_MAX_JOBS for that machine size. Run it on the
+instance type the agent is deployed on; the CPU share is of the CPUs this
+container may use, which LiveKit reads from the cgroup quota and takes to
+be 2 when there is none (set NUM_CPUS to correct it).
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import tempfile
+import time
+
+FRAME_MS = 20
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sessions', default='1,2,4,6,8,12', help='Comma-separated session counts to try')
+    parser.add_argument('--seconds', type=float, default=20.0, help='Measured seconds per session count')
+    parser.add_argument('--warmup', type=float, default=3.0, help='Seconds to settle before measuring')
+    return parser.parse_args(argv)
+
+
+def session_process(ready, stop):
+    asyncio.run(simulate_session(ready, stop))
+
+
+async def simulate_session(ready, stop):
+    import numpy as np
+    from livekit import rtc
+    from livekit.plugins import silero
+    from capacity import monitor_loop_lag
+
+    vad = silero.VAD.load()
+    stream = vad.stream()
+    resampler = rtc.AudioResampler(24000, 48000, num_channels=1)
+    lag_monitor = asyncio.create_task(monitor_loop_lag())
+    rng = np.random.default_rng(os.getpid())
+
+    async def drain_vad():
+        async for _ in stream:
+            pass
+    drainer = asyncio.create_task(drain_vad())
+
+    # Noise bursts alternating with silence, so the VAD sees both
+    def caller_frame(i):
+        samples = 16000 * FRAME_MS // 1000
+        scale = 6000 if (i // 50) % 2 == 0 else 50
+        data = (rng.standard_normal(samples) * scale).astype(np.int16)
+        return rtc.AudioFrame(data.tobytes(), 16000, 1, samples)
+
+    def tts_frame():
+        samples = 24000 * FRAME_MS // 1000
+        data = (rng.standard_normal(samples) * 3000).astype(np.int16)
+        return rtc.AudioFrame(data.tobytes(), 24000, 1, samples)
+
+    ready.set()
+    loop = asyncio.get_running_loop()
+    next_frame = loop.time()
+    i = 0
+    while not stop.is_set():
+        stream.push_frame(caller_frame(i))
+        resampler.push(tts_frame())
+        i += 1
+        next_frame += FRAME_MS / 1000
+        await asyncio.sleep(max(0.0, next_frame - loop.time()))
+
+    stream.end_input()
+    lag_monitor.cancel()
+    drainer.cancel()
+    await asyncio.gather(lag_monitor, drainer, return_exceptions=True)
+    await stream.aclose()
+
+
+def measure(count: int, args, load) -> dict:
+    context = multiprocessing.get_context('spawn')
+    stop = context.Event()
+    readies = [context.Event() for _ in range(count)]
+    processes = [context.Process(target=session_process, args=(ready, stop), daemon=True) for ready in readies]
+    for process in processes:
+        process.start()
+    for ready in readies:
+        ready.wait(timeout=60)
+    time.sleep(args.warmup)
+
+    samples = []
+    deadline = time.monotonic() + args.seconds
+    while time.monotonic() < deadline:
+        time.sleep(0.5)
+        samples.append(load.components(count))
+
+    stop.set()
+    for process in processes:
+        process.join(timeout=10)
+        if process.is_alive():
+            process.kill()
+
+    # The load without the session cap: is the machine itself coping?
+    machine_loads = [max(s['cpu'] / load.max_cpu, s['loop_lag'] / load.max_loop_lag) for s in samples]
+    return {
+        'sessions': count,
+        'cpu_mean': sum(s['cpu'] for s in samples) / len(samples),
+        'cpu_max': max(s['cpu'] for s in samples),
+        'loop_lag_max_ms': max(s['loop_lag'] for s in samples) * 1000,
+        'machine_load_max': max(machine_loads),
+    }
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    os.environ['PROMETHEUS_MULTIPROC_DIR'] = tempfile.mkdtemp(prefix='capacity-bench-')
+    from capacity import WorkerLoad
+    from livekit.agents.utils.hw import get_cpu_monitor
+
+    load = WorkerLoad()
+    load.cpu()
+    print(f"CPUs available: {get_cpu_monitor().cpu_count():g}  limits: CPU {load.max_cpu:.0%}, "
+          f"loop lag {load.max_loop_lag * 1000:.0f}ms, load threshold {load.threshold:g}")
+    print(f"{'sessions':>8} {'cpu mean':>9} {'cpu max':>8} {'lag max':>9} {'load':>6}  fits")
+    capacity = 0
+    overloaded = False
+    for count in sorted(int(c) for c in args.sessions.split(',') if c):
+        result = measure(count, args, load)
+        fits = result['machine_load_max'] < load.threshold
+        # A count that fits after a smaller one did not is luck, not capacity
+        overloaded = overloaded or not fits
+        if not overloaded:
+            capacity = count
+        print(f"{result['sessions']:>8} {result['cpu_mean']:>9.0%} {result['cpu_max']:>8.0%} "
+              f"{result['loop_lag_max_ms']:>7.1f}ms {result['machine_load_max']:>6.2f}  {'yes' if fits else 'no'}",
+              flush=True)
+    print(f"Capacity: {capacity} sessions per node (set AGENT_MAX_JOBS to at most this)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,414 @@
+import asyncio
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import requests
+from gspread.exceptions import APIError
+from livekit import api
+from report_ids import ALPHABET, REPORT_ID_LENGTH, check_symbol
+from reports import REPORT_COLUMNS
+from storage import APPOINTMENT_COLUMNS
+
+
+class FakeWorksheet:
+    """In-memory stand-in for gspread.Worksheet.
+
+    Every API method sleeps for latency seconds (plus per_row_latency for each
+    row returned), the way a Sheets round trip would, and is counted in calls.
+    With quota_per_minute, calls past that many in the current minute fail
+    with a 429 APIError; error_rate makes that share of calls fail with a 503.
+    """
+
+    def __init__(self, title: str, values: list, latency: float = 0.0, per_row_latency: float = 0.0,
+                 quota_per_minute: int = 0, error_rate: float = 0.0, seed: int = 5):
+        self.title = title
+        self.latency = latency
+        self.per_row_latency = per_row_latency
+        self.quota_per_minute = quota_per_minute
+        self.error_rate = error_rate
+        self.calls = Counter()
+        self._lock = threading.Lock()
+        self._rng = random.Random(seed)
+        self._minute = None
+        self._values = [list(row) for row in values]
+
+    def get_all_values(self) -> list:
+        with self._lock:
+            values = [list(row) for row in self._values]
+        self._api_call('get_all_values', len(values))
+        return values
+
+    def get_all_records(self) -> list:
+        values = self.get_all_values()
+        if not values:
+            return []
+        return [dict(zip(values[0], row)) for row in values[1:]]
+
+    def get(self, range_name: str) -> list:
+        """Supports the open-ended 'A{start}:{column}' ranges used by SheetIndex"""
+        match = re.fullmatch(r'A(\d+):[A-Z]+', range_name)
+        if not match:
+            raise ValueError(f"FakeWorksheet does not support range {range_name}")
+        start = int(match.group(1))
+        with self._lock:
+            rows = [list(row) for row in self._values[start - 1:]]
+        self._api_call('get', len(rows))
+        return rows
+
+    def row_values(self, row: int) -> list:
+        self._api_call('row_values')
+        with self._lock:
+            return list(self._values[row - 1]) if row <= len(self._values) else []
+
+    def insert_row(self, values: list, index: int = 1, **kwargs):
+        self._api_call('insert_row')
+        with self._lock:
+            self._values.insert(index - 1, list(values))
+
+    def update(self, values: list, range_name: str = 'A1', **kwargs):
+        """Supports writing whole rows from column A, e.g. 'A1'"""
+        match = re.fullmatch(r'A(\d+)', range_name)
+        if not match:
+            raise ValueError(f"FakeWorksheet does not support range {range_name}")
+        self._api_call('update')
+        with self._lock:
+            start = int(match.group(1)) - 1
+            for offset, row in enumerate(values):
+                while len(self._values) <= start + offset:
+                    self._values.append([])
+                self._values[start + offset] = list(row)
+
+    def append_row(self, values: list, **kwargs):
+        self._api_call('append_row')
+        with self._lock:
+            self._values.append(list(values))
+
+    def append_rows(self, values: list, **kwargs):
+        self._api_call('append_rows')
+        with self._lock:
+            self._values.extend(list(row) for row in values)
+
+    def row_count(self) -> int:
+        with self._lock:
+            return len(self._values)
+
+    def _api_call(self, name: str, rows: int = 0):
+        with self._lock:
+            self.calls[name] += 1
+            minute = int(time.time() // 60)
+            if self._minute != minute:
+                self._minute, self._used = minute, 0
+            self._used += 1
+            over_quota = self.quota_per_minute and self._used > self.quota_per_minute
+            failed = self._rng.random() < self.error_rate
+        if over_quota:
+            self.calls['429'] += 1
+            raise api_error(429, 'Quota exceeded for quota metric Read requests', 'RESOURCE_EXHAUSTED')
+        if failed:
+            self.calls['503'] += 1
+            raise api_error(503, 'The service is currently unavailable.', 'UNAVAILABLE')
+        delay = self.latency + rows * self.per_row_latency
+        if delay > 0:
+            time.sleep(delay)
+
+
+def api_error(code: int, message: str, status: str) -> APIError:
+    """The APIError gspread raises for an error response from Sheets"""
+    response = requests.Response()
+    response.status_code = code
+    response._content = json.dumps({'error': {'code': code, 'message': message, 'status': status}}).encode()
+    return APIError(response)
+
+
+def random_report_id(rng: random.Random) -> str:
+    body = ''.join(rng.choice(ALPHABET) for _ in range(REPORT_ID_LENGTH))
+    return body + check_symbol(body)
+
+
+def appointment_slot(i: int, year: int = 2030) -> tuple:
+    """(date, time) of the i-th half-hour slot from 09:00 on January 1st of year"""
+    day, slot = divmod(i, 16)
+    start = time.mktime((year, 1, 1, 12, 0, 0, 0, 0, -1))
+    return time.strftime('%Y-%m-%d', time.localtime(start + day * 86400)), f"{9 + slot // 2:02d}:{30 * (slot % 2):02d}"
+
+
+def appointment_values(count: int, seed: int = 1) -> list:
+    """Header plus count appointment rows, one per half-hour slot from 2030-01-01"""
+    rng = random.Random(seed)
+    values = [list(APPOINTMENT_COLUMNS)]
+    for i in range(count):
+        date, slot_time = appointment_slot(i)
+        values.append([
+            '2029-12-01 09:00:00',
+            f"Patient {i}",
+            f"patient{i}@example.com",
+            rng.choice(['General Checkup', 'Physical Examination', 'Follow-up Visit']),
+            date,
+            slot_time,
+        ])
+    return values
+
+
+def report_values(count: int, analysis: dict, seed: int = 2) -> tuple:
+    """Header plus count flat report rows built from analysis, and the ids used"""
+    from reports import flatten_report
+
+    rng = random.Random(seed)
+    values = [list(REPORT_COLUMNS)]
+    ids = []
+    for _ in range(count):
+        report_id = random_report_id(rng)
+        ids.append(report_id)
+        record = flatten_report(canned_report(report_id, analysis))
+        values.append([record[c] for c in REPORT_COLUMNS])
+    return values, ids
+
+
+def canned_report(report_id: str, analysis: dict) -> dict:
+    """Normalized report (as app.build_report_record returns) for a canned analysis"""
+    return {
+        'id': report_id,
+        'timestamp': '2029-12-01 09:00:00',
+        'test_type': analysis['type'],
+        'concerns': list(analysis['concerns']),
+        'levels': [{**level, 'abnormal': bool(level['possible_causes'])} for level in analysis['levels']],
+    }
+
+
+CANNED_ANALYSIS = {
+    'type': 'Blood Test',
+    'levels': [
+        {
+            'name': name,
+            'value': value,
+            'reference_range': reference_range,
+            'what_it_is': f"{name} is one of the standard measures in a blood count.",
+            'your_level_means': f"Your {name.lower()} is {'outside' if causes else 'within'} the usual range.",
+            'why_it_matters': f"{name} shows how well your blood carries oxygen and fights infection.",
+            'possible_causes': causes,
+        }
+        for name, value, reference_range, causes in [
+            ('Hemoglobin', '11.2 g/dL', '13.5-17.5 g/dL', 'Iron deficiency, blood loss'),
+            ('Hematocrit', '36%', '41-50%', 'Iron deficiency, dehydration'),
+            ('White Blood Cells', '6.1 x10^9/L', '4.5-11.0 x10^9/L', None),
+            ('Platelets', '250 x10^9/L', '150-400 x10^9/L', None),
+            ('Red Blood Cells', '4.1 x10^12/L', '4.5-5.9 x10^12/L', 'Anemia'),
+            ('MCV', '82 fL', '80-100 fL', None),
+            ('MCH', '27 pg', '27-33 pg', None),
+            ('Neutrophils', '58%', '40-70%', None),
+        ]
+    ],
+    'concerns': ['Hemoglobin and hematocrit are below the normal range'],
+}
+
+
+class StubOpenAIServer:
+    """Local HTTP server answering /v1/chat/completions with a canned analysis.
+
+    Point the OpenAI client at base_url. Plain requests get one JSON
+    completion after latency seconds; stream=True requests get the same
+    content as server-sent events, split into chunk_count deltas spaced
+    chunk_delay seconds apart.
+    """
+
+    def __init__(self, analysis: dict = CANNED_ANALYSIS, latency: float = 0.0,
+                 chunk_delay: float = 0.0, chunk_count: int = 20):
+        self.content = json.dumps(analysis)
+        self.latency = latency
+        self.chunk_delay = chunk_delay
+        self.chunk_count = chunk_count
+        self.requests = 0
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='stub-openai', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                stub.requests += 1
+                if stub.latency:
+                    time.sleep(stub.latency)
+                if body.get('stream'):
+                    self._stream(body)
+                else:
+                    self._complete(body)
+
+            def _complete(self, body: dict):
+                payload = json.dumps({
+                    'id': 'chatcmpl-stub',
+                    'object': 'chat.completion',
+                    'created': int(time.time()),
+                    'model': body.get('model', 'stub'),
+                    'choices': [{
+                        'index': 0,
+                        'message': {'role': 'assistant', 'content': stub.content, 'refusal': None},
+                        'finish_reason': 'stop',
+                    }],
+                    'usage': stub._usage(),
+                }).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _stream(self, body: dict):
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Connection', 'close')
+                self.end_headers()
+                size = max(1, len(stub.content) // stub.chunk_count + 1)
+                pieces = [stub.content[i:i + size] for i in range(0, len(stub.content), size)]
+                for i, piece in enumerate(pieces):
+                    delta = {'content': piece}
+                    if i == 0:
+                        delta['role'] = 'assistant'
+                    self._event(stub._chunk(body, delta, None))
+                    if stub.chunk_delay:
+                        time.sleep(stub.chunk_delay)
+                self._event(stub._chunk(body, {}, 'stop'))
+                usage_chunk = stub._chunk(body, None, None)
+                usage_chunk['usage'] = stub._usage()
+                self._event(usage_chunk)
+                self.wfile.write(b'data: [DONE]\n\n')
+                self.wfile.flush()
+                self.close_connection = True
+
+            def _event(self, data: dict):
+                self.wfile.write(f"data: {json.dumps(data)}\n\n".encode('utf-8'))
+                self.wfile.flush()
+
+        return Handler
+
+    def _chunk(self, body: dict, delta, finish_reason) -> dict:
+        choices = [] if delta is None else [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}]
+        return {
+            'id': 'chatcmpl-stub',
+            'object': 'chat.completion.chunk',
+            'created': int(time.time()),
+            'model': body.get('model', 'stub'),
+            'choices': choices,
+        }
+
+    def _usage(self) -> dict:
+        completion_tokens = len(self.content) // 4
+        return {'prompt_tokens': 1200, 'completion_tokens': completion_tokens, 'total_tokens': 1200 + completion_tokens}
+
+
+class FakeLiveKitAPI:
+    """In-process stand-in for livekit.api.LiveKitAPI covering the SIP and room calls in sip.py.
+
+    Outbound calls create a room holding a SIP participant who hangs up after
+    a random call_duration. With linger_agent, an agent participant also joins
+    and stays until the room is deleted, as happens when the agent runs with
+    close_on_disconnect=False. A failure_rate share of dial attempts raise a
+    retryable TwirpError. Concurrency and dial timing are recorded for checks.
+    """
+
+    def __init__(self, latency: float = 0.02, failure_rate: float = 0.0,
+                 call_duration: tuple = (0.5, 2.0), linger_agent: bool = False, seed: int = 4):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.call_duration = call_duration
+        self.linger_agent = linger_agent
+        self.rng = random.Random(seed)
+        self.rooms = {}
+        self.dial_times = []
+        self.deleted = []
+        self.failures = 0
+        self.peak_active_calls = 0
+        self.sip = self
+        self.room = self
+
+    def add_room(self, name: str, created: float = None, sip_seconds: float = None, agent: bool = True):
+        """Seed a room; sip_seconds is how long its caller stays (None: no caller)"""
+        room = self.rooms.setdefault(name, {'created': created or time.time(), 'participants': {}})
+        if sip_seconds is not None:
+            room['participants'][f"phone-{name}"] = (api.ParticipantInfo.Kind.SIP, time.monotonic() + sip_seconds)
+        if agent:
+            room['participants'][f"agent-{name}"] = (api.ParticipantInfo.Kind.AGENT, None)
+        return room
+
+    def hang_up(self, name: str):
+        """Disconnect the callers in a room, leaving any agent behind"""
+        participants = self.rooms[name]['participants']
+        for identity, (kind, ends_at) in participants.items():
+            if kind == api.ParticipantInfo.Kind.SIP:
+                participants[identity] = (kind, 0.0)
+
+    def active_calls(self) -> int:
+        now = time.monotonic()
+        return sum(1 for room in self.rooms.values() for kind, ends_at in room['participants'].values()
+                   if kind == api.ParticipantInfo.Kind.SIP and ends_at > now)
+
+    async def create_sip_participant(self, request):
+        await asyncio.sleep(self.latency)
+        self.dial_times.append(time.monotonic())
+        if self.rng.random() < self.failure_rate:
+            self.failures += 1
+            raise api.TwirpError('unavailable', 'callee busy', status=503)
+        room = self.add_room(request.room_name, agent=self.linger_agent)
+        room['participants'][request.participant_identity] = (
+            api.ParticipantInfo.Kind.SIP, time.monotonic() + self.rng.uniform(*self.call_duration))
+        self.peak_active_calls = max(self.peak_active_calls, self.active_calls())
+        return api.SIPParticipantInfo(
+            participant_id=f"PA_{len(self.dial_times)}",
+            participant_identity=request.participant_identity,
+            room_name=request.room_name,
+            sip_call_id=f"SCL_{len(self.dial_times)}",
+        )
+
+    def _present(self, room: dict) -> list:
+        now = time.monotonic()
+        return [api.ParticipantInfo(identity=identity, kind=kind, state=api.ParticipantInfo.State.ACTIVE)
+                for identity, (kind, ends_at) in room['participants'].items() if ends_at is None or ends_at > now]
+
+    async def list_participants(self, request):
+        await asyncio.sleep(self.latency)
+        room = self.rooms.get(request.room)
+        if room is None:
+            raise api.TwirpError('not_found', 'room not found', status=404)
+        return api.ListParticipantsResponse(participants=self._present(room))
+
+    async def list_rooms(self, request):
+        await asyncio.sleep(self.latency)
+        return api.ListRoomsResponse(rooms=[
+            api.Room(name=name, creation_time=int(room['created']), num_participants=len(self._present(room)))
+            for name, room in self.rooms.items()
+        ])
+
+    async def delete_room(self, request):
+        await asyncio.sleep(self.latency)
+        if self.rooms.pop(request.room, None) is None:
+            raise api.TwirpError('not_found', 'room not found', status=404)
+        self.deleted.append(request.room)
+        return api.DeleteRoomResponse()
+
+    async def aclose(self):
+        pass
@@ -0,0 +1,73 @@
+"""Run the sip.py room reaper against FakeLiveKitAPI and check what it ends.
+
+    python -m benchmarks.reaper --rooms 200 --batch-size 20 --latency 0.05
+
+Seeds four kinds of room in equal numbers: live calls, calls whose caller
+hangs up after the first sweep while the agent lingers, agent-only rooms idle
+past the threshold, and agent-only rooms still inside it. Only the second and
+third kinds should be ended. Reports sweep times and whether that held.
+"""
+import argparse
+import asyncio
+import json
+import time
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rooms', type=int, default=200, help='Rooms to seed (split across the four kinds)')
+    parser.add_argument('--batch-size', type=int, default=20)
+    parser.add_argument('--latency', type=float, default=0.02, help='Seconds per fake API call')
+    parser.add_argument('--sweeps', type=int, default=4)
+    return parser.parse_args(argv)
+
+
+async def run(args):
+    import sip
+    from benchmarks.fakes import FakeLiveKitAPI
+
+    idle_seconds = 60.0
+    fake = FakeLiveKitAPI(latency=args.latency)
+    per_kind = max(1, args.rooms // 4)
+    kinds = {'live': [], 'hung_up': [], 'stale': [], 'fresh': []}
+    for i in range(per_kind):
+        kinds['live'].append(f"live-{i}")
+        fake.add_room(f"live-{i}", sip_seconds=3600)
+        kinds['hung_up'].append(f"hung-up-{i}")
+        fake.add_room(f"hung-up-{i}", sip_seconds=3600)
+        kinds['stale'].append(f"stale-{i}")
+        fake.add_room(f"stale-{i}", created=time.time() - idle_seconds * 2)
+        kinds['fresh'].append(f"fresh-{i}")
+        fake.add_room(f"fresh-{i}")
+
+    reaper = sip.RoomReaper(fake, idle_seconds=idle_seconds, batch_size=args.batch_size)
+    sweeps = []
+    for sweep in range(args.sweeps):
+        if sweep == 1:
+            # Callers seen live on the first sweep hang up before the second
+            for name in kinds['hung_up']:
+                fake.hang_up(name)
+        started = time.perf_counter()
+        counts = await reaper.sweep()
+        counts['seconds'] = round(time.perf_counter() - started, 3)
+        sweeps.append(counts)
+
+    deleted = set(fake.deleted)
+    expected = set(kinds['hung_up']) | set(kinds['stale'])
+    print(json.dumps({
+        'rooms': per_kind * 4,
+        'batch_size': args.batch_size,
+        'sweeps': sweeps,
+        'reaped': len(deleted),
+        'expected': len(expected),
+        'correct': deleted == expected,
+        'live_rooms_left': sum(1 for name in kinds['live'] if name in fake.rooms),
+    }, indent=2))
+
+
+def main(argv=None):
+    asyncio.run(run(parse_args(argv)))
+
+
+if __name__ == '__main__':
+    main()
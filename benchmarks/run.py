@@ -0,0 +1,296 @@
+"""Offline benchmarks for the report API, the agent's function tools and the save paths.
+
+Google Sheets is replaced by in-memory FakeWorksheets and OpenAI by a local
+stub server, so nothing leaves the machine. Run from the repository root:
+
+    python -m benchmarks.run --rows 1000,10000,100000 --concurrency 8
+    python -m benchmarks.run --scenarios tools --backend sheets --sheet-latency 0.2
+
+Each sheet size runs in its own process so peak memory is measured cleanly.
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+SCENARIOS = ['analyze', 'analyze_stream', 'tools', 'save', 'sheets_burst']
+# The agent tools catch their own errors and answer with an apology or a correction instead
+# of raising, so replies containing these count as failed calls
+TOOL_FAILURES = ('I apologize', "I couldn't", 'ERROR:', "doesn't look right", 'No parameter called')
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', default='1000',
+                        help='Comma-separated sheet sizes (rows per sheet), e.g. 1000,10000,100000')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                        help=f"Comma-separated subset of {', '.join(SCENARIOS)}")
+    parser.add_argument('--concurrency', type=int, default=8, help='Requests in flight at once')
+    parser.add_argument('--requests', type=int, default=200, help='Requests per scenario step')
+    parser.add_argument('--backend', choices=['sqlite', 'sheets'], default='sqlite', help='STORAGE_BACKEND to test')
+    parser.add_argument('--sheet-latency', type=float, default=0.05, help='Seconds per fake Sheets API call')
+    parser.add_argument('--sheet-row-latency', type=float, default=0.0,
+                        help='Extra seconds per row returned by a fake Sheets read')
+    parser.add_argument('--sheet-quota', type=int, default=0,
+                        help='Calls per minute per fake sheet before it answers 429 (0: unlimited)')
+    parser.add_argument('--sheet-error-rate', type=float, default=0.0, help='Share of fake Sheets calls that fail with 503')
+    parser.add_argument('--model-latency', type=float, default=0.5, help='Seconds before the stub model answers')
+    parser.add_argument('--chunk-delay', type=float, default=0.02, help='Seconds between streamed stub chunks')
+    parser.add_argument('--image-size', type=int, default=3000, help='Longest side of the uploaded test image')
+    parser.add_argument('--analysis-cache', action='store_true', help='Leave the analysis cache on')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON lines')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    sizes = [int(size) for size in args.rows.split(',') if size]
+    if len(sizes) > 1:
+        # One process per size: keeps peak RSS and caches independent
+        argv = list(argv if argv is not None else sys.argv[1:])
+        base = [a for i, a in enumerate(argv)
+                if not a.startswith('--rows') and not (i > 0 and argv[i - 1] == '--rows')]
+        for size in sizes:
+            subprocess.run([sys.executable, '-m', 'benchmarks.run', '--rows', str(size)] + base, check=True)
+        return
+    run(args, sizes[0])
+
+
+def run(args, rows: int):
+    workdir = tempfile.mkdtemp(prefix='hospital-bench-')
+    os.environ.update({
+        'STORAGE_BACKEND': args.backend,
+        'SQLITE_PATH': os.path.join(workdir, 'bench.db'),
+        'REPORT_ID_DB': os.path.join(workdir, 'bench.db'),
+        'ANALYSIS_CACHE_DIR': os.path.join(workdir, 'analysis_cache'),
+        'ANALYSIS_CACHE_ENABLED': '1' if args.analysis_cache else '0',
+        'TTS_CACHE_DIR': os.path.join(workdir, 'tts_cache'),
+        'PROMETHEUS_MULTIPROC_DIR': os.path.join(workdir, 'metrics'),
+        'OPENAI_API_KEY': 'stub',
+    })
+    os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'])
+
+    # Imported only now: these modules read their settings from the environment at import time
+    from benchmarks import fakes
+    import sheets
+
+    server = fakes.StubOpenAIServer(latency=args.model_latency, chunk_delay=args.chunk_delay).start()
+    os.environ['OPENAI_BASE_URL'] = server.base_url
+
+    faults = {'quota_per_minute': args.sheet_quota, 'error_rate': args.sheet_error_rate}
+    appointments_sheet = fakes.FakeWorksheet(
+        'appointments', fakes.appointment_values(rows), args.sheet_latency, args.sheet_row_latency, **faults)
+    report_rows, report_ids = fakes.report_values(rows, fakes.CANNED_ANALYSIS)
+    reports_sheet = fakes.FakeWorksheet('reports', report_rows, args.sheet_latency, args.sheet_row_latency, **faults)
+    # Through the scheduler, as the registry hands out real worksheets
+    scheduled = {sheet.title: sheets.ScheduledWorksheet(sheet, sheets.scheduler, sheet.title)
+                 for sheet in (appointments_sheet, reports_sheet)}
+
+    def fake_worksheet(credentials_file, spreadsheet_id, title=None):
+        return scheduled['reports' if 'report' in credentials_file else 'appointments']
+    sheets.registry.worksheet = fake_worksheet
+
+    rss_before = peak_rss_mb()
+    started = time.perf_counter()
+    import report_api
+    # The voice agent's tools are only imported (with LiveKit) when they are measured
+    agent = None
+    if 'tools' in args.scenarios.split(','):
+        import agent
+    # Pay for the first sheet import / index load up front, and report it separately
+    report_api.get_storage().reports_for(report_ids[0])
+    report_api.get_storage().is_slot_booked('2030-01-01', '09:00')
+    warmup = time.perf_counter() - started
+
+    context = {
+        'api': report_api,
+        'agent': agent,
+        'fakes': fakes,
+        'report_ids': report_ids,
+        'image': make_image(args.image_size),
+        'rng': random.Random(3),
+    }
+    results = [{
+        'scenario': 'startup', 'rows': rows, 'backend': args.backend, 'requests': 1, 'errors': 0,
+        'seconds': round(warmup, 3), 'rss_mb': round(peak_rss_mb() - rss_before, 1),
+    }]
+    for scenario in [s for s in args.scenarios.split(',') if s]:
+        for name, call, is_async in scenario_steps(scenario, context):
+            stats = measure_async(call, args) if is_async else measure_threads(call, args)
+            stats.update({'scenario': name, 'rows': rows, 'backend': args.backend})
+            results.append(stats)
+
+    results[-1]['sheet_calls'] = dict(appointments_sheet.calls + reports_sheet.calls)
+    results[-1]['model_requests'] = server.requests
+    results[-1]['scheduler'] = dict(sheets.scheduler.counts)
+    server.stop()
+    for result in results:
+        print(json.dumps(result) if args.json else format_result(result), flush=True)
+
+
+def scenario_steps(scenario: str, context: dict):
+    """(name, call, is_async) for each measured step of a scenario; call(i) runs one request"""
+    api = context['api']
+    agent = context['agent']
+    fakes = context['fakes']
+    report_ids = context['report_ids']
+    rng = context['rng']
+    client = api.flask_app.test_client()
+
+    def tool(call):
+        async def checked(i):
+            reply = await call(i)
+            if any(marker in reply for marker in TOOL_FAILURES):
+                raise RuntimeError(reply[:200])
+        return checked
+
+    def upload(path):
+        def call(i):
+            response = client.post(path, data={'image': (io.BytesIO(context['image']), 'report.jpg')},
+                                   content_type='multipart/form-data')
+            # Reading the body drains streamed responses too
+            body = response.get_data()
+            if response.status_code != 200:
+                raise RuntimeError(f"{path} returned {response.status_code}: {body[:200]!r}")
+        return call
+
+    if scenario == 'analyze':
+        yield 'analyze', upload('/analyze'), False
+    elif scenario == 'analyze_stream':
+        yield 'analyze_stream', upload('/analyze?stream=1'), False
+    elif scenario == 'tools':
+        yield 'tool.check_appointment_availability', tool(lambda i: agent.check_appointment_availability(
+            f"2031-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}", '10:00')), True
+        yield 'tool.find_available_slots', tool(lambda i: agent.find_available_slots(
+            fakes.appointment_slot(rng.randrange(1000))[0], preferred_time='10:00')), True
+        yield 'tool.lookup_user_reports', tool(lambda i: agent.lookup_user_reports(rng.choice(report_ids))), True
+        yield 'tool.explain_report_parameter', tool(lambda i: agent.explain_report_parameter(
+            rng.choice(report_ids), 'Hemoglobin')), True
+        yield 'tool.save_appointment_to_sheet', tool(lambda i: agent.save_appointment_to_sheet(
+            f"Bench {i}", f"bench{i}@example.com", 'General Checkup', *fakes.appointment_slot(i, 2040))), True
+    elif scenario == 'save':
+        yield 'save.report', lambda i: api.get_storage().save_report(
+            fakes.canned_report(api.generate_unique_id(), fakes.CANNED_ANALYSIS)), False
+        yield 'save.appointment', lambda i: api.get_storage().book_appointment(dict(
+            zip(['date', 'time'], fakes.appointment_slot(i, 2050)),
+            timestamp='2029-12-01 09:00:00', name=f"Bench {i}", email=f"bench{i}@example.com",
+            appointment_type='General Checkup',
+        )), False
+    elif scenario == 'sheets_burst':
+        # Reads that must go to Sheets: fresh availability checks and report ids the index has not seen
+        if not hasattr(api.storage, 'slots'):
+            print("Skipping sheets_burst: it needs --backend sheets")
+            return
+        yield 'sheets.fresh_availability', lambda i: api.get_storage().is_slot_booked(
+            *fakes.appointment_slot(rng.randrange(1000)), max_staleness=0), False
+        yield 'sheets.unknown_report', lambda i: api.get_storage().reports_for(fakes.random_report_id(rng)), False
+    else:
+        raise SystemExit(f"Unknown scenario {scenario}; choose from {', '.join(SCENARIOS)}")
+
+
+def measure_threads(call, args) -> dict:
+    latencies = []
+    errors = []
+
+    def timed(i):
+        start = time.perf_counter()
+        try:
+            call(i)
+        except Exception as e:
+            errors.append(str(e))
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(timed, range(args.requests)))
+    return summarize(latencies, errors, time.perf_counter() - start)
+
+
+def measure_async(call, args) -> dict:
+    latencies = []
+    errors = []
+
+    async def timed(i, semaphore):
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await call(i)
+            except Exception as e:
+                errors.append(str(e))
+            latencies.append(time.perf_counter() - start)
+
+    async def run_all():
+        semaphore = asyncio.Semaphore(args.concurrency)
+        await asyncio.gather(*(timed(i, semaphore) for i in range(args.requests)))
+
+    start = time.perf_counter()
+    asyncio.run(run_all())
+    return summarize(latencies, errors, time.perf_counter() - start)
+
+
+def summarize(latencies: list, errors: list, elapsed: float) -> dict:
+    ordered = sorted(latencies)
+    stats = {
+        'requests': len(ordered),
+        'errors': len(errors),
+        'seconds': round(elapsed, 3),
+        'throughput': round(len(ordered) / elapsed, 2) if elapsed else 0.0,
+        'p50_ms': round(percentile(ordered, 50) * 1000, 1),
+        'p95_ms': round(percentile(ordered, 95) * 1000, 1),
+        'p99_ms': round(percentile(ordered, 99) * 1000, 1),
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+    }
+    if errors:
+        stats['first_error'] = errors[0]
+    return stats
+
+
+def percentile(ordered: list, pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not ordered:
+        return 0.0
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def make_image(size: int) -> bytes:
+    """A noisy photo-sized JPEG, so resizing and encoding cost is realistic"""
+    from PIL import Image
+
+    image = Image.effect_noise((size, size * 3 // 4), 64).convert('RGB')
+    output = io.BytesIO()
+    image.save(output, format='JPEG', quality=90)
+    return output.getvalue()
+
+
+def format_result(result: dict) -> str:
+    if result['scenario'] == 'startup':
+        return (f"{result['scenario']:<36} rows={result['rows']:<7} backend={result['backend']:<7} "
+                f"{result['seconds']:.3f}s  +{result['rss_mb']:.1f} MB")
+    line = (f"{result['scenario']:<36} rows={result['rows']:<7} n={result['requests']:<5} err={result['errors']:<4} "
+            f"{result['throughput']:>8.1f} req/s  p50={result['p50_ms']:.1f}ms  p95={result['p95_ms']:.1f}ms  "
+            f"p99={result['p99_ms']:.1f}ms  peak={result['peak_rss_mb']:.0f}MB")
+    if result.get('first_error'):
+        line += f"\n    first error: {result['first_error'][:200]}"
+    if result.get('sheet_calls'):
+        line += f"\n    sheet calls: {result['sheet_calls']}  model requests: {result['model_requests']}"
+        line += f"\n    scheduler: {result['scheduler']}"
+    return line
+
+
+if __name__ == '__main__':
+    main()
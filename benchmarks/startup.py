@@ -0,0 +1,67 @@
+"""Import time and memory of each entry point, each measured in a fresh process.
+
+    python -m benchmarks.startup --repeat 3
+
+report_api is what each gunicorn worker loads, agent is what each agent job
+process loads, and app is the launcher LiveKit's process pool re-imports.
+Storage runs on a throwaway SQLite file with Sheets replication off, so
+nothing leaves the machine.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+MODULES = ['app', 'report_api', 'agent']
+
+MEASURE = """
+import json, resource, sys, time
+started = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - started
+loaded = sorted(name for name in sys.modules if name.split('.')[0] in ('flask', 'openai', 'livekit', 'PIL', 'gspread'))
+print(json.dumps({{
+    'seconds': seconds,
+    'rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    'heavy': sorted({{name.split('.')[0] for name in loaded}}),
+}}))
+"""
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--modules', default=','.join(MODULES), help='Comma-separated modules to import')
+    parser.add_argument('--repeat', type=int, default=3, help='Fresh processes per module')
+    return parser.parse_args(argv)
+
+
+def measure(module: str, env: dict) -> dict:
+    output = subprocess.run([sys.executable, '-c', MEASURE.format(module=module)], env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    workdir = tempfile.mkdtemp(prefix='startup-bench-')
+    env = dict(os.environ, **{
+        'STORAGE_BACKEND': 'sqlite',
+        'SQLITE_PATH': os.path.join(workdir, 'bench.db'),
+        'SHEETS_REPLICATION': '0',
+        'ANALYSIS_CACHE_DIR': os.path.join(workdir, 'analysis_cache'),
+        'TTS_CACHE_DIR': os.path.join(workdir, 'tts_cache'),
+        'PROMETHEUS_MULTIPROC_DIR': workdir,
+        'OPENAI_API_KEY': os.getenv('OPENAI_API_KEY', 'stub'),
+    })
+    for module in [m for m in args.modules.split(',') if m]:
+        runs = [measure(module, env) for _ in range(args.repeat)]
+        print(f"{module:<12} import {statistics.median(r['seconds'] for r in runs) * 1000:7.0f}ms  "
+              f"rss {statistics.median(r['rss_mb'] for r in runs):6.1f}MB  "
+              f"loads: {', '.join(runs[0]['heavy']) or '-'}")
+
+
+if __name__ == '__main__':
+    main()
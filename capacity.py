@@ -0,0 +1,134 @@
+import asyncio
+import collections
+import glob
+import os
+import threading
+import time
+
+from livekit.agents.utils.hw import get_cpu_monitor
+from prometheus_client import multiprocess
+
+from telemetry import LOOP_LAG, METRICS_PRUNE_INTERVAL, pid_alive, prune_dead_processes
+
+# A worker reports itself full once any of these is reached, so LiveKit sends the call elsewhere
+# Concurrent sessions per worker. 6 is what benchmarks.capacity sustained on 1 vCPU (Xeon, 20s runs):
+# 6 sessions peaked at 45% CPU and 31ms loop lag (load 0.60) in every run, 8 went over the lag
+# limit in one run of four. Re-run the benchmark on the deployed instance type and set this from it
+AGENT_MAX_JOBS = int(os.getenv('AGENT_MAX_JOBS', '6'))
+AGENT_MAX_CPU = float(os.getenv('AGENT_MAX_CPU', '0.75'))  # share of the CPUs the container may use
+AGENT_MAX_LOOP_LAG = float(os.getenv('AGENT_MAX_LOOP_LAG', '0.05'))  # seconds; past this, audio frames go out late
+# Load is 1.0 at whichever limit is closest, so 1.0 means "full"; lower it to keep headroom
+AGENT_LOAD_THRESHOLD = float(os.getenv('AGENT_LOAD_THRESHOLD', '1.0'))
+# Prewarmed processes kept waiting for calls (each holds a loaded VAD model)
+AGENT_NUM_IDLE_PROCESSES = int(os.getenv('AGENT_NUM_IDLE_PROCESSES', '2'))
+
+LOOP_LAG_INTERVAL = 0.1
+LOOP_LAG_WINDOW = 20  # samples; the gauge holds the worst of the last ~2 seconds
+CPU_SAMPLE_INTERVAL = 0.5
+CPU_WINDOW = 5
+
+
+async def monitor_loop_lag(interval: float = LOOP_LAG_INTERVAL, window: int = LOOP_LAG_WINDOW):
+    """Measure how late this process's event loop wakes up, until cancelled.
+
+    Run one per job: a loop busy with one session's work delays every other
+    callback in it, including the audio frames sent to the caller.
+    """
+    loop = asyncio.get_running_loop()
+    recent = collections.deque(maxlen=window)
+    try:
+        while True:
+            start = loop.time()
+            await asyncio.sleep(interval)
+            recent.append(max(0.0, loop.time() - start - interval))
+            LOOP_LAG.set(max(recent))
+    finally:
+        # The process goes back to the idle pool; its last call's lag no longer applies
+        LOOP_LAG.set(0)
+
+
+def job_loop_lag() -> float:
+    """Worst recent event-loop lag across live job processes, in seconds"""
+    directory = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    files = []
+    for path in glob.glob(os.path.join(directory, 'gauge_livemax_*.db')):
+        pid = int(os.path.basename(path)[len('gauge_livemax_'):-len('.db')])
+        if pid_alive(pid):
+            files.append(path)
+        else:
+            # A crashed job would otherwise report its last lag forever
+            multiprocess.mark_process_dead(pid, directory)
+    lag = 0.0
+    for metric in multiprocess.MultiProcessCollector.merge(files, accumulate=False):
+        if metric.name == 'agent_event_loop_lag_seconds':
+            lag = max([lag] + [sample.value for sample in metric.samples])
+    return lag
+
+
+class WorkerLoad:
+    """load_fnc for the agent worker, from 0.0 (idle) to 1.0 (at a limit).
+
+    The load is the highest of active sessions / max_jobs, CPU / max_cpu and
+    job event-loop lag / max_loop_lag. CPU is averaged over the last few
+    samples so one busy moment doesn't turn callers away; lag is already the
+    worst of a window.
+    """
+
+    def __init__(self, max_jobs: int = AGENT_MAX_JOBS, max_cpu: float = AGENT_MAX_CPU,
+                 max_loop_lag: float = AGENT_MAX_LOOP_LAG, threshold: float = AGENT_LOAD_THRESHOLD):
+        self.max_jobs = max(1, max_jobs)
+        self.max_cpu = max_cpu
+        self.max_loop_lag = max_loop_lag
+        self.threshold = threshold
+        self._cpu_samples = collections.deque(maxlen=CPU_WINDOW)
+        self._lock = threading.Lock()
+        self._sampler = None
+        self._full = False
+        self._next_prune = 0.0
+
+    def _sample_cpu(self):
+        monitor = get_cpu_monitor()
+        while True:
+            # Blocks for the interval, so this runs on its own thread
+            usage = monitor.cpu_percent(interval=CPU_SAMPLE_INTERVAL)
+            with self._lock:
+                self._cpu_samples.append(usage)
+
+    def cpu(self) -> float:
+        with self._lock:
+            # Started on first use, in the worker process rather than wherever this module is imported
+            if self._sampler is None:
+                self._sampler = threading.Thread(target=self._sample_cpu, daemon=True, name='worker_load_cpu')
+                self._sampler.start()
+            return sum(self._cpu_samples) / len(self._cpu_samples) if self._cpu_samples else 0.0
+
+    def components(self, active_jobs: int) -> dict:
+        """Each input next to its share of its limit"""
+        cpu = self.cpu()
+        lag = job_loop_lag()
+        return {
+            'sessions': active_jobs,
+            'cpu': cpu,
+            'loop_lag': lag,
+            'load': min(1.0, max(active_jobs / self.max_jobs, cpu / self.max_cpu, lag / self.max_loop_lag)),
+        }
+
+    def __call__(self, worker) -> float:
+        # Runs in the worker's main process every few hundred ms, which makes it the place
+        # to clean up after job processes that have exited
+        if time.monotonic() >= self._next_prune:
+            self._next_prune = time.monotonic() + METRICS_PRUNE_INTERVAL
+            try:
+                prune_dead_processes()
+            except OSError as e:
+                print(f"Error pruning metric files of exited job processes: {str(e)}")
+        current = self.components(len(worker.active_jobs))
+        full = current['load'] >= self.threshold
+        if full != self._full:
+            self._full = full
+            if full:
+                print(f"Worker full, not taking calls: {current['sessions']}/{self.max_jobs} sessions, "
+                      f"CPU {current['cpu']:.0%}, loop lag {current['loop_lag'] * 1000:.0f}ms")
+            else:
+                print(f"Worker taking calls again: {current['sessions']}/{self.max_jobs} sessions")
+        return current['load']
@@ -0,0 +1,31 @@
+# gunicorn settings for the lab report API; picked up automatically by `gunicorn report_api:flask_app`
+import os
+import tempfile
+
+bind = os.getenv('API_BIND', '0.0.0.0:5001')
+# Worker processes, each serving this many requests at once on threads
+# (an analysis mostly waits on OpenAI, so threads are cheap)
+workers = int(os.getenv('API_WORKERS', '2'))
+threads = int(os.getenv('API_THREADS', '8'))
+worker_class = 'gthread'
+# Seconds a worker may go silent before it is restarted; synchronous analyses can take minutes
+timeout = int(os.getenv('API_TIMEOUT', '300'))
+graceful_timeout = 30
+keepalive = 5
+accesslog = '-'
+
+# Worker metrics are merged through files in one directory (see telemetry.py). It must be
+# chosen here, before the workers fork, or each worker would make its own. With METRICS_DIR
+# set (as app.py does), the workers use its api subdirectory and /metrics also reads the others
+if not os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+    if os.getenv('METRICS_DIR'):
+        os.environ['PROMETHEUS_MULTIPROC_DIR'] = os.path.join(os.environ['METRICS_DIR'], 'api')
+        os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+    else:
+        os.environ['PROMETHEUS_MULTIPROC_DIR'] = tempfile.mkdtemp(prefix='hospital-metrics-')
+
+
+def child_exit(server, worker):
+    # Drop the exited worker's live gauges and fold its counters into the archive files
+    import telemetry
+    telemetry.prune_dead_processes()
@@ -0,0 +1,84 @@
+import base64
+import hashlib
+import io
+import os
+from typing import NamedTuple
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+# Longest side, in pixels, of the image sent to the vision model
+IMAGE_MAX_DIMENSION = int(os.getenv('IMAGE_MAX_DIMENSION', '2048'))
+IMAGE_JPEG_QUALITY = int(os.getenv('IMAGE_JPEG_QUALITY', '85'))
+# Set to 0 to send uploads to the model unchanged
+IMAGE_PREPROCESS = os.getenv('IMAGE_PREPROCESS', '1') == '1'
+
+MIME_TYPES = {
+    '.png': 'image/png',
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.gif': 'image/gif',
+    '.webp': 'image/webp',
+}
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+class PreparedImage(NamedTuple):
+    """Image bytes ready for the model, plus what identifies the analysis input"""
+    data: bytes
+    mime_type: str
+    source_sha256: str
+    variant: str
+
+
+def prepare_image(stream, filename: str, max_dimension: int = IMAGE_MAX_DIMENSION,
+                  quality: int = IMAGE_JPEG_QUALITY, preprocess: bool = IMAGE_PREPROCESS) -> PreparedImage:
+    """Read an uploaded image stream and shrink it for the vision model.
+
+    The upload is hashed in chunks and decoded straight from the (spooled)
+    stream, so the full original never has to sit in memory as bytes. Photos
+    are rotated per EXIF, downsampled to max_dimension, stripped of metadata
+    and re-encoded as JPEG.
+    """
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: stream.read(HASH_CHUNK_SIZE), b''):
+        digest.update(chunk)
+    stream.seek(0)
+
+    if not preprocess:
+        mime_type = MIME_TYPES.get(os.path.splitext(filename)[1].lower(), 'image/png')
+        return PreparedImage(stream.read(), mime_type, digest.hexdigest(), 'original')
+
+    try:
+        with Image.open(stream) as image:
+            # Let the JPEG decoder scale down while decoding instead of after
+            image.draft('RGB', (max_dimension, max_dimension))
+            image = ImageOps.exif_transpose(image)
+            image = _to_rgb(image)
+            image.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS)
+            output = io.BytesIO()
+            image.save(output, format='JPEG', quality=quality, optimize=True)
+    except Image.DecompressionBombError as e:
+        raise ValueError(f"Image is too large to process: {str(e)}") from e
+    except (UnidentifiedImageError, OSError) as e:
+        raise ValueError(f"Could not read image: {str(e)}") from e
+
+    return PreparedImage(output.getvalue(), 'image/jpeg', digest.hexdigest(), f"jpeg:{max_dimension}:{quality}")
+
+
+def build_data_uri(image_data: bytes, mime_type: str) -> str:
+    """Build a base64 data URI, holding at most two copies of the encoded payload at once"""
+    uri = bytearray(f"data:{mime_type};base64,".encode('ascii'))
+    uri += base64.b64encode(image_data)
+    return uri.decode('ascii')
+
+
+def _to_rgb(image: Image.Image) -> Image.Image:
+    if image.mode == 'RGB':
+        return image
+    if image.mode in ('RGBA', 'LA', 'P'):
+        # Flatten transparency onto white, as the report would look on paper
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
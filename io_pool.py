@@ -0,0 +1,29 @@
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+# Threads available for blocking storage calls made from async code
+STORAGE_IO_WORKERS = int(os.getenv('STORAGE_IO_WORKERS', '8'))
+# Seconds an async caller waits for a storage call before giving up
+STORAGE_IO_TIMEOUT = float(os.getenv('STORAGE_IO_TIMEOUT', '10'))
+# Seconds to wait for a booking, which must not be retried; above the Sheets read + write
+# deadlines (5s + 8s) a booking can spend waiting for quota
+STORAGE_WRITE_TIMEOUT = float(os.getenv('STORAGE_WRITE_TIMEOUT', '30'))
+
+_executor = ThreadPoolExecutor(max_workers=STORAGE_IO_WORKERS, thread_name_prefix='storage-io')
+
+
+async def run_blocking(func, *args, timeout: float = STORAGE_IO_TIMEOUT, **kwargs):
+    """Run a blocking storage call on the bounded I/O pool and await its result.
+
+    Keeps gspread/HTTP calls off the agent's event loop so one session's
+    sheet access never stalls audio for the others. The thread is not killed on
+    timeout, but the caller stops waiting and gets a TimeoutError.
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+    try:
+        return await asyncio.wait_for(future, timeout)
+    except asyncio.TimeoutError:
+        raise TimeoutError(f"storage call timed out after {timeout:g}s") from None
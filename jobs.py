@@ -0,0 +1,139 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+# Report analyses allowed to run at once (per API worker process)
+ANALYZE_MAX_WORKERS = int(os.getenv('ANALYZE_MAX_WORKERS', '4'))
+# Queued plus running jobs accepted before new submissions are rejected (per API worker process)
+ANALYZE_MAX_PENDING = int(os.getenv('ANALYZE_MAX_PENDING', '64'))
+# Seconds a finished job's result stays available
+JOB_RESULT_TTL = float(os.getenv('JOB_RESULT_TTL', '3600'))
+# Seconds a job may stay queued or running before it is presumed lost with its worker process
+JOB_TIMEOUT = float(os.getenv('JOB_TIMEOUT', '1800'))
+# Database holding job status and results, so any API worker process can answer a status request
+JOB_DB = os.getenv('JOB_DB', os.getenv('SQLITE_PATH', 'hospital.db'))
+
+JOB_FIELDS = ['id', 'status', 'created_at', 'started_at', 'finished_at', 'result', 'error']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS analyze_jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    result TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS analyze_jobs_finished ON analyze_jobs (finished_at);
+"""
+
+
+class JobQueueFull(Exception):
+    """Raised when too many jobs are already queued or running"""
+
+
+class JobStore:
+    """Runs jobs on a bounded worker pool and keeps their status and results in SQLite.
+
+    Jobs run in the process that accepted them, but their records are shared,
+    so a status request can land on any worker. Results must be JSON
+    serializable. Finished jobs are evicted ttl seconds after they complete.
+    Jobs still unfinished timeout seconds after submission (their worker
+    process died or was restarted) are marked failed, and evicted in turn.
+    """
+
+    def __init__(self, max_workers: int = ANALYZE_MAX_WORKERS, max_pending: int = ANALYZE_MAX_PENDING,
+                 ttl: float = JOB_RESULT_TTL, path: str = JOB_DB, timeout: float = JOB_TIMEOUT):
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self.timeout = timeout
+        self.path = path
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='analyze-job')
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._pending = 0
+        self._next_evict = 0.0
+
+    def submit(self, func, *args, **kwargs) -> str:
+        """Queue func(*args, **kwargs) and return the new job id"""
+        self._evict()
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise JobQueueFull(f"{self._pending} jobs already pending")
+            self._pending += 1
+        try:
+            self._connection().execute(
+                'INSERT INTO analyze_jobs (id, status, created_at) VALUES (?, ?, ?)', (job_id, 'queued', time.time())
+            )
+            self._executor.submit(self._run, job_id, func, args, kwargs)
+        except Exception:
+            with self._lock:
+                self._pending -= 1
+            raise
+        return job_id
+
+    def get(self, job_id: str):
+        """Return the job record, or None if unknown or expired"""
+        self._evict()
+        row = self._connection().execute(
+            f"SELECT {', '.join(JOB_FIELDS)} FROM analyze_jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        job = {field: value for field, value in zip(JOB_FIELDS, row) if value is not None}
+        if 'result' in job:
+            job['result'] = json.loads(job['result'])
+        return job
+
+    def pending(self) -> int:
+        with self._lock:
+            return self._pending
+
+    def _run(self, job_id: str, func, args, kwargs):
+        self._update(job_id, status='running', started_at=time.time())
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            self._update(job_id, status='failed', error=str(e), finished_at=time.time())
+        else:
+            self._update(job_id, status='succeeded', result=json.dumps(result), finished_at=time.time())
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _update(self, job_id: str, **fields):
+        assignments = ', '.join(f"{field} = ?" for field in fields)
+        self._connection().execute(
+            f"UPDATE analyze_jobs SET {assignments} WHERE id = ?", list(fields.values()) + [job_id]
+        )
+
+    def _evict(self):
+        # Eviction is a write; once a minute (or per ttl, if shorter) is plenty
+        now = time.time()
+        if now < self._next_evict:
+            return
+        self._next_evict = now + min(self.ttl, self.timeout, 60)
+        conn = self._connection()
+        # A job never finishes if the process running it died; fail it so clients stop polling
+        conn.execute(
+            "UPDATE analyze_jobs SET status = 'failed', error = ?, finished_at = ? "
+            "WHERE finished_at IS NULL AND created_at < ?",
+            (f"The analysis did not finish within {self.timeout:g}s; please upload the report again",
+             now, now - self.timeout)
+        )
+        conn.execute('DELETE FROM analyze_jobs WHERE finished_at < ?', (now - self.ttl,))
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(SCHEMA)
+            self._local.conn = conn
+        return conn
@@ -40,8 +40,17 @@ function getGoogleAuth() {
   );
 }
 
-function generateUniqueId(): string {
-  return Math.floor(Math.random() * 100).toString().padStart(2, '0');
+// Report ids come from the Python service's allocator (POST /report-ids), which records
+// every id it issues, so ids from this route and from the voice agent's side never collide
+const REPORT_API_URL = process.env.REPORT_API_URL || 'http://localhost:5001';
+
+async function generateUniqueId(): Promise<string> {
+  const response = await fetch(`${REPORT_API_URL}/report-ids`, { method: 'POST', cache: 'no-store' });
+  const body = await response.json().catch(() => null);
+  if (!response.ok || !body?.id) {
+    throw new Error(body?.message || `Report id service answered ${response.status}`);
+  }
+  return body.id;
 }
 
 function encodeImageToBase64(imageData: Buffer, filename: string): string {
@@ -170,6 +179,22 @@ async function analyzeMedicalReport(
   return MedicalReportAnalysisSchema.parse(response.choices[0].message.parsed as any);
 }
 
+// Header row of the lab reports sheet; keep in sync with REPORT_COLUMNS in reports.py
+const REPORT_SHEET_COLUMNS = [
+  'id',
+  'timestamp',
+  'test_type',
+  'parameter_name',
+  'value',
+  'reference_range',
+  'what_it_is',
+  'your_level_means',
+  'why_it_matters',
+  'possible_causes',
+  'concerns_summary',
+  'report_json',
+];
+
 async function saveToGoogleSheet(
   reportId: string,
   analysis: z.infer<typeof MedicalReportAnalysisSchema>
@@ -190,35 +215,26 @@ async function saveToGoogleSheet(
     const yourLevelMeansAll = analysis.levels.map((l) => `${l.name}: ${l.your_level_means}`).join(' || ');
     const whyItMattersAll = analysis.levels.map((l) => `${l.name}: ${l.why_it_matters}`).join(' || ');
     const possibleCausesAll = analysis.levels.map((l) => `${l.name}: ${l.possible_causes || 'N/A'}`).join(' || ');
+    // Same report as structured data; the Python tools read this column rather than the joined ones
+    const reportJson = JSON.stringify({
+      concerns: analysis.concerns,
+      levels: analysis.levels.map((l) => ({ ...l, abnormal: Boolean(l.possible_causes) })),
+    });
 
     try {
       const headerResp = await sheets.spreadsheets.values.get({
         spreadsheetId: REPORTS_SPREADSHEET_ID,
-        range: 'Sheet1!A1:K1',
+        range: 'Sheet1!A1:L1',
       });
 
       const headers = headerResp.data.values?.[0];
-      if (!headers || headers[0] !== 'id') {
+      if (!headers || headers[0] !== 'id' || headers.length < REPORT_SHEET_COLUMNS.length) {
         await sheets.spreadsheets.values.update({
           spreadsheetId: REPORTS_SPREADSHEET_ID,
           range: 'Sheet1!A1',
           valueInputOption: 'RAW',
           requestBody: {
-            values: [
-              [
-                'id',
-                'timestamp',
-                'test_type',
-                'parameter_name',
-                'value',
-                'reference_range',
-                'what_it_is',
-                'your_level_means',
-                'why_it_matters',
-                'possible_causes',
-                'concerns_summary',
-              ],
-            ],
+            values: [REPORT_SHEET_COLUMNS],
           },
         });
       }
@@ -228,21 +244,7 @@ async function saveToGoogleSheet(
         range: 'Sheet1!A1',
         valueInputOption: 'RAW',
         requestBody: {
-          values: [
-            [
-              'id',
-              'timestamp',
-              'test_type',
-              'parameter_name',
-              'value',
-              'reference_range',
-              'what_it_is',
-              'your_level_means',
-              'why_it_matters',
-              'possible_causes',
-              'concerns_summary',
-            ],
-          ],
+          values: [REPORT_SHEET_COLUMNS],
         },
       });
     }
@@ -265,6 +267,7 @@ async function saveToGoogleSheet(
             whyItMattersAll,
             possibleCausesAll,
             concernsSummary,
+            reportJson,
           ],
         ],
       },
@@ -314,7 +317,7 @@ export async function POST(req: NextRequest) {
     const arrayBuffer = await imageFile.arrayBuffer();
     const imageBuffer = Buffer.from(arrayBuffer);
 
-    const reportId = generateUniqueId();
+    const reportId = await generateUniqueId();
 
     const analysis = await analyzeMedicalReport(imageBuffer, imageFile.name);
 
@@ -0,0 +1,590 @@
+"""Lab report analysis API.
+
+Serve it with gunicorn (settings in gunicorn.conf.py):
+
+    gunicorn report_api:flask_app
+"""
+from dotenv import load_dotenv
+load_dotenv()
+import os
+import json
+import hashlib
+import random
+import time
+from datetime import datetime
+from typing import Optional
+from enum import Enum
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, Response, g, request, jsonify, stream_with_context, url_for
+from flask_cors import CORS
+from openai import OpenAI, RateLimitError, InternalServerError, APIConnectionError
+from pydantic import BaseModel, Field
+from backends import get_storage
+from jobs import JobStore, JobQueueFull
+from analysis_cache import AnalysisCache
+from report_ids import ReportIdAllocator
+from image_prep import PreparedImage, prepare_image, build_data_uri, IMAGE_MAX_DIMENSION, IMAGE_JPEG_QUALITY
+import telemetry
+
+# OpenAI client for lab report analysis
+openai_client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+
+# Flask app for lab report analysis API
+flask_app = Flask(__name__)
+CORS(flask_app)  # Enable CORS for Next.js frontend
+flask_app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+
+ALLOWED_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.gif', '.webp'}
+
+# Background analyses for POST /analyze?async=1
+analyze_jobs = JobStore()
+
+# POST /analyze/batch limits
+ANALYZE_BATCH_CONCURRENCY = int(os.getenv('ANALYZE_BATCH_CONCURRENCY', '8'))
+ANALYZE_BATCH_MAX_FILES = int(os.getenv('ANALYZE_BATCH_MAX_FILES', '100'))
+ANALYZE_BATCH_MAX_CONTENT_LENGTH = int(os.getenv('ANALYZE_BATCH_MAX_CONTENT_LENGTH', str(256 * 1024 * 1024)))
+# Retries for rate-limited or failed model calls, with exponential backoff capped at ANALYZE_MAX_BACKOFF seconds
+ANALYZE_MAX_RETRIES = int(os.getenv('ANALYZE_MAX_RETRIES', '4'))
+ANALYZE_MAX_BACKOFF = float(os.getenv('ANALYZE_MAX_BACKOFF', '30'))
+
+# Lab Report Analysis Models
+class TestType(str, Enum):
+    BLOOD_TEST = "Blood Test"
+    GLUCOSE_TEST = "Glucose Test"
+    LIPID_PANEL = "Lipid Panel"
+    HORMONE_PANEL = "Hormone Panel"
+    KIDNEY_FUNCTION = "Kidney Function"
+    LIVER_FUNCTION = "Liver Function"
+    THYROID_PANEL = "Thyroid Panel"
+    URINALYSIS = "Urinalysis"
+    TESTOSTERONE = "Testosterone"
+    OTHER = "Other"
+
+class TestLevel(BaseModel):
+    """Individual test parameter with detailed layman explanation"""
+    name: str = Field(description="Name of the test parameter")
+    value: str = Field(description="Measured value with units")
+    reference_range: Optional[str] = Field(default="N/A", description="Normal reference range")
+    what_it_is: str = Field(description="Simple explanation of what this test measures")
+    your_level_means: str = Field(description="What your specific level indicates in plain English")
+    why_it_matters: str = Field(description="Health implications in everyday terms")
+    possible_causes: Optional[str] = Field(default=None, description="Common reasons for abnormal values if applicable")
+
+class MedicalReportAnalysis(BaseModel):
+    """Simplified medical report analysis"""
+    type: TestType = Field(description="Type of medical test/report")
+    levels: list[TestLevel] = Field(description="All test parameters with comprehensive layman explanations")
+    concerns: list[str] = Field(
+        default_factory=list,
+        description="Any concerning findings that need attention. Empty list if everything is normal."
+    )
+
+# Simplified system prompt
+SIMPLE_MEDICAL_PROMPT = """You are a medical report analyzer that helps patients understand their test results in simple language.
+
+Your task is to extract and explain medical reports in 3 sections:
+
+## 1. TYPE
+Identify what type of medical test this is (blood test, glucose test, lipid panel, etc.)
+
+## 2. LEVELS (with detailed explanations)
+For each test parameter in the report, provide:
+
+- *name*: The test parameter name
+- *value*: The measured value with units
+- *reference_range*: Normal reference range (if shown in report)
+- *what_it_is*: Simple explanation of what this test measures (e.g., "Postprandial glucose measures the sugar level in your blood after eating")
+- *your_level_means*: What YOUR specific level indicates (e.g., "Your postprandial glucose level is slightly above the normal range, indicating impaired glucose tolerance")
+- *why_it_matters*: Health implications in everyday terms (e.g., "Impaired glucose tolerance can lead to diabetes if not managed with lifestyle changes")
+- *possible_causes*: Common reasons for abnormal values if applicable (e.g., "Early Type II Diabetes, glucose intolerance, or dietary habits"). Leave null if level is normal.
+
+## 3. CONCERNS
+List any concerning findings that need medical attention. Use simple language.
+- If everything is normal, return an empty list
+- If there are concerns, clearly state what's abnormal and why it matters
+- Include any actionable advice or recommendations from the report
+- Always recommend consulting with their doctor for concerns
+- If values are critical, clearly state this is urgent
+
+## Guidelines:
+- Use simple, clear language - avoid medical jargon
+- Be honest about abnormal findings but not alarmist
+- Extract all information directly from the report image provided
+- For normal values, still provide educational context about what the test measures
+
+Do NOT include a separate suggestions section - integrate any recommendations into the concerns section."""
+
+ANALYSIS_MODEL = "gpt-4o-2024-08-06"
+ANALYSIS_USER_PROMPT = "Please analyze this medical report and provide: 1) type of test, 2) detailed levels with explanations (what it is, what your level means, why it matters, possible causes), 3) concerns if any."
+
+# Cached analyses are keyed by image bytes plus everything that shapes the model output
+ANALYSIS_CACHE_VERSION = hashlib.sha256(
+    json.dumps([ANALYSIS_MODEL, SIMPLE_MEDICAL_PROMPT, ANALYSIS_USER_PROMPT,
+                MedicalReportAnalysis.model_json_schema()], sort_keys=True).encode('utf-8')
+).hexdigest()
+analysis_cache = AnalysisCache(ANALYSIS_CACHE_VERSION)
+
+# Index of issued report IDs, shared by every thread and process on this host
+report_id_allocator = ReportIdAllocator()
+
+def generate_unique_id():
+    """Allocate a short, checksummed report ID that has never been issued"""
+    return report_id_allocator.allocate()
+
+def analysis_messages(image: PreparedImage) -> list:
+    """Chat messages asking the model to analyze a report image"""
+    return [
+        {
+            "role": "system",
+            "content": SIMPLE_MEDICAL_PROMPT
+        },
+        {
+            "role": "user",
+            "content": [
+                {
+                    "type": "text",
+                    "text": ANALYSIS_USER_PROMPT
+                },
+                {
+                    "type": "image_url",
+                    "image_url": {
+                        "url": build_data_uri(image.data, image.mime_type)
+                    }
+                }
+            ]
+        }
+    ]
+
+def cache_analysis(cache_key: str, analysis: MedicalReportAnalysis, model_seconds: float, usage):
+    analysis_cache.set(cache_key, {
+        'analysis': analysis.model_dump(mode='json'),
+        'model_seconds': model_seconds,
+        'total_tokens': usage.total_tokens if usage else 0
+    })
+
+def analyze_medical_report(image: PreparedImage) -> MedicalReportAnalysis:
+    """Analyze a medical report image and return simplified analysis"""
+    cache_key = analysis_cache.key(image.source_sha256, image.variant)
+    cached = analysis_cache.get(cache_key)
+    if cached is not None:
+        return MedicalReportAnalysis.model_validate(cached['analysis'])
+    
+    started = time.monotonic()
+    response = openai_client.beta.chat.completions.parse(
+        model=ANALYSIS_MODEL,
+        messages=analysis_messages(image),
+        response_format=MedicalReportAnalysis,
+        temperature=0.3
+    )
+    
+    analysis = response.choices[0].message.parsed
+    cache_analysis(cache_key, analysis, time.monotonic() - started, response.usage)
+    return analysis
+
+def stream_medical_report(image: PreparedImage):
+    """Analyze a report image, yielding parts of the result as soon as they are complete.
+
+    Yields ('type', TestType), then ('level', (index, TestLevel)) for each
+    parameter, ('concerns', list) and finally ('analysis', MedicalReportAnalysis),
+    which is the same object analyze_medical_report() would return.
+    """
+    type_sent = False
+    levels_sent = 0
+    cache_key = analysis_cache.key(image.source_sha256, image.variant)
+    cached = analysis_cache.get(cache_key)
+    if cached is not None:
+        analysis = MedicalReportAnalysis.model_validate(cached['analysis'])
+    else:
+        started = time.monotonic()
+        with openai_client.beta.chat.completions.stream(
+            model=ANALYSIS_MODEL,
+            messages=analysis_messages(image),
+            response_format=MedicalReportAnalysis,
+            temperature=0.3,
+            stream_options={"include_usage": True}
+        ) as stream:
+            for event in stream:
+                if event.type != 'content.delta' or not isinstance(event.parsed, dict):
+                    continue
+                partial = event.parsed
+                # Fields arrive in schema order, so a field is complete once the next one starts
+                if not type_sent and 'levels' in partial:
+                    yield 'type', TestType(partial['type'])
+                    type_sent = True
+                levels = partial.get('levels') or []
+                complete = len(levels) if 'concerns' in partial else len(levels) - 1
+                while levels_sent < complete:
+                    yield 'level', (levels_sent, TestLevel.model_validate(levels[levels_sent]))
+                    levels_sent += 1
+            completion = stream.get_final_completion()
+        analysis = completion.choices[0].message.parsed
+        cache_analysis(cache_key, analysis, time.monotonic() - started, completion.usage)
+    
+    if not type_sent:
+        yield 'type', analysis.type
+    for i in range(levels_sent, len(analysis.levels)):
+        yield 'level', (i, analysis.levels[i])
+    yield 'concerns', analysis.concerns
+    yield 'analysis', analysis
+
+def build_report_record(report_id: str, analysis: MedicalReportAnalysis) -> dict:
+    """Normalized report for the store: a header plus one entry per test parameter"""
+    return {
+        'id': report_id,
+        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'test_type': analysis.type.value,
+        'concerns': list(analysis.concerns),
+        'levels': [
+            {**level.model_dump(), 'abnormal': bool(level.possible_causes)}
+            for level in analysis.levels
+        ],
+    }
+
+def save_to_google_sheet(report_id: str, analysis: MedicalReportAnalysis, result_dict: dict):
+    """Save analysis result to the report store (replicated to Google Sheet)"""
+    try:
+        get_storage().save_report(build_report_record(report_id, analysis))
+        return True
+    except Exception as e:
+        print(f"Error saving to Google Sheet: {str(e)}")
+        return False
+
+def build_report_result(report_id: str, analysis: MedicalReportAnalysis) -> dict:
+    """API response body for an analyzed report"""
+    return {
+        'success': True,
+        'id': report_id,
+        'timestamp': datetime.now().isoformat(),
+        'data': {
+            'type': analysis.type,
+            'levels': [
+                {
+                    'name': level.name,
+                    'value': level.value,
+                    'reference_range': level.reference_range,
+                    'what_it_is': level.what_it_is,
+                    'your_level_means': level.your_level_means,
+                    'why_it_matters': level.why_it_matters,
+                    'possible_causes': level.possible_causes
+                }
+                for level in analysis.levels
+            ],
+            'concerns': analysis.concerns
+        }
+    }
+
+def process_report(image: PreparedImage) -> dict:
+    """Analyze a report image, save it, and build the API response body"""
+    return save_analysis(analyze_medical_report(image))
+
+def save_analysis(analysis: MedicalReportAnalysis) -> dict:
+    """Assign a report id, save the analysis, and build the API response body"""
+    report_id = generate_unique_id()
+    result = build_report_result(report_id, analysis)
+    
+    saved = save_to_google_sheet(report_id, analysis, result)
+    
+    if not saved:
+        result['warning'] = 'Analysis completed but failed to save to database'
+    
+    return result
+
+def server_sent_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def report_event_stream(image: PreparedImage):
+    """Server-sent events for a streamed analysis: type, each level, concerns, then done with the saved report"""
+    try:
+        analysis = None
+        for kind, payload in stream_medical_report(image):
+            if kind == 'type':
+                yield server_sent_event('type', {'type': payload})
+            elif kind == 'level':
+                index, level = payload
+                yield server_sent_event('level', {'index': index, 'level': level.model_dump()})
+            elif kind == 'concerns':
+                yield server_sent_event('concerns', {'concerns': payload})
+            else:
+                analysis = payload
+        yield server_sent_event('done', save_analysis(analysis))
+    except Exception as e:
+        yield server_sent_event('error', {
+            'success': False,
+            'error': 'Analysis failed',
+            'message': str(e)
+        })
+
+def analyze_with_backoff(image: PreparedImage, max_retries: int = ANALYZE_MAX_RETRIES) -> MedicalReportAnalysis:
+    """analyze_medical_report, retrying rate limits and server errors with exponential backoff"""
+    for attempt in range(max_retries + 1):
+        try:
+            return analyze_medical_report(image)
+        except (RateLimitError, InternalServerError, APIConnectionError) as e:
+            if attempt == max_retries:
+                raise
+            delay = min(ANALYZE_MAX_BACKOFF, 2 ** attempt) * random.uniform(0.5, 1.0)
+            response = getattr(e, 'response', None)
+            retry_after = response.headers.get('retry-after') if response is not None else None
+            if retry_after:
+                try:
+                    delay = max(delay, float(retry_after))
+                except ValueError:
+                    pass
+            time.sleep(delay)
+
+def analyze_batch_item(file, max_dimension: int, quality: int) -> MedicalReportAnalysis:
+    """Prepare and analyze one file of a batch upload"""
+    extension_error = check_image_extension(file.filename)
+    if extension_error:
+        raise ValueError(extension_error)
+    image = prepare_image(file.stream, file.filename, max_dimension=max_dimension, quality=quality)
+    return analyze_with_backoff(image)
+
+def validate_image_upload():
+    """Return (file, None) for a valid upload, or (None, error response)"""
+    if 'image' not in request.files:
+        return None, (jsonify({
+            'error': 'No image file provided',
+            'message': 'Please upload an image file with key "image"'
+        }), 400)
+    
+    file = request.files['image']
+    
+    if file.filename == '':
+        return None, (jsonify({
+            'error': 'No file selected',
+            'message': 'Please select an image file to upload'
+        }), 400)
+    
+    extension_error = check_image_extension(file.filename)
+    if extension_error:
+        return None, (jsonify({
+            'error': 'Invalid file format',
+            'message': extension_error
+        }), 400)
+    
+    return file, None
+
+def check_image_extension(filename: str):
+    """Return an error message if the file is not an allowed image type"""
+    file_ext = os.path.splitext(filename)[1].lower()
+    if file_ext not in ALLOWED_EXTENSIONS:
+        return f'Please upload an image file. Allowed formats: {", ".join(sorted(ALLOWED_EXTENSIONS))}'
+    return None
+
+def image_options() -> dict:
+    """Image preparation settings; ?max_dimension= and ?quality= override the defaults"""
+    max_dimension = request.args.get('max_dimension', IMAGE_MAX_DIMENSION, type=int)
+    quality = request.args.get('quality', IMAGE_JPEG_QUALITY, type=int)
+    return {
+        'max_dimension': min(max(max_dimension, 256), 4096),
+        'quality': min(max(quality, 30), 95)
+    }
+
+def prepare_uploaded_image(file) -> PreparedImage:
+    """Downsample an upload for the model"""
+    return prepare_image(file.stream, file.filename, **image_options())
+
+# Flask routes for lab report analysis
+@flask_app.route('/analyze', methods=['POST'])
+def analyze_report():
+    """API endpoint to analyze medical report (?stream=1 for server-sent events, ?async=1 for a background job)"""
+    try:
+        file, error = validate_image_upload()
+        if error:
+            return error
+        
+        try:
+            image = prepare_uploaded_image(file)
+        except ValueError as e:
+            return jsonify({
+                'error': 'Invalid image',
+                'message': str(e)
+            }), 400
+        
+        if request.args.get('stream') in ('1', 'true') or request.accept_mimetypes.best == 'text/event-stream':
+            return Response(
+                stream_with_context(report_event_stream(image)),
+                mimetype='text/event-stream',
+                headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+            )
+        
+        if request.args.get('async') in ('1', 'true'):
+            try:
+                job_id = analyze_jobs.submit(process_report, image)
+            except JobQueueFull:
+                return jsonify({
+                    'success': False,
+                    'error': 'Server busy',
+                    'message': 'Too many reports are being analyzed right now. Please try again shortly.'
+                }), 503
+            status_url = url_for('analyze_job_status', job_id=job_id)
+            return jsonify({
+                'success': True,
+                'job_id': job_id,
+                'status': 'queued',
+                'status_url': status_url
+            }), 202, {'Location': status_url}
+        
+        return jsonify(process_report(image)), 200
+    
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': 'Analysis failed',
+            'message': str(e)
+        }), 500
+
+@flask_app.route('/analyze/batch', methods=['POST'])
+def analyze_batch():
+    """Analyze many report images (key "images") concurrently and save them in one write"""
+    request.max_content_length = ANALYZE_BATCH_MAX_CONTENT_LENGTH
+    files = [f for f in request.files.getlist('images') + request.files.getlist('image') if f.filename]
+    if not files:
+        return jsonify({
+            'error': 'No image files provided',
+            'message': 'Please upload one or more image files with key "images"'
+        }), 400
+    if len(files) > ANALYZE_BATCH_MAX_FILES:
+        return jsonify({
+            'error': 'Too many files',
+            'message': f'Please upload at most {ANALYZE_BATCH_MAX_FILES} images per batch'
+        }), 400
+    
+    concurrency = request.args.get('concurrency', ANALYZE_BATCH_CONCURRENCY, type=int)
+    concurrency = min(max(concurrency, 1), ANALYZE_BATCH_CONCURRENCY, len(files))
+    options = image_options()
+    
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='analyze-batch') as executor:
+        futures = [executor.submit(analyze_batch_item, file, **options) for file in files]
+    
+    results = []
+    records = []
+    for index, (file, future) in enumerate(zip(files, futures)):
+        try:
+            analysis = future.result()
+        except Exception as e:
+            results.append({
+                'index': index,
+                'filename': file.filename,
+                'success': False,
+                'error': 'Analysis failed',
+                'message': str(e)
+            })
+            continue
+        report_id = generate_unique_id()
+        result = build_report_result(report_id, analysis)
+        result.update({'index': index, 'filename': file.filename})
+        results.append(result)
+        records.append(build_report_record(report_id, analysis))
+    
+    saved = True
+    if records:
+        try:
+            get_storage().save_reports(records)
+        except Exception as e:
+            print(f"Error saving batch to Google Sheet: {str(e)}")
+            saved = False
+    
+    succeeded = len(records)
+    body = {
+        'success': succeeded > 0,
+        'total': len(files),
+        'succeeded': succeeded,
+        'failed': len(files) - succeeded,
+        'results': results
+    }
+    if not saved:
+        body['warning'] = 'Analysis completed but failed to save to database'
+    return jsonify(body), 200
+
+@flask_app.route('/analyze/<job_id>', methods=['GET'])
+def analyze_job_status(job_id):
+    """Status or result of an asynchronous analysis job"""
+    job = analyze_jobs.get(job_id)
+    if job is None:
+        return jsonify({
+            'error': 'Job not found',
+            'message': f'No analysis job with id {job_id} (it may have expired)'
+        }), 404
+    
+    body = {
+        'job_id': job['id'],
+        'status': job['status'],
+        'created_at': datetime.fromtimestamp(job['created_at']).isoformat()
+    }
+    if job['status'] == 'succeeded':
+        body['result'] = job['result']
+    elif job['status'] == 'failed':
+        body['result'] = {
+            'success': False,
+            'error': 'Analysis failed',
+            'message': job['error']
+        }
+    return jsonify(body), 200
+
+@flask_app.route('/report-ids', methods=['POST'])
+def allocate_report_id():
+    """Issue a report ID for a report saved elsewhere (the web upload route), from the same allocator"""
+    try:
+        return jsonify({'success': True, 'id': generate_unique_id()}), 201
+    except RuntimeError as e:
+        return jsonify({'success': False, 'error': 'Could not allocate a report ID', 'message': str(e)}), 503
+
+@flask_app.route('/analyze/cache/stats', methods=['GET'])
+def analysis_cache_stats():
+    """Hit/miss counters for the analysis result cache"""
+    return jsonify(analysis_cache.stats()), 200
+
+# Endpoints whose request durations are exported on /metrics
+TIMED_ENDPOINTS = {'analyze_report', 'analyze_batch'}
+
+@flask_app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@flask_app.after_request
+def record_request_duration(response):
+    # Streamed responses are timed until the stream starts, not until it ends
+    if request.endpoint in TIMED_ENDPOINTS and 'request_started' in g:
+        telemetry.ANALYZE_DURATION.labels(endpoint=request.endpoint, status=response.status_code).observe(
+            time.perf_counter() - g.request_started
+        )
+    return response
+
+@flask_app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus metrics for the API and every agent job process"""
+    body, content_type = telemetry.render()
+    return Response(body, content_type=content_type)
+
+@flask_app.route('/health', methods=['GET'])
+def health_check():
+    """Health check endpoint"""
+    return jsonify({
+        'status': 'healthy',
+        'message': 'Medical Report Analyzer API is running',
+        'pending_sheet_writes': get_storage().pending_writes()
+    }), 200
+
+@flask_app.route('/', methods=['GET'])
+def flask_home():
+    """Home endpoint with API documentation"""
+    return jsonify({
+        'message': 'Medical Report Analyzer API',
+        'version': '2.0',
+        'endpoints': {
+            '/health': 'GET - Health check',
+            '/analyze': 'POST - Analyze medical report (upload image with key "image"; ?stream=1 for server-sent events, ?async=1 to get a job id)',
+            '/analyze/batch': 'POST - Analyze many reports at once (upload images with key "images")',
+            '/analyze/<job_id>': 'GET - Status or result of an asynchronous analysis',
+            '/analyze/cache/stats': 'GET - Analysis cache hit/miss counters',
+            '/report-ids': 'POST - Issue a new report ID (for reports saved outside this API)',
+            '/metrics': 'GET - Prometheus metrics (voice pipeline latencies, tool and /analyze durations)',
+        }
+    }), 200
+
+
+if __name__ == "__main__":
+    # Development server; use gunicorn in production
+    flask_app.run(host='0.0.0.0', port=5001, debug=False, use_reloader=False)
@@ -0,0 +1,79 @@
+import os
+import secrets
+import sqlite3
+import threading
+import time
+
+# Database holding the index of issued report ids (shared by all processes on the host)
+REPORT_ID_DB = os.getenv('REPORT_ID_DB', os.getenv('SQLITE_PATH', 'hospital.db'))
+# Random symbols per id, before the check symbol; 6 gives about a billion ids
+REPORT_ID_LENGTH = int(os.getenv('REPORT_ID_LENGTH', '6'))
+
+# Crockford base32: no I, L, O or U, so ids are easy to read out over the phone
+ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+# Letters callers or speech-to-text commonly use in place of a digit
+CONFUSABLES = str.maketrans({'O': '0', 'I': '1', 'L': '1'})
+
+
+def check_symbol(body: str) -> str:
+    """Check symbol over a code body; odd weights catch any single mistyped symbol"""
+    total = sum((2 * i + 1) * ALPHABET.index(c) for i, c in enumerate(body))
+    return ALPHABET[total % len(ALPHABET)]
+
+
+def normalize_report_id(text) -> str:
+    """Canonical form of a spoken or typed id: uppercase, no separators, confusables mapped"""
+    cleaned = ''.join(ch for ch in str(text).upper() if ch.isalnum())
+    return cleaned.translate(CONFUSABLES)
+
+
+def is_valid_report_id(code: str) -> bool:
+    """True if code is a well-formed id with a matching check symbol"""
+    if len(code) != REPORT_ID_LENGTH + 1 or any(c not in ALPHABET for c in code):
+        return False
+    return check_symbol(code[:-1]) == code[-1]
+
+
+def is_legacy_report_id(code: str) -> bool:
+    """Ids issued before the allocator were two-digit numbers"""
+    return code.isdigit() and len(code) <= 2
+
+
+class ReportIdAllocator:
+    """Issues short, checksummed report ids that are unique across threads and processes.
+
+    Every issued id is inserted into a report_ids table whose primary key
+    rejects duplicates, so two workers can never hand out the same id.
+    """
+
+    def __init__(self, path: str = REPORT_ID_DB, length: int = REPORT_ID_LENGTH, max_attempts: int = 10):
+        self.path = path
+        self.length = length
+        self.max_attempts = max_attempts
+        self._local = threading.local()
+
+    def allocate(self) -> str:
+        """Return a new id that has never been issued before"""
+        conn = self._connection()
+        for _ in range(self.max_attempts):
+            body = ''.join(secrets.choice(ALPHABET) for _ in range(self.length))
+            code = body + check_symbol(body)
+            try:
+                conn.execute('INSERT INTO report_ids (code, issued_at) VALUES (?, ?)', (code, time.time()))
+                return code
+            except sqlite3.IntegrityError:
+                continue
+        raise RuntimeError(f"Could not allocate a unique report id after {self.max_attempts} attempts")
+
+    def was_issued(self, code: str) -> bool:
+        row = self._connection().execute('SELECT 1 FROM report_ids WHERE code = ?', (code,)).fetchone()
+        return row is not None
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS report_ids (code TEXT PRIMARY KEY, issued_at REAL NOT NULL)')
+            self._local.conn = conn
+        return conn
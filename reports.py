@@ -0,0 +1,219 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from sheets import SheetIndex
+
+# Seconds a report lookup may lag behind the sheet
+REPORT_INDEX_MAX_STALENESS = float(os.getenv('REPORT_INDEX_MAX_STALENESS', '60'))
+# Seconds between full re-downloads, to pick up rows edited or deleted by staff
+REPORT_INDEX_FULL_SYNC_INTERVAL = float(os.getenv('REPORT_INDEX_FULL_SYNC_INTERVAL', '1800'))
+# Formatted lookup results kept in memory
+REPORT_CACHE_SIZE = int(os.getenv('REPORT_CACHE_SIZE', '512'))
+REPORT_CACHE_TTL = float(os.getenv('REPORT_CACHE_TTL', '300'))
+
+# Flat row layout of the lab reports Google Sheet, one row per report. The joined
+# columns are for staff reading the sheet; report_json holds the same report as
+# structured data, which is what lookups and imports read
+REPORT_COLUMNS = [
+    'id', 'timestamp', 'test_type', 'parameter_name', 'value',
+    'reference_range', 'what_it_is', 'your_level_means',
+    'why_it_matters', 'possible_causes', 'concerns_summary', 'report_json'
+]
+# Fields of one test parameter in the normalized report layout
+LEVEL_FIELDS = [
+    'name', 'value', 'reference_range', 'what_it_is',
+    'your_level_means', 'why_it_matters', 'possible_causes'
+]
+
+
+def flatten_report(report: dict) -> dict:
+    """Flat sheet row (keyed by REPORT_COLUMNS) for a normalized report"""
+    levels = report['levels']
+    concerns = report['concerns']
+    return {
+        'id': report['id'],
+        'timestamp': report['timestamp'],
+        'test_type': report['test_type'],
+        'parameter_name': ', '.join(level['name'] for level in levels),
+        'value': ', '.join(level['value'] for level in levels),
+        'reference_range': ', '.join(level['reference_range'] or 'N/A' for level in levels),
+        'what_it_is': ' || '.join(f"{level['name']}: {level['what_it_is']}" for level in levels),
+        'your_level_means': ' || '.join(f"{level['name']}: {level['your_level_means']}" for level in levels),
+        'why_it_matters': ' || '.join(f"{level['name']}: {level['why_it_matters']}" for level in levels),
+        'possible_causes': ' || '.join(f"{level['name']}: {level['possible_causes'] or 'N/A'}" for level in levels),
+        'concerns_summary': ' | '.join(concerns) if concerns else 'None',
+        'report_json': json.dumps({
+            'concerns': list(concerns),
+            'levels': [{**{f: level.get(f) for f in LEVEL_FIELDS}, 'abnormal': bool(level['abnormal'])}
+                       for level in levels],
+        }),
+    }
+
+
+def parse_flat_report(record: dict) -> dict:
+    """Normalized report from a flat sheet row.
+
+    Rows with a report_json cell are read from it as-is. Older rows are parsed
+    best-effort: parameter names come from the '||'-joined explanation
+    columns, which carry the name with each entry, and the comma-joined value
+    and range columns are split to that many parts; any extra pieces (values
+    that themselves contained ', ') are folded back into the last parameter.
+    """
+    structured = _load_structured(record.get('report_json'))
+    if structured is not None:
+        return {
+            'id': str(record.get('id', '')).strip(),
+            'timestamp': str(record.get('timestamp', '')),
+            'test_type': str(record.get('test_type', '')),
+            'concerns': structured['concerns'],
+            'levels': structured['levels'],
+        }
+    explanations = {
+        field: _split_named(record.get(field, ''))
+        for field in ('what_it_is', 'your_level_means', 'why_it_matters', 'possible_causes')
+    }
+    names = [name for name, _ in explanations['what_it_is']]
+    if not names:
+        names = [n for n in str(record.get('parameter_name', '')).split(', ') if n]
+    values = _split_to(record.get('value', ''), len(names))
+    ranges = _split_to(record.get('reference_range', ''), len(names))
+
+    levels = []
+    for i, name in enumerate(names):
+        level = {'name': name, 'value': values[i], 'reference_range': ranges[i] or 'N/A'}
+        for field, entries in explanations.items():
+            level[field] = entries[i][1] if i < len(entries) else ''
+        if level['possible_causes'] in ('', 'N/A', 'None'):
+            level['possible_causes'] = None
+        level['abnormal'] = level['possible_causes'] is not None
+        levels.append(level)
+
+    concerns = str(record.get('concerns_summary', '') or '')
+    return {
+        'id': str(record.get('id', '')).strip(),
+        'timestamp': str(record.get('timestamp', '')),
+        'test_type': str(record.get('test_type', '')),
+        'concerns': [] if concerns.lower() in ('', 'none') else concerns.split(' | '),
+        'levels': levels,
+    }
+
+
+def _load_structured(text):
+    try:
+        structured = json.loads(text) if text else None
+    except ValueError:
+        return None
+    if not isinstance(structured, dict) or not isinstance(structured.get('levels'), list):
+        return None
+    levels = [{**{f: level.get(f) for f in LEVEL_FIELDS}, 'abnormal': bool(level.get('abnormal'))}
+              for level in structured['levels']]
+    return {'concerns': list(structured.get('concerns') or []), 'levels': levels}
+
+
+def _split_named(text) -> list:
+    entries = []
+    for part in str(text or '').split(' || '):
+        if not part:
+            continue
+        name, sep, rest = part.partition(': ')
+        entries.append((name, rest) if sep else ('', part))
+    return entries
+
+
+def _split_to(text, count: int) -> list:
+    parts = str(text or '').split(', ')
+    if count and len(parts) > count:
+        parts = parts[:count - 1] + [', '.join(parts[count - 1:])]
+    return parts + [''] * (count - len(parts))
+
+
+class LRUCache:
+    """Thread-safe LRU cache whose entries expire after ttl seconds"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if time.monotonic() >= expires_at:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+
+class ReportIndex(SheetIndex):
+    """In-memory id -> rows index over the lab reports sheet.
+
+    output_cache holds formatted tool output per id; entries are dropped
+    whenever a new row for that id is indexed.
+    """
+
+    def __init__(self, sheet_getter, max_staleness: float = REPORT_INDEX_MAX_STALENESS,
+                 full_sync_interval: float = REPORT_INDEX_FULL_SYNC_INTERVAL,
+                 cache_size: int = REPORT_CACHE_SIZE, cache_ttl: float = REPORT_CACHE_TTL):
+        super().__init__(sheet_getter, max_staleness, full_sync_interval)
+        self._by_id = {}
+        self._pending = {}
+        self.output_cache = LRUCache(cache_size, cache_ttl)
+
+    def reports_for(self, report_id) -> list:
+        """Return all report records with the given id"""
+        key = str(report_id).strip()
+        self.ensure_fresh()
+        with self._lock:
+            records = self._by_id.get(key)
+        if not records:
+            # The report may have been saved since our last sync
+            self.ensure_fresh(max_staleness=0)
+            with self._lock:
+                records = self._by_id.get(key)
+        return list(records or [])
+
+    def add(self, record: dict):
+        """Record a report row we appended (or queued) to the sheet"""
+        key = str(record.get('id', '')).strip()
+        with self._lock:
+            self._by_id.setdefault(key, []).append(record)
+            # Kept until a sync reads the row back, so queued writes stay visible
+            self._pending[(key, str(record.get('timestamp', '')))] = record
+        self.output_cache.invalidate(key)
+
+    def _reset(self):
+        self._by_id = {}
+        for (key, _), record in self._pending.items():
+            self._by_id.setdefault(key, []).append(record)
+        self.output_cache.invalidate()
+
+    def _index_row(self, row: list):
+        record = dict(zip(self._header, row))
+        key = str(record.get('id', '')).strip()
+        if not key:
+            return
+        if self._pending.pop((key, str(record.get('timestamp', ''))), None) is not None:
+            return
+        self._by_id.setdefault(key, []).append(record)
+        self.output_cache.invalidate(key)
@@ -0,0 +1,681 @@
+import atexit
+import functools
+import os
+import random
+import sqlite3
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime, timezone, timedelta
+import gspread
+from gspread.utils import rowcol_to_a1
+from google.auth.transport.requests import Request
+from google.oauth2.service_account import Credentials
+from requests.exceptions import ConnectionError as RequestsConnectionError, Timeout as RequestsTimeout
+
+SCOPES = ['https://www.googleapis.com/auth/spreadsheets']
+
+# Refresh access tokens this many seconds before they expire
+TOKEN_REFRESH_MARGIN = int(os.getenv('SHEETS_TOKEN_REFRESH_MARGIN', '300'))
+# Per-request HTTP timeout for Sheets API calls, in seconds
+SHEETS_HTTP_TIMEOUT = float(os.getenv('SHEETS_HTTP_TIMEOUT', '15'))
+# Write-behind batching: flush when this many rows are queued or the oldest is this many seconds old
+SHEETS_BATCH_SIZE = int(os.getenv('SHEETS_BATCH_SIZE', '50'))
+SHEETS_FLUSH_INTERVAL = float(os.getenv('SHEETS_FLUSH_INTERVAL', '2'))
+SHEETS_MAX_BACKOFF = float(os.getenv('SHEETS_MAX_BACKOFF', '60'))
+
+# Sheets API quota for this service account (Google's default is 60 reads and 60 writes per
+# minute per user). The buckets are shared by every process on the host through SHEETS_QUOTA_DB;
+# with several hosts, give each its share. SHEETS_BURST requests may go out back to back.
+SHEETS_READS_PER_MINUTE = float(os.getenv('SHEETS_READS_PER_MINUTE', '60'))
+SHEETS_WRITES_PER_MINUTE = float(os.getenv('SHEETS_WRITES_PER_MINUTE', '60'))
+SHEETS_BURST = float(os.getenv('SHEETS_BURST', '10'))
+SHEETS_QUOTA_DB = os.getenv('SHEETS_QUOTA_DB', os.getenv('SQLITE_PATH', 'hospital.db'))
+# Seconds a read / write may spend waiting for quota and retrying before it gives up
+SHEETS_READ_DEADLINE = float(os.getenv('SHEETS_READ_DEADLINE', '5'))
+SHEETS_WRITE_DEADLINE = float(os.getenv('SHEETS_WRITE_DEADLINE', '8'))
+SHEETS_MAX_RETRIES = int(os.getenv('SHEETS_MAX_RETRIES', '4'))
+# After this many failed calls in a row, stop calling Sheets for the cooldown (seconds)
+SHEETS_BREAKER_THRESHOLD = int(os.getenv('SHEETS_BREAKER_THRESHOLD', '5'))
+SHEETS_BREAKER_COOLDOWN = float(os.getenv('SHEETS_BREAKER_COOLDOWN', '30'))
+
+# Quota exhausted or a server-side failure; anything else (bad range, no access) is not retried
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class SheetsUnavailable(Exception):
+    """Raised when Sheets is failing (circuit open) or a call ran out of quota or time"""
+
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, gspread.exceptions.APIError):
+        return error.code in RETRYABLE_STATUS
+    return isinstance(error, (RequestsConnectionError, RequestsTimeout))
+
+
+class QuotaBucket:
+    """Token bucket kept in SQLite, so all processes on the host draw from one Sheets quota.
+
+    Refills at (per_minute - burst) / 60 tokens a second up to burst tokens,
+    which keeps any 60 second window within per_minute requests. Burst is
+    capped at half of per_minute, so the bucket always refills.
+    """
+
+    def __init__(self, name: str, per_minute: float, burst: float = SHEETS_BURST, path: str = SHEETS_QUOTA_DB):
+        if per_minute <= 0:
+            raise ValueError(f"Sheets {name} quota must be above 0 requests per minute, got {per_minute:g}")
+        self.name = name
+        self.burst = max(0.0, min(burst, per_minute / 2))
+        self.rate = (per_minute - self.burst) / 60
+        self.path = path
+        self._local = threading.local()
+
+    def reserve(self, max_wait: float):
+        """Take a token; returns seconds to wait before using it, or None if that would exceed max_wait"""
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            now = time.time()
+            row = conn.execute('SELECT tokens, updated_at FROM sheets_quota WHERE name = ?', (self.name,)).fetchone()
+            tokens = self.burst if row is None else min(self.burst, row[0] + (now - row[1]) * self.rate)
+            wait = max(0.0, (1 - tokens) / self.rate)
+            if wait > max_wait:
+                return None
+            # Tokens may go negative: later callers queue behind the ones already waiting
+            conn.execute('INSERT OR REPLACE INTO sheets_quota (name, tokens, updated_at) VALUES (?, ?, ?)',
+                         (self.name, tokens - 1, now))
+            return wait
+        finally:
+            conn.execute('COMMIT')
+
+    def drain(self):
+        """Empty the bucket, e.g. after Google answered 429, so every process slows down"""
+        conn = self._connection()
+        conn.execute('INSERT OR REPLACE INTO sheets_quota (name, tokens, updated_at) VALUES (?, 0, ?)',
+                     (self.name, time.time()))
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS sheets_quota '
+                         '(name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)')
+            self._local.conn = conn
+        return conn
+
+
+class _Flight:
+    """One in-flight read that identical concurrent reads wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class _Prepaid:
+    """Quota tokens taken in advance for this thread's next calls; see SheetsScheduler.prepaid()"""
+
+    def __init__(self, scheduler, kinds: tuple):
+        self.scheduler = scheduler
+        self.kinds = kinds
+        self._outer = None
+
+    def __enter__(self):
+        self.scheduler._reserve_all(self.kinds)
+        self._outer = getattr(self.scheduler._local, 'prepaid', None)
+        self.scheduler._local.prepaid = Counter(self.kinds)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # Tokens the block did not use are dropped, not handed to later calls
+        self.scheduler._local.prepaid = self._outer
+        return False
+
+
+class SheetsScheduler:
+    """Paces, retries and de-duplicates Sheets API calls for this process.
+
+    - Identical reads in flight at the same time share one request (single-flight).
+    - Every request takes a token from the shared read or write QuotaBucket first.
+    - 429 and 5xx responses are retried with exponential backoff and jitter.
+    - After breaker_threshold failures in a row the circuit opens: calls fail
+      at once with SheetsUnavailable for breaker_cooldown seconds, then one
+      probe call decides whether to close it again. Callers holding data (the
+      sheet indexes) keep serving it meanwhile.
+
+    Each call gives up with SheetsUnavailable once its deadline has passed, so
+    callers see bounded latency instead of piling up behind the quota.
+    """
+
+    def __init__(self, reads_per_minute: float = SHEETS_READS_PER_MINUTE,
+                 writes_per_minute: float = SHEETS_WRITES_PER_MINUTE, burst: float = SHEETS_BURST,
+                 path: str = SHEETS_QUOTA_DB, read_deadline: float = SHEETS_READ_DEADLINE,
+                 write_deadline: float = SHEETS_WRITE_DEADLINE, max_retries: int = SHEETS_MAX_RETRIES,
+                 max_backoff: float = SHEETS_MAX_BACKOFF, breaker_threshold: int = SHEETS_BREAKER_THRESHOLD,
+                 breaker_cooldown: float = SHEETS_BREAKER_COOLDOWN):
+        self.buckets = {
+            'read': QuotaBucket('read', reads_per_minute, burst, path),
+            'write': QuotaBucket('write', writes_per_minute, burst, path),
+        }
+        self.deadlines = {'read': read_deadline, 'write': write_deadline}
+        self.max_retries = max_retries
+        self.max_backoff = max_backoff
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+        self.counts = Counter()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._flights = {}
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+
+    def read(self, key, func):
+        """Run func(), sharing the result with identical reads (same key) already in flight"""
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                self.counts['coalesced'] += 1
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+        try:
+            flight.value = self.call('read', func)
+            return flight.value
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def write(self, func):
+        return self.call('write', func)
+
+    def prepaid(self, *kinds):
+        """Wait for one token per kind now; this thread's next calls of those kinds then skip the wait.
+
+        Lets a caller sleep for quota before taking a lock rather than while
+        holding it:
+
+            with scheduler.prepaid('read', 'write'), lock:
+                ...
+        """
+        return _Prepaid(self, kinds)
+
+    def _reserve_all(self, kinds: tuple):
+        waits = []
+        for kind in kinds:
+            wait = self.buckets[kind].reserve(self.deadlines[kind])
+            if wait is None:
+                self.counts['over_quota'] += 1
+                raise SheetsUnavailable(f"Sheets {kind} quota used up for the next {self.deadlines[kind]:g}s")
+            waits.append(wait)
+        if waits and max(waits) > 0:
+            self.counts['throttled'] += 1
+            time.sleep(max(waits))
+
+    def call(self, kind: str, func):
+        """Run func() within the quota, retrying transient failures until the deadline"""
+        deadline = time.monotonic() + self.deadlines[kind]
+        attempt = 0
+        while True:
+            self._admit()
+            prepaid = getattr(self._local, 'prepaid', None)
+            if attempt == 0 and prepaid and prepaid[kind] > 0:
+                prepaid[kind] -= 1
+                wait = 0.0
+            else:
+                wait = self.buckets[kind].reserve(deadline - time.monotonic())
+            if wait is None:
+                self._end_probe()
+                self.counts['over_quota'] += 1
+                raise SheetsUnavailable(f"Sheets {kind} quota used up for the next {self.deadlines[kind]:g}s")
+            if wait > 0:
+                self.counts['throttled'] += 1
+                time.sleep(wait)
+            self.counts[kind] += 1
+            try:
+                result = func()
+            except Exception as e:
+                if not is_retryable(e):
+                    # The request reached Sheets and was refused; Sheets itself is fine
+                    self._succeeded()
+                    raise
+                self._failed()
+                if getattr(e, 'code', None) == 429:
+                    self.buckets[kind].drain()
+                attempt += 1
+                delay = min(self.max_backoff, 0.5 * 2 ** attempt) * random.uniform(0.5, 1.0)
+                if attempt > self.max_retries or time.monotonic() + delay >= deadline:
+                    raise
+                self.counts['retries'] += 1
+                time.sleep(delay)
+                continue
+            self._succeeded()
+            return result
+
+    def is_open(self) -> bool:
+        with self._lock:
+            return self._opened_at is not None
+
+    def _admit(self):
+        with self._lock:
+            if self._opened_at is None:
+                return
+            if time.monotonic() - self._opened_at < self.breaker_cooldown or self._probing:
+                self.counts['rejected'] += 1
+                raise SheetsUnavailable('Google Sheets is failing; calls are paused')
+            # Half open: this call is the probe
+            self._probing = True
+
+    def _end_probe(self):
+        with self._lock:
+            self._probing = False
+
+    def _failed(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing or (self._opened_at is None and self._failures >= self.breaker_threshold):
+                if self._opened_at is None:
+                    print(f"Google Sheets failing ({self._failures} errors in a row); "
+                          f"pausing calls for {self.breaker_cooldown:g}s")
+                    self.counts['breaker_opened'] += 1
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+    def _succeeded(self):
+        with self._lock:
+            self._failures = 0
+            if self._opened_at is not None:
+                print("Google Sheets recovered; resuming calls")
+            self._opened_at = None
+            self._probing = False
+
+
+class ScheduledWorksheet:
+    """Worksheet wrapper that sends every Sheets API call through a SheetsScheduler"""
+
+    READS = {'get_all_values', 'get_all_records', 'get', 'get_values', 'row_values', 'col_values'}
+    WRITES = {'append_row', 'append_rows', 'insert_row', 'insert_rows', 'update', 'batch_update', 'delete_rows'}
+
+    def __init__(self, worksheet, scheduler: SheetsScheduler, key=None):
+        self.worksheet = worksheet
+        self.scheduler = scheduler
+        self.key = key if key is not None else id(worksheet)
+
+    def __getattr__(self, name):
+        attr = getattr(self.worksheet, name)
+        if name in self.READS:
+            def read(*args, **kwargs):
+                key = (self.key, name, repr(args), repr(sorted(kwargs.items())))
+                return self.scheduler.read(key, functools.partial(attr, *args, **kwargs))
+            return read
+        if name in self.WRITES:
+            def write(*args, **kwargs):
+                return self.scheduler.write(functools.partial(attr, *args, **kwargs))
+            return write
+        return attr
+
+
+class SheetsClientRegistry:
+    """Process-wide cache of authorized gspread clients and worksheet handles.
+
+    Holds one client per credentials file and one worksheet handle per
+    (credentials, spreadsheet, worksheet). Access is guarded by a lock so the
+    Flask threads and the agent's event loop can share it, and a daemon thread
+    refreshes tokens before they expire so calls never pay for the OAuth exchange.
+    """
+
+    def __init__(self, scopes=SCOPES, refresh_margin: int = TOKEN_REFRESH_MARGIN):
+        self._scopes = scopes
+        self._refresh_margin = timedelta(seconds=refresh_margin)
+        self._lock = threading.RLock()
+        self._credentials = {}
+        self._clients = {}
+        self._worksheets = {}
+        self._stop = threading.Event()
+        self._refresher = None
+
+    def client(self, credentials_file: str) -> gspread.Client:
+        """Return the shared authorized client for a credentials file"""
+        with self._lock:
+            client = self._clients.get(credentials_file)
+            if client is None:
+                creds = Credentials.from_service_account_file(credentials_file, scopes=self._scopes)
+                creds.refresh(Request())
+                client = gspread.authorize(creds)
+                client.http_client.set_timeout(SHEETS_HTTP_TIMEOUT)
+                self._credentials[credentials_file] = creds
+                self._clients[credentials_file] = client
+                self._start_refresher()
+            return client
+
+    def worksheet(self, credentials_file: str, spreadsheet_id: str, title: str = None) -> ScheduledWorksheet:
+        """Return the cached worksheet handle (first sheet unless a title is given), paced by the scheduler"""
+        key = (credentials_file, spreadsheet_id, title)
+        with self._lock:
+            worksheet = self._worksheets.get(key)
+            if worksheet is None:
+                spreadsheet = self.client(credentials_file).open_by_key(spreadsheet_id)
+                worksheet = spreadsheet.worksheet(title) if title else spreadsheet.sheet1
+                worksheet = ScheduledWorksheet(worksheet, scheduler, key)
+                self._worksheets[key] = worksheet
+            return worksheet
+
+    def invalidate(self, credentials_file: str = None):
+        """Drop cached clients and handles, e.g. after credentials were rotated"""
+        with self._lock:
+            if credentials_file is None:
+                self._credentials.clear()
+                self._clients.clear()
+                self._worksheets.clear()
+                return
+            self._credentials.pop(credentials_file, None)
+            self._clients.pop(credentials_file, None)
+            for key in [k for k in self._worksheets if k[0] == credentials_file]:
+                del self._worksheets[key]
+
+    def close(self):
+        """Stop the background token refresher"""
+        self._stop.set()
+
+    def _start_refresher(self):
+        if self._refresher is not None and self._refresher.is_alive():
+            return
+        self._stop.clear()
+        self._refresher = threading.Thread(target=self._refresh_loop, name='sheets-token-refresh', daemon=True)
+        self._refresher.start()
+
+    def _refresh_loop(self):
+        interval = max(self._refresh_margin.total_seconds() / 2, 5)
+        while not self._stop.wait(interval):
+            with self._lock:
+                credentials = list(self._credentials.items())
+            for credentials_file, creds in credentials:
+                if not self._needs_refresh(creds):
+                    continue
+                try:
+                    creds.refresh(Request())
+                except Exception as e:
+                    print(f"Error refreshing Google Sheets token for {credentials_file}: {str(e)}")
+
+    def _needs_refresh(self, creds: Credentials) -> bool:
+        if creds.expiry is None:
+            return True
+        # google-auth stores expiry as a naive UTC datetime
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        return creds.expiry - now <= self._refresh_margin
+
+
+def ensure_header(sheet: gspread.Worksheet, headers: list):
+    """Insert the header row if the sheet does not start with it, or add columns it is missing"""
+    try:
+        current = sheet.row_values(1)
+    except Exception:
+        current = []
+    if not current or current[0] != headers[0]:
+        sheet.insert_row(headers, 1)
+    elif len(current) < len(headers) and current == headers[:len(current)]:
+        sheet.update([headers], 'A1')
+
+
+class SheetBatchWriter:
+    """Write-behind queue that appends rows to a worksheet in batches.
+
+    Callers put() rows and return immediately; a daemon thread checks the
+    header once, then flushes queued rows with a single append_rows() when
+    batch_size rows are waiting or the oldest has waited flush_interval
+    seconds. Failed batches go back to the front of the queue and are retried
+    with backoff. The queue is flushed at interpreter exit.
+    """
+
+    def __init__(self, sheet_getter, headers: list = None, batch_size: int = SHEETS_BATCH_SIZE,
+                 flush_interval: float = SHEETS_FLUSH_INTERVAL, max_backoff: float = SHEETS_MAX_BACKOFF):
+        self._get_sheet = sheet_getter
+        self.headers = headers
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_backoff = max_backoff
+        self._queue = deque()
+        self._oldest_at = None
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._header_checked = headers is None
+        self._failures = 0
+        self._stopped = False
+        self._thread = None
+
+    def start(self):
+        with self._cond:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopped = False
+            if self._thread is None:
+                atexit.register(self.stop)
+            self._thread = threading.Thread(target=self._run, name='sheets-batch-writer', daemon=True)
+            self._thread.start()
+
+    def put(self, row: list):
+        """Queue a row for the next batch"""
+        self.put_many([row])
+
+    def put_many(self, rows: list):
+        """Queue several rows at once so they are written in the same batch"""
+        if not rows:
+            return
+        with self._cond:
+            if not self._queue:
+                self._oldest_at = time.monotonic()
+            self._queue.extend(rows)
+            self._cond.notify()
+        if self._thread is None:
+            self.start()
+
+    def depth(self) -> int:
+        """Number of rows waiting to be written"""
+        with self._cond:
+            return len(self._queue)
+
+    def flush(self) -> int:
+        """Append everything queued right now; returns the number of rows written"""
+        with self._flush_lock:
+            with self._cond:
+                rows = list(self._queue)
+                self._queue.clear()
+                self._oldest_at = None
+            if not rows:
+                return 0
+            try:
+                sheet = self._get_sheet()
+                if not self._header_checked:
+                    ensure_header(sheet, self.headers)
+                    self._header_checked = True
+                sheet.append_rows(rows)
+            except Exception:
+                with self._cond:
+                    self._queue.extendleft(reversed(rows))
+                    self._oldest_at = time.monotonic()
+                raise
+            return len(rows)
+
+    def stop(self):
+        """Stop the writer thread and flush whatever is left"""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"Error flushing {self.depth()} queued row(s) to Google Sheets: {str(e)}")
+
+    def _run(self):
+        if not self._header_checked:
+            try:
+                ensure_header(self._get_sheet(), self.headers)
+                self._header_checked = True
+            except Exception as e:
+                print(f"Error checking Google Sheet header: {str(e)}")
+        while True:
+            with self._cond:
+                while not self._stopped and not self._due():
+                    self._cond.wait(self._wait_time())
+                if self._stopped:
+                    return
+            try:
+                self.flush()
+                self._failures = 0
+            except Exception as e:
+                self._failures += 1
+                delay = min(self.max_backoff, 2 ** self._failures)
+                print(f"Error writing batch to Google Sheets, retrying in {delay}s: {str(e)}")
+                with self._cond:
+                    self._cond.wait_for(lambda: self._stopped, timeout=delay)
+
+    def _due(self) -> bool:
+        if not self._queue:
+            return False
+        if len(self._queue) >= self.batch_size:
+            return True
+        return time.monotonic() - self._oldest_at >= self.flush_interval
+
+    def _wait_time(self):
+        if not self._queue:
+            return None
+        return max(self.flush_interval - (time.monotonic() - self._oldest_at), 0.01)
+
+
+class SheetIndex:
+    """Base class for in-memory indexes over a worksheet.
+
+    The sheet is downloaded once; afterwards only rows past the last indexed
+    row are fetched, so a sync costs one small range read instead of
+    get_all_records(). A periodic full resync picks up rows that were edited
+    or deleted by hand. Concurrent syncs are coalesced, and readers keep
+    using the current index while a sync is fetching; waiting on another
+    sync is capped at SHEETS_READ_DEADLINE. If a sync fails once
+    the index holds data, the index is served as last known until Sheets
+    recovers. Subclasses implement _reset() and _index_row().
+    """
+
+    def __init__(self, sheet_getter, max_staleness: float, full_sync_interval: float):
+        self._get_sheet = sheet_getter
+        self.max_staleness = max_staleness
+        self.full_sync_interval = full_sync_interval
+        self._lock = threading.RLock()
+        self._sync_lock = threading.Lock()
+        self._header = None
+        self._rows_indexed = 0
+        self._synced_at = None
+        self._full_synced_at = None
+        self._syncing = None
+        self._last_sync = None
+        self._stale_since = None
+
+    def ensure_fresh(self, max_staleness: float = None):
+        """Sync if the index is older than max_staleness seconds"""
+        if max_staleness is None:
+            max_staleness = self.max_staleness
+        now = time.monotonic()
+        with self._lock:
+            synced_at = self._synced_at
+            full_synced_at = self._full_synced_at
+        try:
+            if full_synced_at is None or now - full_synced_at >= self.full_sync_interval:
+                self.sync(full=True)
+            elif now - synced_at >= max_staleness:
+                self.sync()
+        except Exception as e:
+            if full_synced_at is None:
+                raise
+            with self._lock:
+                if self._stale_since is None:
+                    self._stale_since = now
+                    print(f"Error syncing {type(self).__name__}, serving last known data: {str(e)}")
+
+    def sync(self, full: bool = False):
+        """Pull new rows from the sheet (or everything when full=True) into the index"""
+        requested_at = time.monotonic()
+        with self._lock:
+            syncing = self._syncing
+        # Join a sync already fetching rather than queueing a second fetch behind it
+        if syncing is not None and (syncing[1] or not full):
+            flight = syncing[0]
+            if not flight.done.wait(SHEETS_READ_DEADLINE):
+                raise SheetsUnavailable(f"{type(self).__name__} sync still running after {SHEETS_READ_DEADLINE:g}s")
+            if flight.error is not None:
+                raise flight.error
+            return
+        if not self._sync_lock.acquire(timeout=SHEETS_READ_DEADLINE):
+            raise SheetsUnavailable(f"{type(self).__name__} sync still running after {SHEETS_READ_DEADLINE:g}s")
+        try:
+            # A sync that started after we asked has already brought in what we need
+            last = self._last_sync
+            if last is not None and last[0] >= requested_at and (last[1] or not full):
+                return
+            started_at = time.monotonic()
+            full = full or self._header is None
+            flight = _Flight()
+            with self._lock:
+                self._syncing = (flight, full)
+            try:
+                self._fetch(full)
+            except Exception as e:
+                flight.error = e
+                raise
+            finally:
+                with self._lock:
+                    self._syncing = None
+                flight.done.set()
+            self._last_sync = (started_at, full)
+        finally:
+            self._sync_lock.release()
+
+    def _fetch(self, full: bool):
+        sheet = self._get_sheet()
+        # Fetch without holding _lock, so readers use the current index meanwhile
+        if full:
+            values = sheet.get_all_values()
+            with self._lock:
+                self._header = values[0] if values else []
+                self._rows_indexed = 0
+                self._reset()
+                self._index_rows(values[1:])
+                self._full_synced_at = time.monotonic()
+        elif self._header:
+            # Data starts on row 2; fetch only the rows we have not seen yet
+            start = self._rows_indexed + 2
+            last_column = rowcol_to_a1(1, len(self._header)).rstrip('0123456789')
+            rows = sheet.get(f"A{start}:{last_column}")
+            with self._lock:
+                self._index_rows(rows)
+        with self._lock:
+            self._synced_at = time.monotonic()
+            if self._stale_since is not None:
+                print(f"{type(self).__name__} synced again after {self._synced_at - self._stale_since:.0f}s")
+                self._stale_since = None
+
+    def _index_rows(self, rows):
+        for row in rows:
+            self._rows_indexed += 1
+            self._index_row(row)
+
+    def _reset(self):
+        raise NotImplementedError
+
+    def _index_row(self, row: list):
+        raise NotImplementedError
+
+
+scheduler = SheetsScheduler()
+registry = SheetsClientRegistry()
@@ -1,9 +1,10 @@
-
-
-
-
-
+import argparse
 import asyncio
+import csv
+import json
+import random
+import time
+import aiohttp
 from livekit import api
 import os
 
@@ -17,30 +18,69 @@ PHONE_NUMBER_TO_CALL = "+9203028673105"
 # Your trunk details
 TRUNK_ID = "ST_bzmqX6FYgMPK"
 
+# Campaign defaults (each can be overridden on the command line)
+CAMPAIGN_MAX_CONCURRENT_CALLS = int(os.getenv('CAMPAIGN_MAX_CONCURRENT_CALLS', '10'))
+CAMPAIGN_CALLS_PER_SECOND = float(os.getenv('CAMPAIGN_CALLS_PER_SECOND', '1'))
+CAMPAIGN_MAX_ATTEMPTS = int(os.getenv('CAMPAIGN_MAX_ATTEMPTS', '3'))
+CAMPAIGN_MAX_BACKOFF = float(os.getenv('CAMPAIGN_MAX_BACKOFF', '60'))
+# A call holds its concurrency slot until the callee hangs up (polled this often) or this many seconds pass
+CALL_POLL_INTERVAL = float(os.getenv('CALL_POLL_INTERVAL', '5'))
+CALL_MAX_DURATION = float(os.getenv('CALL_MAX_DURATION', '900'))
+
+# Room reaper: rooms are checked this often, a room with no caller left in it is ended after
+# this many seconds, and rooms are inspected / deleted this many at a time
+REAPER_INTERVAL = float(os.getenv('REAPER_INTERVAL', '30'))
+REAPER_IDLE_SECONDS = float(os.getenv('REAPER_IDLE_SECONDS', '120'))
+REAPER_BATCH_SIZE = int(os.getenv('REAPER_BATCH_SIZE', '20'))
+
+# Twirp error codes worth retrying; anything else (bad number, auth, ...) fails the call at once
+RETRYABLE_CODES = {'unavailable', 'internal', 'resource_exhausted', 'deadline_exceeded', 'aborted', 'unknown'}
+
 PHONE_NUMBER_TO_CALL = "+9203028673105"
-async def make_outbound_call(phone_number: str, room_name: str = None):
+
+
+def create_api_client() -> api.LiveKitAPI:
+    """One LiveKitAPI client to share across many calls; its HTTP session keeps connections open.
+
+    Must be created inside a running event loop; close it with aclose().
+    """
+    return api.LiveKitAPI(
+        url=LIVEKIT_URL,
+        api_key=LIVEKIT_API_KEY,
+        api_secret=LIVEKIT_API_SECRET
+    )
+
+
+async def make_outbound_call(phone_number: str, room_name: str = None, lk_api=None,
+                             metadata: str = "Outbound call from LiveKit", quiet: bool = False):
     """
     Make an outbound SIP call through LiveKit
-    
+
     Args:
         phone_number: The phone number to call (E.164 format)
         room_name: Optional room name (will be auto-generated if not provided)
+        lk_api: Shared client to use; a temporary one is created (and closed) if not given
+        metadata: Participant metadata passed on to the agent
+        quiet: Skip the progress output (used by campaigns)
     """
-    
-    # Create LiveKit API client
-    lk_api = api.LiveKitAPI(
-        url=LIVEKIT_URL,
-        api_key=LIVEKIT_API_KEY,
-        api_secret=LIVEKIT_API_SECRET
-    )
-    
+
+    # Create LiveKit API client unless the caller shares one
+    own_client = lk_api is None
+    if own_client:
+        lk_api = api.LiveKitAPI(
+            url=LIVEKIT_URL,
+            api_key=LIVEKIT_API_KEY,
+            api_secret=LIVEKIT_API_SECRET
+        )
+
     # Generate room name if not provided
     if not room_name:
         room_name = f"call-{phone_number.replace('+', '')}"
-    
-    print(f"📞 Initiating call to {phone_number}")
-    print(f"🏠 Room: {room_name}")
-    
+
+    if not quiet:
+        print(f"📞 Initiating call to {phone_number}")
+        print(f"🏠 Room: {room_name}")
+
     try:
         # Create SIP participant (outbound call)
         sip_participant_info = await lk_api.sip.create_sip_participant(
@@ -51,75 +91,383 @@ async def make_outbound_call(phone_number: str, room_name: str = None):
                 participant_identity=f"phone-{phone_number.replace('+', '')}",
                 participant_name=f"Phone {phone_number}",
                 # Optional: Add metadata
-                participant_metadata="Outbound call from LiveKit",
+                participant_metadata=metadata,
                 # krisp_enabled = True,
                 # wait_until_answered = True
             )
         )
-        
-        print(f"✅ Call initiated successfully!")
-        print(f"   Participant SID: {sip_participant_info.participant_id}")
-        print(f"   Participant Identity: {sip_participant_info.participant_identity}")
-        print(f"   Room Name: {sip_participant_info.room_name}")
-        print(f"\n💡 The call is now active. Join the room to interact with the call.")
-        print(f"   Room URL: https://innovista-s5d8vhrb.livekit.cloud/rooms/{room_name}")
-        
+
+        if not quiet:
+            print(f"✅ Call initiated successfully!")
+            print(f"   Participant SID: {sip_participant_info.participant_id}")
+            print(f"   Participant Identity: {sip_participant_info.participant_identity}")
+            print(f"   Room Name: {sip_participant_info.room_name}")
+            print(f"\n💡 The call is now active. Join the room to interact with the call.")
+            print(f"   Room URL: https://innovista-s5d8vhrb.livekit.cloud/rooms/{room_name}")
+
         return sip_participant_info
-        
+
     except Exception as e:
-        print(f"❌ Error making call: {e}")
+        if not quiet:
+            print(f"❌ Error making call: {e}")
         raise
     finally:
-        await lk_api.aclose()
+        if own_client:
+            await lk_api.aclose()
 
-async def list_active_rooms():
+async def list_active_rooms(lk_api=None, quiet: bool = False):
     """List all active rooms to see ongoing calls"""
-    lk_api = api.LiveKitAPI(
-        url=LIVEKIT_URL,
-        api_key=LIVEKIT_API_KEY,
-        api_secret=LIVEKIT_API_SECRET
-    )
-    
+    own_client = lk_api is None
+    if own_client:
+        lk_api = api.LiveKitAPI(
+            url=LIVEKIT_URL,
+            api_key=LIVEKIT_API_KEY,
+            api_secret=LIVEKIT_API_SECRET
+        )
+
     try:
         rooms = await lk_api.room.list_rooms(api.ListRoomsRequest())
-        print(f"\n📋 Active Rooms: {len(rooms.rooms)}")
-        for room in rooms.rooms:
-            print(f"   - {room.name} ({room.num_participants} participants)")
+        if not quiet:
+            print(f"\n📋 Active Rooms: {len(rooms.rooms)}")
+            for room in rooms.rooms:
+                print(f"   - {room.name} ({room.num_participants} participants)")
         return rooms
     except Exception as e:
         print(f"❌ Error listing rooms: {e}")
     finally:
-        await lk_api.aclose()
+        if own_client:
+            await lk_api.aclose()
+
+async def end_call(room_name: str, lk_api=None, quiet: bool = False) -> bool:
+    """End a call by deleting the room; returns whether it was deleted"""
+    own_client = lk_api is None
+    if own_client:
+        lk_api = api.LiveKitAPI(
+            url=LIVEKIT_URL,
+            api_key=LIVEKIT_API_KEY,
+            api_secret=LIVEKIT_API_SECRET
+        )
 
-async def end_call(room_name: str):
-    """End a call by deleting the room"""
-    lk_api = api.LiveKitAPI(
-        url=LIVEKIT_URL,
-        api_key=LIVEKIT_API_KEY,
-        api_secret=LIVEKIT_API_SECRET
-    )
-    
     try:
         await lk_api.room.delete_room(api.DeleteRoomRequest(room=room_name))
-        print(f"✅ Call ended (room {room_name} deleted)")
+        if not quiet:
+            print(f"✅ Call ended (room {room_name} deleted)")
+        return True
     except Exception as e:
         print(f"❌ Error ending call: {e}")
+        return False
+    finally:
+        if own_client:
+            await lk_api.aclose()
+
+
+def load_campaign(path: str) -> list:
+    """Read campaign entries from a CSV (with a header row) or JSONL file.
+
+    Each entry needs a phone_number; every other field is passed to the
+    agent as participant metadata (e.g. name, appointment_date, reason).
+    """
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        if path.endswith('.jsonl') or path.endswith('.json'):
+            entries = [json.loads(line) for line in f if line.strip()]
+        else:
+            entries = list(csv.DictReader(f))
+    for i, entry in enumerate(entries, 1):
+        if not str(entry.get('phone_number', '')).strip():
+            raise ValueError(f"Entry {i} in {path} has no phone_number")
+        entry['phone_number'] = str(entry['phone_number']).strip()
+    return entries
+
+
+class RateLimiter:
+    """Spaces call starts at least 1/rate seconds apart"""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._lock = asyncio.Lock()
+        self._next_start = 0.0
+
+    async def wait(self):
+        async with self._lock:
+            now = time.monotonic()
+            if self._next_start > now:
+                await asyncio.sleep(self._next_start - now)
+                now = self._next_start
+            self._next_start = now + self.interval
+
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, api.TwirpError):
+        return error.code in RETRYABLE_CODES
+    return isinstance(error, (aiohttp.ClientError, asyncio.TimeoutError, ConnectionError))
+
+
+async def wait_for_call_end(lk_api, room_name: str, identity: str, poll_interval: float = CALL_POLL_INTERVAL,
+                            max_duration: float = CALL_MAX_DURATION) -> str:
+    """Wait until the phone participant leaves the room; returns 'completed' or 'timed_out'"""
+    deadline = time.monotonic() + max_duration
+    while time.monotonic() < deadline:
+        await asyncio.sleep(poll_interval)
+        try:
+            response = await lk_api.room.list_participants(api.ListParticipantsRequest(room=room_name))
+        except api.TwirpError as e:
+            if e.code == 'not_found':
+                return 'completed'
+            continue
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            continue
+        if not any(p.identity == identity for p in response.participants):
+            return 'completed'
+    return 'timed_out'
+
+
+async def place_campaign_call(lk_api, entry: dict, room_name: str, max_attempts: int = CAMPAIGN_MAX_ATTEMPTS,
+                              max_backoff: float = CAMPAIGN_MAX_BACKOFF, limiter: RateLimiter = None) -> dict:
+    """Dial one campaign entry, retrying transient errors with exponential backoff and jitter.
+
+    Every attempt, retries included, waits its turn on the limiter.
+    """
+    if max_attempts < 1:
+        raise ValueError(f"max_attempts must be at least 1, got {max_attempts}")
+    phone_number = entry['phone_number']
+    metadata = json.dumps({k: v for k, v in entry.items() if k != 'phone_number'})
+    result = {'phone_number': phone_number, 'room': room_name, 'attempts': 0, 'started_at': time.time()}
+    for attempt in range(1, max_attempts + 1):
+        result['attempts'] = attempt
+        if limiter:
+            await limiter.wait()
+        try:
+            info = await make_outbound_call(phone_number, room_name, lk_api=lk_api, metadata=metadata, quiet=True)
+        except Exception as e:
+            result['error'] = f"{getattr(e, 'code', type(e).__name__)}: {getattr(e, 'message', str(e))}"
+            if attempt == max_attempts or not is_retryable(e):
+                result['status'] = 'failed'
+                return result
+            await asyncio.sleep(random.uniform(0, min(max_backoff, 2 ** attempt)))
+            continue
+        result.pop('error', None)
+        result['status'] = 'initiated'
+        result['participant_id'] = info.participant_id
+        result['participant_identity'] = info.participant_identity
+        return result
+
+
+async def run_campaign(entries: list, lk_api, results_path: str = None,
+                       max_concurrent: int = CAMPAIGN_MAX_CONCURRENT_CALLS,
+                       calls_per_second: float = CAMPAIGN_CALLS_PER_SECOND,
+                       max_attempts: int = CAMPAIGN_MAX_ATTEMPTS, max_backoff: float = CAMPAIGN_MAX_BACKOFF,
+                       poll_interval: float = CALL_POLL_INTERVAL, max_duration: float = CALL_MAX_DURATION,
+                       campaign_id: str = None) -> list:
+    """Call every entry, each in its own room, and return one result dict per entry.
+
+    At most max_concurrent calls are live at once (a slot is held until the
+    callee hangs up) and new calls start at most calls_per_second. Results
+    are appended to results_path as JSON lines as soon as each call ends, so
+    an interrupted campaign still leaves a record of what was dialed.
+    """
+    # Checked before any number is dialed, not once per call
+    if max_attempts < 1:
+        raise ValueError(f"max_attempts must be at least 1, got {max_attempts}")
+    campaign_id = campaign_id or time.strftime('%Y%m%d%H%M%S')
+    slots = asyncio.Semaphore(max_concurrent)
+    limiter = RateLimiter(calls_per_second)
+    log_lock = asyncio.Lock()
+    log_file = open(results_path, 'a', encoding='utf-8') if results_path else None
+
+    async def call(index: int, entry: dict) -> dict:
+        room_name = f"campaign-{campaign_id}-{index}-{entry['phone_number'].replace('+', '')}"
+        async with slots:
+            result = await place_campaign_call(lk_api, entry, room_name, max_attempts, max_backoff, limiter)
+            if result['status'] == 'initiated':
+                outcome = await wait_for_call_end(
+                    lk_api, room_name, result['participant_identity'], poll_interval, max_duration)
+                if outcome == 'timed_out':
+                    await end_call(room_name, lk_api=lk_api)
+                result['status'] = outcome
+            result['duration'] = round(time.time() - result['started_at'], 1)
+        if log_file:
+            async with log_lock:
+                log_file.write(json.dumps(result) + '\n')
+                log_file.flush()
+        return result
+
+    try:
+        return await asyncio.gather(*(call(i, entry) for i, entry in enumerate(entries)))
+    finally:
+        if log_file:
+            log_file.close()
+
+
+async def campaign_main(args):
+    entries = load_campaign(args.file)
+    print(f"📞 Starting campaign: {len(entries)} numbers, {args.max_concurrent} at a time, {args.rate:g} calls/s")
+    lk_api = create_api_client()
+    try:
+        results = await run_campaign(
+            entries, lk_api, args.results,
+            max_concurrent=args.max_concurrent,
+            calls_per_second=args.rate,
+            max_attempts=args.max_attempts,
+            max_duration=args.max_duration,
+        )
+    finally:
+        await lk_api.aclose()
+    counts = {}
+    for result in results:
+        counts[result['status']] = counts.get(result['status'], 0) + 1
+    print(f"✅ Campaign finished: {counts}")
+    print(f"   Results written to {args.results}")
+
+
+class RoomReaper:
+    """Ends rooms that no longer have a caller, so agent sessions in them shut down.
+
+    The agent keeps its session open when a participant disconnects
+    (close_on_disconnect=False), so a dropped phone call leaves the agent
+    talking to an empty room. Each sweep lists every room and sorts it into:
+
+    - live: a caller (any participant that is not an agent) is still connected
+    - hung up: a caller was seen on an earlier sweep and has since left; ended at once
+    - idle: no caller yet or any more; ended once idle_seconds have passed since
+      the room was created or last had a caller
+
+    Rooms are inspected and ended batch_size at a time through one shared client.
+    """
+
+    def __init__(self, lk_api, idle_seconds: float = REAPER_IDLE_SECONDS, batch_size: int = REAPER_BATCH_SIZE,
+                 prefix: str = '', dry_run: bool = False):
+        self.lk_api = lk_api
+        self.idle_seconds = idle_seconds
+        self.batch_size = max(1, batch_size)
+        self.prefix = prefix
+        self.dry_run = dry_run
+        self.reaped_total = 0
+        self._had_caller = set()
+        self._idle_since = {}
+
+    @staticmethod
+    def is_caller(participant) -> bool:
+        if participant.kind == api.ParticipantInfo.Kind.AGENT:
+            return False
+        if participant.state == api.ParticipantInfo.State.DISCONNECTED:
+            return False
+        return participant.attributes.get('sip.callStatus') != 'hangup'
+
+    async def classify(self, room) -> str:
+        """'live', 'idle', 'reap' or 'gone' (deleted since it was listed)"""
+        try:
+            response = await self.lk_api.room.list_participants(api.ListParticipantsRequest(room=room.name))
+        except api.TwirpError as e:
+            if e.code == 'not_found':
+                return 'gone'
+            raise
+        now = time.time()
+        if any(self.is_caller(p) for p in response.participants):
+            self._had_caller.add(room.name)
+            self._idle_since[room.name] = now
+            return 'live'
+        if room.name in self._had_caller:
+            return 'reap'
+        idle_since = self._idle_since.setdefault(room.name, room.creation_time or now)
+        return 'reap' if now - idle_since >= self.idle_seconds else 'idle'
+
+    async def sweep(self) -> dict:
+        """Check every room once and end the abandoned ones; returns this sweep's counts"""
+        listing = await list_active_rooms(self.lk_api, quiet=True)
+        if listing is None:
+            return None
+        rooms = [room for room in listing.rooms if room.name.startswith(self.prefix)]
+        states = []
+        for start in range(0, len(rooms), self.batch_size):
+            batch = rooms[start:start + self.batch_size]
+            results = await asyncio.gather(*(self.classify(room) for room in batch), return_exceptions=True)
+            for room, state in zip(batch, results):
+                if isinstance(state, Exception):
+                    print(f"❌ Error checking room {room.name}: {state}")
+                    state = 'error'
+                states.append((room.name, state))
+
+        to_reap = [name for name, state in states if state == 'reap']
+        deleted = set()
+        if not self.dry_run:
+            for start in range(0, len(to_reap), self.batch_size):
+                batch = to_reap[start:start + self.batch_size]
+                results = await asyncio.gather(*(end_call(name, lk_api=self.lk_api, quiet=True) for name in batch))
+                deleted.update(name for name, ok in zip(batch, results) if ok)
+        self.reaped_total += len(deleted)
+
+        # Forget rooms that no longer exist
+        present = {name for name, state in states if state != 'gone'} - deleted
+        self._had_caller &= present
+        self._idle_since = {name: since for name, since in self._idle_since.items() if name in present}
+
+        counts = {state: sum(1 for _, s in states if s == state) for state in ('live', 'idle', 'error')}
+        counts.update(abandoned=len(to_reap), reaped=len(deleted), reaped_total=self.reaped_total)
+        return counts
+
+    async def run(self, interval: float = REAPER_INTERVAL, once: bool = False):
+        while True:
+            started = time.monotonic()
+            counts = await self.sweep()
+            if counts:
+                suffix = ' (dry run)' if self.dry_run else ''
+                print(f"🧹 {time.strftime('%H:%M:%S')} live={counts['live']} idle={counts['idle']} "
+                      f"abandoned={counts['abandoned']} reaped={counts['reaped']} "
+                      f"total reaped={counts['reaped_total']}{suffix}", flush=True)
+            if once:
+                return counts
+            await asyncio.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+
+async def reap_main(args):
+    print(f"🧹 Reaping rooms idle for {args.idle_seconds:g}s, checking every {args.interval:g}s")
+    lk_api = create_api_client()
+    try:
+        reaper = RoomReaper(lk_api, args.idle_seconds, args.batch_size, args.prefix, args.dry_run)
+        await reaper.run(args.interval, once=args.once)
     finally:
         await lk_api.aclose()
 
+
 async def main():
-    
+
     room_name = "up"
     await make_outbound_call(PHONE_NUMBER_TO_CALL, room_name)
-            
-        
 
-if __name__ == "__main__":
-    # Run the async main function
-    asyncio.run(main())
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Outbound calls through LiveKit SIP")
+    commands = parser.add_subparsers(dest='command')
+    campaign = commands.add_parser('campaign', help='Dial every number in a CSV or JSONL file')
+    campaign.add_argument('file', help='CSV (with a phone_number column) or JSONL file of calls')
+    campaign.add_argument('--results', default='campaign_results.jsonl', help='Per-number result log (JSON lines)')
+    campaign.add_argument('--max-concurrent', type=int, default=CAMPAIGN_MAX_CONCURRENT_CALLS)
+    campaign.add_argument('--rate', type=float, default=CAMPAIGN_CALLS_PER_SECOND, help='New calls per second')
+    campaign.add_argument('--max-attempts', type=int, default=CAMPAIGN_MAX_ATTEMPTS)
+    campaign.add_argument('--max-duration', type=float, default=CALL_MAX_DURATION,
+                          help='Seconds before a call still in progress is ended')
+    reap = commands.add_parser('reap', help='End rooms whose caller has left or that sit idle')
+    reap.add_argument('--interval', type=float, default=REAPER_INTERVAL, help='Seconds between sweeps')
+    reap.add_argument('--idle-seconds', type=float, default=REAPER_IDLE_SECONDS,
+                      help='End a room this long after its last caller left')
+    reap.add_argument('--batch-size', type=int, default=REAPER_BATCH_SIZE, help='Rooms checked / ended at once')
+    reap.add_argument('--prefix', default='', help='Only manage rooms whose name starts with this')
+    reap.add_argument('--once', action='store_true', help='Sweep once and exit')
+    reap.add_argument('--dry-run', action='store_true', help='Report rooms to end without ending them')
+    return parser.parse_args()
 
 
-#sip demo
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.command == 'campaign':
+        asyncio.run(campaign_main(args))
+    elif args.command == 'reap':
+        asyncio.run(reap_main(args))
+    else:
+        # Run the async main function
+        asyncio.run(main())
+
 
 
+#sip demo
@@ -0,0 +1,658 @@
+import atexit
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from appointments import SlotIndex
+from reports import (
+    ReportIndex, LRUCache, REPORT_CACHE_SIZE, REPORT_CACHE_TTL,
+    REPORT_COLUMNS, LEVEL_FIELDS, flatten_report, parse_flat_report
+)
+from gspread.utils import rowcol_to_a1
+from sheets import SheetBatchWriter, ensure_header, scheduler as sheets_scheduler
+
+# 'sqlite' (local primary store, replicated to Sheets) or 'sheets' (Sheets only).
+# Reports the web UI appends to the sheet directly reach SQLite through SheetsInboundSync
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'sqlite')
+SQLITE_PATH = os.getenv('SQLITE_PATH', 'hospital.db')
+# Set to 0 to keep the SQLite store local without copying rows to Sheets
+SHEETS_REPLICATION = os.getenv('SHEETS_REPLICATION', '1') == '1'
+OUTBOX_POLL_INTERVAL = float(os.getenv('OUTBOX_POLL_INTERVAL', '2'))
+OUTBOX_BATCH_SIZE = int(os.getenv('OUTBOX_BATCH_SIZE', '100'))
+OUTBOX_MAX_BACKOFF = float(os.getenv('OUTBOX_MAX_BACKOFF', '300'))
+# Seconds a replicator owns claimed outbox rows before another process may retry them
+OUTBOX_LEASE = float(os.getenv('OUTBOX_LEASE', '60'))
+# Seconds between pulls of rows added to the sheets by other writers (e.g. web UI uploads); 0 disables
+SHEETS_INBOUND_INTERVAL = float(os.getenv('SHEETS_INBOUND_INTERVAL', '30'))
+
+# Column order of the rows in the appointments Google Sheet
+APPOINTMENT_COLUMNS = ['timestamp', 'name', 'email', 'appointment_type', 'date', 'time']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS appointments (
+    row_id INTEGER PRIMARY KEY,
+    timestamp TEXT NOT NULL,
+    name TEXT,
+    email TEXT,
+    appointment_type TEXT,
+    date TEXT NOT NULL,
+    time TEXT NOT NULL,
+    UNIQUE (date, time)
+);
+CREATE TABLE IF NOT EXISTS report_headers (
+    row_id INTEGER PRIMARY KEY,
+    id TEXT NOT NULL,
+    timestamp TEXT,
+    test_type TEXT,
+    concerns TEXT NOT NULL DEFAULT '[]'
+);
+CREATE INDEX IF NOT EXISTS report_headers_by_id ON report_headers (id);
+CREATE TABLE IF NOT EXISTS report_levels (
+    report_row INTEGER NOT NULL REFERENCES report_headers (row_id),
+    position INTEGER NOT NULL,
+    report_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    value TEXT,
+    reference_range TEXT,
+    what_it_is TEXT,
+    your_level_means TEXT,
+    why_it_matters TEXT,
+    possible_causes TEXT,
+    abnormal INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (report_row, position)
+);
+CREATE INDEX IF NOT EXISTS report_levels_by_name ON report_levels (report_id, name COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS report_levels_abnormal ON report_levels (report_id) WHERE abnormal = 1;
+CREATE TABLE IF NOT EXISTS outbox (
+    row_id INTEGER PRIMARY KEY,
+    target TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL DEFAULT 0,
+    claimed_until REAL NOT NULL DEFAULT 0,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS outbox_due ON outbox (next_attempt_at);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+class StorageBackend:
+    """Storage used by the appointment and report tools and the /analyze save path"""
+
+    output_cache = None
+
+    def is_slot_booked(self, date: str, time_slot: str, max_staleness: float = None) -> bool:
+        raise NotImplementedError
+
+    def booked_times(self, date: str) -> set:
+        raise NotImplementedError
+
+    def booked_between(self, start_date: str, end_date: str) -> dict:
+        """{date: set of booked times} for ISO dates from start_date to end_date inclusive"""
+        raise NotImplementedError
+
+    def book_appointment(self, record: dict) -> bool:
+        """Store an appointment unless its slot is taken; returns False on conflict"""
+        raise NotImplementedError
+
+    def reports_for(self, report_id) -> list:
+        """Normalized reports ({id, timestamp, test_type, concerns, levels}) with this id"""
+        raise NotImplementedError
+
+    def get_parameter(self, report_id, name: str) -> list:
+        """The levels named name (case-insensitive) in the reports with this id"""
+        return [level for report in self.reports_for(report_id) for level in report['levels']
+                if level['name'].lower() == name.strip().lower()]
+
+    def abnormal_levels(self, report_id) -> list:
+        """The levels flagged abnormal in the reports with this id"""
+        return [level for report in self.reports_for(report_id) for level in report['levels'] if level['abnormal']]
+
+    def save_report(self, report: dict):
+        self.save_reports([report])
+
+    def save_reports(self, reports: list):
+        """Save several normalized reports as one bulk write"""
+        raise NotImplementedError
+
+    def pending_writes(self) -> int:
+        """Rows accepted locally but not yet written to Google Sheets"""
+        return 0
+
+    def warm(self):
+        """Load what the first lookup would otherwise have to fetch"""
+
+    def lookup_reports(self, report_id, formatter) -> str:
+        """Return formatter(report_id, records), cached per id while reports exist"""
+        key = str(report_id).strip()
+        output = self.output_cache.get(key)
+        if output is not None:
+            return output
+        records = self.reports_for(key)
+        output = formatter(report_id, records)
+        if records:
+            self.output_cache.set(key, output)
+        return output
+
+    def close(self):
+        pass
+
+
+class SheetsBackend(StorageBackend):
+    """Google Sheets as the live store, fronted by the in-memory slot and report indexes"""
+
+    def __init__(self, appointments_sheet, reports_sheet, scheduler=sheets_scheduler):
+        self._appointments_sheet = appointments_sheet
+        self.scheduler = scheduler
+        self.slots = SlotIndex(appointments_sheet)
+        self.reports = ReportIndex(reports_sheet)
+        self.output_cache = self.reports.output_cache
+        self._booking_lock = threading.Lock()
+        # Its thread starts with the first queued report, so roles that never save one don't run it
+        self.report_writer = SheetBatchWriter(reports_sheet, headers=REPORT_COLUMNS)
+
+    def warm(self):
+        self.slots.ensure_fresh()
+        self.reports.ensure_fresh()
+
+    def is_slot_booked(self, date: str, time_slot: str, max_staleness: float = None) -> bool:
+        return self.slots.is_booked(date, time_slot, max_staleness)
+
+    def booked_times(self, date: str) -> set:
+        return self.slots.booked_times(date)
+
+    def booked_between(self, start_date: str, end_date: str) -> dict:
+        return self.slots.booked_between(start_date, end_date)
+
+    def book_appointment(self, record: dict) -> bool:
+        # Wait for the re-check read and the append's quota before taking the lock,
+        # so bookings queue on the quota rather than behind each other's sleeps
+        with self.scheduler.prepaid('read', 'write'), self._booking_lock:
+            # Double-check availability against the latest rows before saving
+            if self.slots.is_booked(record['date'], record['time'], max_staleness=0):
+                return False
+            self._appointments_sheet().append_row([record[c] for c in APPOINTMENT_COLUMNS])
+            self.slots.add(record['date'], record['time'])
+            return True
+
+    def reports_for(self, report_id) -> list:
+        return [parse_flat_report(record) for record in self.reports.reports_for(report_id)]
+
+    def save_reports(self, reports: list):
+        records = [flatten_report(report) for report in reports]
+        # Queued together, so they leave in the same append_rows() call
+        self.report_writer.put_many([[record[c] for c in REPORT_COLUMNS] for record in records])
+        for record in records:
+            self.reports.add(record)
+
+    def pending_writes(self) -> int:
+        return self.report_writer.depth()
+
+
+class SQLiteBackend(StorageBackend):
+    """Local SQLite (WAL) store with write-behind replication to Google Sheets.
+
+    Every write also queues its sheet row in a durable outbox table in the
+    same transaction; a SheetsReplicator drains the outbox in the background,
+    so tool calls only touch local disk. The UNIQUE (date, time) constraint
+    keeps bookings race-free across threads and worker processes. Rows other
+    writers add to the sheets are pulled in by SheetsInboundSync.
+    """
+
+    def __init__(self, path: str = SQLITE_PATH, sheet_getters: dict = None,
+                 cache_size: int = REPORT_CACHE_SIZE, cache_ttl: float = REPORT_CACHE_TTL):
+        self.path = path
+        self.sheet_getters = sheet_getters or {}
+        self.output_cache = LRUCache(cache_size, cache_ttl)
+        self._local = threading.local()
+        self._ready = False
+        self._ready_lock = threading.Lock()
+        self._sheet_headers = {}
+
+    def connection(self) -> sqlite3.Connection:
+        """Return this thread's connection, creating the schema on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        if not self._ready:
+            self._ensure_ready(conn)
+        return conn
+
+    def warm(self):
+        self.connection()
+
+    def _ensure_ready(self, conn: sqlite3.Connection):
+        with self._ready_lock:
+            if self._ready:
+                return
+            conn.executescript(SCHEMA)
+            self._migrate_flat_reports(conn)
+            self._dedupe_reports(conn)
+            self._import_from_sheets(conn)
+            self._ready = True
+
+    def _migrate_flat_reports(self, conn: sqlite3.Connection):
+        """Move rows from the old one-row-per-report table into the normalized tables"""
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'reports'"
+        ).fetchone()
+        if not exists:
+            return
+        with transaction(conn):
+            rows = conn.execute('SELECT * FROM reports ORDER BY row_id').fetchall()
+            for row in rows:
+                self._insert_report(conn, parse_flat_report({c: row[c] for c in REPORT_COLUMNS if c in row.keys()}))
+            # Kept for reference rather than dropped
+            conn.execute('ALTER TABLE reports RENAME TO reports_legacy')
+        print(f"Migrated {len(rows)} reports to the normalized report tables")
+
+    def _dedupe_reports(self, conn: sqlite3.Connection):
+        """Drop reports stored twice by an earlier import, then keep (id, timestamp) unique"""
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'report_headers_key'"
+        ).fetchone()
+        if exists:
+            return
+        with transaction(conn):
+            duplicates = 'SELECT row_id FROM report_headers WHERE row_id NOT IN ' \
+                         '(SELECT MIN(row_id) FROM report_headers GROUP BY id, timestamp)'
+            conn.execute(f"DELETE FROM report_levels WHERE report_row IN ({duplicates})")
+            removed = conn.execute(f"DELETE FROM report_headers WHERE row_id IN ({duplicates})").rowcount
+            conn.execute('CREATE UNIQUE INDEX report_headers_key ON report_headers (id, timestamp)')
+        if removed:
+            print(f"Removed {removed} duplicate reports")
+
+    def sync_from_sheets(self) -> int:
+        """Copy sheet rows this database has not seen yet; returns the number of rows added"""
+        return self._import_from_sheets(self.connection())
+
+    def _import_from_sheets(self, conn: sqlite3.Connection) -> int:
+        """Copy sheet rows past the last one imported, e.g. reports uploaded through the web UI.
+
+        Rows that came from this database through the outbox are already here
+        and are skipped, as are rows imported before: appointments are unique
+        per (date, time) and reports per (id, timestamp).
+        """
+        added = 0
+        for target in ('appointments', 'reports'):
+            if target not in self.sheet_getters:
+                continue
+            try:
+                added += self._import_sheet(conn, target)
+            except Exception as e:
+                print(f"Error importing {target} rows from Google Sheets: {str(e)}")
+        return added
+
+    def _import_sheet(self, conn: sqlite3.Connection, target: str) -> int:
+        sheet = self.sheet_getters[target]()
+        row = conn.execute('SELECT value FROM meta WHERE key = ?', (f"sheet_rows:{target}",)).fetchone()
+        seen = int(row['value']) if row else 0
+        header = self._sheet_headers.get(target)
+        if seen and header is None:
+            # First import in this process: trust the stored mark only if the header row is unchanged
+            row = conn.execute('SELECT value FROM meta WHERE key = ?', (f"sheet_header:{target}",)).fetchone()
+            current = trim_row(sheet.row_values(1))
+            if row is not None and trim_row(json.loads(row['value'])) == current:
+                header = self._sheet_headers[target] = current
+        if seen == 0 or header is None:
+            values = sheet.get_all_values()
+            header, rows = (values[0], values[1:]) if values else ([], [])
+            self._sheet_headers[target] = header
+            # Rows imported before are skipped by the unique keys, so re-reading them is safe
+            mark = len(rows)
+        else:
+            # Data starts on row 2; fetch only the rows past the last one imported
+            last_column = rowcol_to_a1(1, max(len(header), 1)).rstrip('0123456789')
+            rows = sheet.get(f"A{seen + 2}:{last_column}")
+            mark = seen + len(rows)
+        if not rows:
+            set_meta(conn, f"sheet_header:{target}", json.dumps(header))
+            return 0
+        added = 0
+        new_ids = set()
+        with transaction(conn):
+            for values in rows:
+                if target == 'appointments':
+                    record = dict(zip(APPOINTMENT_COLUMNS, values))
+                    if record.get('date') and record.get('time'):
+                        added += insert(conn, 'appointments', APPOINTMENT_COLUMNS, record, or_ignore=True)
+                else:
+                    record = dict(zip(header or REPORT_COLUMNS, values))
+                    if record.get('id') and self._insert_report(conn, parse_flat_report(record)):
+                        added += 1
+                        new_ids.add(str(record['id']).strip())
+            set_meta(conn, f"sheet_header:{target}", json.dumps(header))
+            # Another process may have imported further meanwhile; never move the mark back
+            conn.execute('INSERT INTO meta (key, value) VALUES (?, ?) ON CONFLICT (key) DO UPDATE '
+                         'SET value = MAX(CAST(value AS INTEGER), CAST(excluded.value AS INTEGER))',
+                         (f"sheet_rows:{target}", mark))
+        for report_id in new_ids:
+            self.output_cache.invalidate(report_id)
+        if added:
+            print(f"Imported {added} {target} row(s) from Google Sheets")
+        return added
+
+    def is_slot_booked(self, date: str, time_slot: str, max_staleness: float = None) -> bool:
+        row = self.connection().execute(
+            'SELECT 1 FROM appointments WHERE date = ? AND time = ?', (date, time_slot)
+        ).fetchone()
+        return row is not None
+
+    def booked_times(self, date: str) -> set:
+        rows = self.connection().execute('SELECT time FROM appointments WHERE date = ?', (date,))
+        return {row['time'] for row in rows}
+
+    def booked_between(self, start_date: str, end_date: str) -> dict:
+        rows = self.connection().execute(
+            'SELECT date, time FROM appointments WHERE date BETWEEN ? AND ?', (start_date, end_date)
+        )
+        booked = {}
+        for row in rows:
+            booked.setdefault(row['date'], set()).add(row['time'])
+        return booked
+
+    def book_appointment(self, record: dict) -> bool:
+        conn = self.connection()
+        try:
+            with transaction(conn):
+                insert(conn, 'appointments', APPOINTMENT_COLUMNS, record)
+                self._enqueue(conn, 'appointments', [record[c] for c in APPOINTMENT_COLUMNS])
+        except sqlite3.IntegrityError:
+            return False
+        return True
+
+    def reports_for(self, report_id) -> list:
+        conn = self.connection()
+        headers = conn.execute(
+            'SELECT * FROM report_headers WHERE id = ? ORDER BY row_id', (str(report_id).strip(),)
+        ).fetchall()
+        if not headers:
+            return []
+        placeholders = ', '.join('?' for _ in headers)
+        levels = conn.execute(
+            f"SELECT * FROM report_levels WHERE report_row IN ({placeholders}) ORDER BY report_row, position",
+            [header['row_id'] for header in headers]
+        ).fetchall()
+        return [
+            {
+                'id': header['id'],
+                'timestamp': header['timestamp'],
+                'test_type': header['test_type'],
+                'concerns': json.loads(header['concerns']),
+                'levels': [level_dict(level) for level in levels if level['report_row'] == header['row_id']],
+            }
+            for header in headers
+        ]
+
+    def get_parameter(self, report_id, name: str) -> list:
+        rows = self.connection().execute(
+            'SELECT * FROM report_levels WHERE report_id = ? AND name = ? COLLATE NOCASE ORDER BY report_row',
+            (str(report_id).strip(), name.strip())
+        )
+        return [level_dict(row) for row in rows]
+
+    def abnormal_levels(self, report_id) -> list:
+        rows = self.connection().execute(
+            'SELECT * FROM report_levels WHERE report_id = ? AND abnormal = 1 ORDER BY report_row, position',
+            (str(report_id).strip(),)
+        )
+        return [level_dict(row) for row in rows]
+
+    def save_reports(self, reports: list):
+        conn = self.connection()
+        with transaction(conn):
+            for report in reports:
+                self._insert_report(conn, report)
+                record = flatten_report(report)
+                self._enqueue(conn, 'reports', [record[c] for c in REPORT_COLUMNS])
+        for report in reports:
+            self.output_cache.invalidate(str(report['id']).strip())
+
+    def _insert_report(self, conn: sqlite3.Connection, report: dict) -> bool:
+        """Store a report; returns False if a report with the same id and timestamp is already stored"""
+        cursor = conn.execute(
+            'INSERT OR IGNORE INTO report_headers (id, timestamp, test_type, concerns) VALUES (?, ?, ?, ?)',
+            (report['id'], report['timestamp'], report['test_type'], json.dumps(report['concerns']))
+        )
+        if not cursor.rowcount:
+            return False
+        conn.executemany(
+            f"INSERT INTO report_levels (report_row, position, report_id, {', '.join(LEVEL_FIELDS)}, abnormal) "
+            f"VALUES (?, ?, ?, {', '.join('?' for _ in LEVEL_FIELDS)}, ?)",
+            [
+                [cursor.lastrowid, position, report['id']] + [level.get(f) for f in LEVEL_FIELDS] + [int(level['abnormal'])]
+                for position, level in enumerate(report['levels'])
+            ]
+        )
+        return True
+
+    def pending_writes(self) -> int:
+        return self.connection().execute('SELECT COUNT(*) FROM outbox').fetchone()[0]
+
+    def _enqueue(self, conn: sqlite3.Connection, target: str, row: list):
+        if SHEETS_REPLICATION and target in self.sheet_getters:
+            conn.execute('INSERT INTO outbox (target, payload) VALUES (?, ?)', (target, json.dumps(row)))
+
+
+class transaction:
+    """BEGIN IMMEDIATE ... COMMIT/ROLLBACK on an autocommit sqlite3 connection"""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute('BEGIN IMMEDIATE')
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute('ROLLBACK' if exc_type else 'COMMIT')
+        return False
+
+
+def level_dict(row: sqlite3.Row) -> dict:
+    level = {f: row[f] for f in LEVEL_FIELDS}
+    level['abnormal'] = bool(row['abnormal'])
+    return level
+
+
+def set_meta(conn: sqlite3.Connection, key: str, value: str):
+    conn.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, value))
+
+
+def trim_row(row: list) -> list:
+    """Row values without trailing empty cells, which the Sheets API may or may not return"""
+    row = list(row)
+    while row and row[-1] == '':
+        row.pop()
+    return row
+
+
+def insert(conn: sqlite3.Connection, table: str, columns: list, record: dict, or_ignore: bool = False) -> int:
+    verb = 'INSERT OR IGNORE' if or_ignore else 'INSERT'
+    placeholders = ', '.join('?' for _ in columns)
+    return conn.execute(
+        f"{verb} INTO {table} ({', '.join(columns)}) VALUES ({placeholders})",
+        [record.get(c) for c in columns]
+    ).rowcount
+
+
+class SheetsReplicator:
+    """Drains the SQLite outbox into Google Sheets from a daemon thread.
+
+    Rows are claimed with a lease so several processes sharing the database
+    never append the same row twice. Failed batches are retried with
+    exponential backoff and stay in the outbox until they succeed.
+    """
+
+    def __init__(self, backend: SQLiteBackend, poll_interval: float = OUTBOX_POLL_INTERVAL,
+                 batch_size: int = OUTBOX_BATCH_SIZE, max_backoff: float = OUTBOX_MAX_BACKOFF,
+                 lease: float = OUTBOX_LEASE):
+        self.backend = backend
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.max_backoff = max_backoff
+        self.lease = lease
+        self._stop = threading.Event()
+        self._thread = None
+        self._headers_checked = set()
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='sheets-replicator', daemon=True)
+        self._thread.start()
+
+    def stop(self, flush: bool = True):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+        if flush:
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Error flushing outbox to Google Sheets: {str(e)}")
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                replicated = self.run_once()
+            except Exception as e:
+                print(f"Error replicating outbox to Google Sheets: {str(e)}")
+                replicated = 0
+            # Keep draining while there is a backlog
+            if replicated < self.batch_size:
+                self._stop.wait(self.poll_interval)
+
+    def run_once(self) -> int:
+        """Replicate one batch of due outbox rows; returns the number appended"""
+        batch = self._claim()
+        by_target = {}
+        for row in batch:
+            by_target.setdefault(row['target'], []).append(row)
+        replicated = 0
+        for target, rows in by_target.items():
+            try:
+                sheet = self.backend.sheet_getters[target]()
+                if target == 'reports' and target not in self._headers_checked:
+                    ensure_header(sheet, REPORT_COLUMNS)
+                    self._headers_checked.add(target)
+                sheet.append_rows([json.loads(row['payload']) for row in rows])
+            except Exception as e:
+                self._release(rows, str(e))
+                print(f"Error replicating {len(rows)} {target} row(s) to Google Sheets: {str(e)}")
+                continue
+            self._delete(rows)
+            replicated += len(rows)
+        return replicated
+
+    def _claim(self) -> list:
+        conn = self.backend.connection()
+        now = time.time()
+        with transaction(conn):
+            rows = conn.execute(
+                'SELECT row_id, target, payload, attempts FROM outbox '
+                'WHERE next_attempt_at <= ? AND claimed_until <= ? ORDER BY row_id LIMIT ?',
+                (now, now, self.batch_size)
+            ).fetchall()
+            conn.executemany(
+                'UPDATE outbox SET claimed_until = ? WHERE row_id = ?',
+                [(now + self.lease, row['row_id']) for row in rows]
+            )
+        return rows
+
+    def _release(self, rows: list, error: str):
+        conn = self.backend.connection()
+        now = time.time()
+        with transaction(conn):
+            conn.executemany(
+                'UPDATE outbox SET attempts = attempts + 1, next_attempt_at = ?, claimed_until = 0, last_error = ? '
+                'WHERE row_id = ?',
+                [(now + self._backoff(row['attempts']), error, row['row_id']) for row in rows]
+            )
+
+    def _delete(self, rows: list):
+        conn = self.backend.connection()
+        with transaction(conn):
+            conn.executemany('DELETE FROM outbox WHERE row_id = ?', [(row['row_id'],) for row in rows])
+
+    def _backoff(self, attempts: int) -> float:
+        return min(self.max_backoff, 2 ** attempts) * random.uniform(0.5, 1.0)
+
+
+class SheetsInboundSync:
+    """Pulls rows other writers added to the sheets into SQLite, from a daemon thread.
+
+    The web UI appends uploaded reports straight to the reports sheet; without
+    this they would never reach the tools. Processes sharing the database take
+    turns through a due time kept in the meta table, so each interval costs
+    one small range read per sheet, not one per process.
+    """
+
+    def __init__(self, backend: SQLiteBackend, interval: float = SHEETS_INBOUND_INTERVAL):
+        self.backend = backend
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='sheets-inbound-sync', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Error pulling rows from Google Sheets: {str(e)}")
+
+    def run_once(self) -> int:
+        """Import new sheet rows unless another process did within the interval; returns rows added"""
+        conn = self.backend.connection()
+        now = time.time()
+        with transaction(conn):
+            row = conn.execute("SELECT value FROM meta WHERE key = 'sheets_inbound_due'").fetchone()
+            if row is not None and float(row['value']) > now:
+                return 0
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('sheets_inbound_due', ?)",
+                         (str(now + self.interval),))
+        return self.backend.sync_from_sheets()
+
+
+def create_storage(appointments_sheet, reports_sheet, backend: str = STORAGE_BACKEND) -> StorageBackend:
+    """Build the configured storage backend from the two worksheet getters"""
+    if backend == 'sheets':
+        return SheetsBackend(appointments_sheet, reports_sheet)
+    if backend != 'sqlite':
+        raise ValueError(f"Unknown STORAGE_BACKEND: {backend}")
+    sqlite_backend = SQLiteBackend(sheet_getters={
+        'appointments': appointments_sheet,
+        'reports': reports_sheet,
+    })
+    if SHEETS_REPLICATION:
+        replicator = SheetsReplicator(sqlite_backend)
+        replicator.start()
+        atexit.register(replicator.stop)
+    if SHEETS_INBOUND_INTERVAL > 0:
+        inbound = SheetsInboundSync(sqlite_backend)
+        inbound.start()
+        atexit.register(inbound.stop)
+    return sqlite_backend
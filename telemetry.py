@@ -0,0 +1,179 @@
+import fcntl
+import functools
+import glob
+import os
+import tempfile
+import time
+
+# Agent jobs and API workers run in their own processes, so metrics are shared
+# through files in this directory. A fresh one is made per server start unless it
+# is set explicitly; it must be set before prometheus_client is imported.
+if not os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+    os.environ['PROMETHEUS_MULTIPROC_DIR'] = tempfile.mkdtemp(prefix='hospital-metrics-')
+# When the API and the agent run side by side, each writes to its own subdirectory of
+# this one (the LiveKit worker empties its directory on start), and /metrics reads all of them
+METRICS_DIR = os.getenv('METRICS_DIR')
+
+from prometheus_client import CollectorRegistry, Gauge, Histogram, generate_latest, multiprocess
+from prometheus_client import CONTENT_TYPE_LATEST
+from prometheus_client.mmap_dict import MmapedDict
+
+# Seconds between sweeps that fold the metric files of exited processes into the archive files
+METRICS_PRUNE_INTERVAL = float(os.getenv('METRICS_PRUNE_INTERVAL', '60'))
+
+# Seconds; covers sub-100ms model responses up to slow Sheets round trips
+LATENCY_BUCKETS = (0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0, 30.0)
+ANALYZE_BUCKETS = (0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0)
+
+EOU_DELAY = Histogram(
+    'voice_eou_delay_seconds', 'End of speech until the turn is committed', buckets=LATENCY_BUCKETS)
+STT_DURATION = Histogram(
+    'voice_stt_duration_seconds', 'Speech-to-text request duration', buckets=LATENCY_BUCKETS)
+LLM_TTFT = Histogram(
+    'voice_llm_ttft_seconds', 'LLM time to first token', buckets=LATENCY_BUCKETS)
+LLM_PROMPT_TOKENS = Histogram(
+    'voice_llm_prompt_tokens', 'Prompt tokens per LLM request',
+    buckets=(250, 500, 1000, 2000, 3000, 4000, 6000, 8000, 12000, 16000))
+TTS_TTFB = Histogram(
+    'voice_tts_ttfb_seconds', 'TTS time to first audio byte', buckets=LATENCY_BUCKETS)
+RESPONSE_LATENCY = Histogram(
+    'voice_response_latency_seconds', 'End of user speech until the first agent audio (EOU + LLM TTFT + TTS TTFB)',
+    buckets=LATENCY_BUCKETS)
+TOOL_DURATION = Histogram(
+    'voice_tool_duration_seconds', 'Function tool duration', ['tool'], buckets=LATENCY_BUCKETS)
+ANALYZE_DURATION = Histogram(
+    'analyze_request_duration_seconds', 'Report analysis request duration', ['endpoint', 'status'],
+    buckets=ANALYZE_BUCKETS)
+# Set by each job process; /metrics and the worker's load function see the worst live value
+LOOP_LAG = Gauge(
+    'agent_event_loop_lag_seconds', 'Worst recent event-loop lag in an agent job process',
+    multiprocess_mode='livemax')
+
+
+class TurnMetrics:
+    """Records one session's pipeline metrics and joins them per turn.
+
+    Feed it every event from AgentSession's metrics_collected. The EOU, LLM
+    and TTS metrics of a reply share a speech_id; once all three have arrived,
+    their sum is recorded as the turn's response latency.
+    """
+
+    def __init__(self):
+        self._turns = {}
+
+    def record(self, metrics):
+        kind = getattr(metrics, 'type', None)
+        if kind == 'eou_metrics':
+            EOU_DELAY.observe(metrics.end_of_utterance_delay)
+            self._add(metrics.speech_id, 'eou', metrics.end_of_utterance_delay)
+        elif kind == 'stt_metrics':
+            # Streaming STT reports zero-length chunks; only count real requests
+            if metrics.duration > 0:
+                STT_DURATION.observe(metrics.duration)
+        elif kind == 'llm_metrics':
+            LLM_TTFT.observe(metrics.ttft)
+            LLM_PROMPT_TOKENS.observe(metrics.prompt_tokens)
+            self._add(metrics.speech_id, 'llm', metrics.ttft)
+        elif kind == 'tts_metrics':
+            TTS_TTFB.observe(metrics.ttfb)
+            self._add(metrics.speech_id, 'tts', metrics.ttfb)
+
+    def _add(self, speech_id, stage: str, seconds: float):
+        if not speech_id or seconds is None or seconds < 0:
+            return
+        if speech_id not in self._turns and len(self._turns) >= 64:
+            # Drop the oldest turn that never completed (e.g. a say() with no LLM step)
+            del self._turns[next(iter(self._turns))]
+        turn = self._turns.setdefault(speech_id, {})
+        # A reply that calls tools makes several LLM requests; the first one is what the caller waits on
+        turn.setdefault(stage, seconds)
+        if len(turn) == 3:
+            RESPONSE_LATENCY.observe(sum(turn.values()))
+            del self._turns[speech_id]
+
+
+def timed_tool(func):
+    """Record an async function tool's duration, labelled by its name. Apply beneath @function_tool."""
+    histogram = TOOL_DURATION.labels(tool=func.__name__)
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            histogram.observe(time.perf_counter() - start)
+    return wrapper
+
+
+class AllRolesCollector:
+    """Merges the metric files of this process's directory and every role directory under METRICS_DIR"""
+
+    def collect(self):
+        directories = {os.environ['PROMETHEUS_MULTIPROC_DIR']}
+        if METRICS_DIR:
+            directories.update(entry.path for entry in os.scandir(METRICS_DIR) if entry.is_dir())
+        files = [path for directory in sorted(directories) for path in glob.glob(os.path.join(directory, '*.db'))]
+        return multiprocess.MultiProcessCollector.merge(files, accumulate=True)
+
+
+def render() -> tuple:
+    """Metrics from every process, in the Prometheus text format, and their content type"""
+    for attempt in range(3):
+        registry = CollectorRegistry()
+        registry.register(AllRolesCollector())
+        try:
+            return generate_latest(registry), CONTENT_TYPE_LATEST
+        except FileNotFoundError:
+            # A dead process's file was folded into the archive mid-read; read the directory again
+            if attempt == 2:
+                raise
+
+
+def prune_dead_processes(directory: str = None) -> int:
+    """Fold the metric files of exited processes into per-type archive files; returns the processes pruned.
+
+    Every agent job process and API worker writes its own files, so without
+    this the directory, and the time /metrics takes to read it, grows with
+    every process ever started. Counter and histogram values are added into
+    counter_archive.db / histogram_archive.db, so totals never go backwards;
+    live gauges of dead processes are dropped, as mark_process_dead does.
+    """
+    directory = directory or os.environ['PROMETHEUS_MULTIPROC_DIR']
+    # Several processes prune the same directory; folding a file in twice would double its counts
+    with open(os.path.join(directory, 'prune.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        dead = {}
+        for path in glob.glob(os.path.join(directory, '*.db')):
+            pid = os.path.basename(path)[:-len('.db')].rsplit('_', 1)[-1]
+            if pid.isdigit() and not pid_alive(int(pid)):
+                dead.setdefault(int(pid), []).append(path)
+        for pid, paths in dead.items():
+            multiprocess.mark_process_dead(pid, directory)
+            for path in paths:
+                kind = os.path.basename(path).split('_')[0]
+                if kind in ('counter', 'histogram', 'summary'):
+                    archive_metric_file(path, os.path.join(directory, f"{kind}_archive.db"))
+        return len(dead)
+
+
+def archive_metric_file(path: str, archive_path: str):
+    """Add every value in a dead process's metric file to the archive file, then delete it"""
+    archive = MmapedDict(archive_path)
+    try:
+        for key, value, timestamp, _ in MmapedDict.read_all_values_from_file(path):
+            archived, _ = archive.read_value(key)
+            archive.write_value(key, archived + value, timestamp)
+    finally:
+        archive.close()
+    os.remove(path)
+
+
+def pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
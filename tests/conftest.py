@@ -0,0 +1,10 @@
+import os
+import tempfile
+
+# Keep module-level databases (report ids, Sheets quota, jobs) out of the working tree
+_workdir = tempfile.mkdtemp(prefix='hospital-tests-')
+os.environ.setdefault('SQLITE_PATH', os.path.join(_workdir, 'hospital.db'))
+os.environ.setdefault('SHEETS_QUOTA_DB', os.path.join(_workdir, 'sheets_quota.db'))
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', _workdir)
+# report_api builds its OpenAI client at import; tests that analyze point it at a stub server
+os.environ.setdefault('OPENAI_API_KEY', 'test-key')
@@ -0,0 +1,66 @@
+import asyncio
+import time
+from types import SimpleNamespace
+import agent
+from agent import estimate_tokens, format_user_reports
+
+
+def level(name: str, abnormal: bool = False) -> dict:
+    return {'name': name, 'value': '1.0 mg/dL', 'reference_range': '0.5-1.5 mg/dL', 'abnormal': abnormal}
+
+
+def report(levels: list, concerns: list = ()) -> dict:
+    return {'test_type': 'Blood Test', 'timestamp': '2030-01-01 09:00:00', 'concerns': list(concerns), 'levels': levels}
+
+
+def listed(summary: str) -> str:
+    # Drop the omission note and the explain_report_parameter pointer added after the cap
+    return summary.rsplit('\n', 2)[0]
+
+
+def test_summary_stays_within_the_token_budget():
+    reports = [report([level(f"Parameter {i}") for i in range(40)])]
+    summary = format_user_reports('K7M2QXA', reports, token_budget=120)
+    assert estimate_tokens(listed(summary)) <= 120
+    assert '(33 more line(s) not shown' in summary
+
+
+def test_abnormal_parameters_survive_the_cap():
+    levels = [level(f"Normal {i}") for i in range(30)] + [level('Hemoglobin', abnormal=True)]
+    summary = format_user_reports('K7M2QXA', [report(levels, ['Low hemoglobin'])], token_budget=80)
+    assert '- Hemoglobin: 1.0 mg/dL (normal 0.5-1.5 mg/dL) ABNORMAL' in summary
+    assert 'Concerns: Low hemoglobin' in summary
+    assert 'Normal 29' not in summary
+
+
+def test_later_reports_are_dropped_rather_than_interleaved():
+    reports = [report([level(f"First {i}") for i in range(10)]), report([level('Second')])]
+    summary = format_user_reports('K7M2QXA', reports, token_budget=100)
+    assert '(6 more line(s) not shown' in summary
+    assert 'Report 2' not in summary and 'Second' not in summary
+
+
+def test_everything_is_listed_when_it_fits():
+    summary = format_user_reports('K7M2QXA', [report([level('A'), level('B', True)])], token_budget=1000)
+    assert 'not shown' not in summary
+    assert summary.index('- B:') < summary.index('- A:')
+
+
+def test_missing_reports_get_a_clear_answer():
+    assert format_user_reports('K7M2QXA', []).startswith("I couldn't find any reports for ID K7M2QXA")
+
+
+def test_slow_booking_is_reported_as_pending_not_failed(monkeypatch):
+    saved = []
+
+    def book_appointment(record):
+        time.sleep(0.3)
+        saved.append(record)
+        return True
+    monkeypatch.setattr(agent, 'get_storage', lambda: SimpleNamespace(book_appointment=book_appointment))
+    monkeypatch.setattr(agent, 'STORAGE_WRITE_TIMEOUT', 0.05)
+
+    reply = asyncio.run(agent.save_appointment_to_sheet('Ann', 'ann@example.com', 'Physical', '2030-01-07', '09:00'))
+    assert reply.startswith('PENDING:') and 'Do not book it again' in reply
+    time.sleep(0.4)
+    assert len(saved) == 1
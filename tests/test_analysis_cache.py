@@ -0,0 +1,46 @@
+from analysis_cache import AnalysisCache
+
+
+def test_stats_are_shared_by_every_process_using_the_directory(tmp_path):
+    # Two instances stand in for two API worker processes
+    first, second = AnalysisCache('v1', str(tmp_path)), AnalysisCache('v1', str(tmp_path))
+    key = first.key('image-sha')
+    assert first.get(key) is None
+    first.set(key, {'analysis': {}, 'model_seconds': 2.5, 'total_tokens': 900})
+    assert second.get(key)['total_tokens'] == 900
+
+    stats = second.stats()
+    assert (stats['hits'], stats['misses'], stats['entries']) == (1, 1, 1)
+    assert stats['hit_rate'] == 0.5
+    assert (stats['model_seconds_saved'], stats['tokens_saved']) == (2.5, 900)
+    assert first.stats() == stats
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = AnalysisCache('v1', str(tmp_path), max_bytes=100)
+    for name in ('a', 'b', 'c'):
+        cache.set(cache.key(name), {'analysis': 'x' * 30})
+    assert cache.get(cache.key('a')) is None
+    assert cache.get(cache.key('c')) is not None
+    assert cache.stats()['entries'] == 2
+
+
+def test_disabled_cache_never_stores(tmp_path):
+    cache = AnalysisCache('v1', str(tmp_path), enabled=False)
+    cache.set(cache.key('a'), {'analysis': {}})
+    assert cache.get(cache.key('a')) is None
+    assert cache.stats()['entries'] == 0
+
+
+def test_eviction_counts_entries_written_by_other_processes(tmp_path):
+    # Two instances stand in for two API worker processes; each entry is 46 bytes, so two fit
+    first, second = AnalysisCache('v1', str(tmp_path), max_bytes=100), AnalysisCache('v1', str(tmp_path), max_bytes=100)
+    second.set(second.key('0'), {'analysis': 'x' * 30})
+    first.set(first.key('1'), {'analysis': 'x' * 30})
+    # A hit in the other process makes entry 0 the most recently used one
+    assert first.get(first.key('0')) is not None
+    second.set(second.key('2'), {'analysis': 'x' * 30})
+
+    assert second.stats()['bytes'] <= 100
+    kept = [name for name in '012' if (tmp_path / f"{first.key(name)}.json").exists()]
+    assert kept == ['0', '2']
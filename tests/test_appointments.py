@@ -0,0 +1,64 @@
+from datetime import datetime
+import pytest
+from appointments import nearest_free_slots, parse_time, search_dates
+
+# Monday 7 January 2030, long before the searched slots
+MONDAY = '2030-01-07'
+EARLIER = datetime(2030, 1, 1)
+
+
+@pytest.mark.parametrize('text, minutes', [
+    ('14:30', 870), ('9:30', 570), ('2:30 PM', 870), ('2:30pm', 870), ('9 a.m.', 540), ('noon', None),
+])
+def test_parse_time(text, minutes):
+    assert parse_time(text) == minutes
+
+
+def test_search_dates_default_to_a_week_and_cap_long_ranges():
+    assert search_dates(MONDAY) == [f'2030-01-{day:02d}' for day in range(7, 14)]
+    assert search_dates('2030-01-09', MONDAY) == ['2030-01-07', '2030-01-08', '2030-01-09']
+    assert len(search_dates('2030-01-01', '2030-12-31')) == 31
+
+
+def test_slots_rank_by_day_then_distance_from_the_preferred_time():
+    slots = nearest_free_slots({}, ['2030-01-07', '2030-01-08'], '13:10', count=4, now=EARLIER)
+    assert slots == [('2030-01-07', '13:00'), ('2030-01-07', '13:30'),
+                     ('2030-01-07', '12:30'), ('2030-01-07', '14:00')]
+    # Without a preferred time the earliest slots come first
+    assert nearest_free_slots({}, [MONDAY], count=2, now=EARLIER) == [(MONDAY, '09:00'), (MONDAY, '09:30')]
+
+
+def test_booked_slots_are_skipped_whatever_their_format():
+    booked = {MONDAY: {'13:00', '1:30 PM'}}
+    slots = nearest_free_slots(booked, [MONDAY], '13:00', count=3, now=EARLIER)
+    # Ties go to the earlier slot
+    assert slots == [(MONDAY, '12:30'), (MONDAY, '12:00'), (MONDAY, '14:00')]
+
+
+def test_a_full_day_moves_on_to_the_next():
+    booked = {MONDAY: {f'{hour:02d}:{minute:02d}' for hour in range(9, 17) for minute in (0, 30)}}
+    assert nearest_free_slots(booked, [MONDAY, '2030-01-08'], '10:00', count=1, now=EARLIER) == [
+        ('2030-01-08', '10:00')]
+
+
+def test_past_slots_are_skipped():
+    now = datetime(2030, 1, 7, 15, 10)
+    assert nearest_free_slots({}, [MONDAY], '10:00', count=2, now=now) == [(MONDAY, '15:30'), (MONDAY, '16:00')]
+
+
+def test_closed_days_are_skipped():
+    # Saturday and Sunday, then Monday
+    dates = ['2030-01-05', '2030-01-06', MONDAY]
+    assert nearest_free_slots({}, dates, '09:00', count=1, now=EARLIER) == [(MONDAY, '09:00')]
+    assert nearest_free_slots({}, dates[:2], count=1, now=EARLIER) == []
+
+
+def test_the_last_slot_ends_at_closing_time():
+    slots = nearest_free_slots({}, [MONDAY], '23:00', count=1, closing_time='12:00', slot_minutes=45, now=EARLIER)
+    assert slots == [(MONDAY, '11:15')]
+
+
+@pytest.mark.parametrize('opening, closing', [('17:00', '09:00'), ('soon', '17:00'), ('09:00', '09:00')])
+def test_invalid_clinic_hours_are_rejected(opening, closing):
+    with pytest.raises(ValueError):
+        nearest_free_slots({}, [MONDAY], opening_time=opening, closing_time=closing)
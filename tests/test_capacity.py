@@ -0,0 +1,44 @@
+from types import SimpleNamespace
+import pytest
+import capacity
+from capacity import WorkerLoad
+
+
+@pytest.fixture
+def load(monkeypatch):
+    state = {'cpu': 0.0, 'lag': 0.0}
+    monkeypatch.setattr(capacity, 'job_loop_lag', lambda: state['lag'])
+    monkeypatch.setattr(capacity, 'prune_dead_processes', lambda: 0)
+    worker_load = WorkerLoad(max_jobs=4, max_cpu=0.8, max_loop_lag=0.05)
+    monkeypatch.setattr(worker_load, 'cpu', lambda: state['cpu'])
+    worker_load.state = state
+    return worker_load
+
+
+def worker(jobs: int):
+    return SimpleNamespace(active_jobs=[object()] * jobs)
+
+
+@pytest.mark.parametrize('jobs, cpu, lag, expected', [
+    (0, 0.0, 0.0, 0.0),
+    (2, 0.2, 0.01, 0.5),     # sessions are the closest limit
+    (1, 0.6, 0.01, 0.75),    # CPU is
+    (1, 0.2, 0.04, 0.8),     # loop lag is
+    (8, 1.0, 0.5, 1.0),      # capped at full
+])
+def test_load_is_the_closest_limit(load, jobs, cpu, lag, expected):
+    load.state.update(cpu=cpu, lag=lag)
+    assert load(worker(jobs)) == pytest.approx(expected)
+
+
+def test_full_and_available_are_reported_once(load, capsys):
+    load(worker(4))
+    load(worker(4))
+    load(worker(3))
+    out = capsys.readouterr().out.splitlines()
+    assert len(out) == 2
+    assert out[0].startswith('Worker full') and out[1].startswith('Worker taking calls again')
+
+
+def test_max_jobs_is_at_least_one():
+    assert WorkerLoad(max_jobs=0).max_jobs == 1
@@ -0,0 +1,86 @@
+import base64
+import hashlib
+import io
+import pytest
+from PIL import Image
+from image_prep import build_data_uri, prepare_image
+
+
+def image_bytes(size=(400, 200), color=(200, 30, 30), format='PNG', mode='RGB', exif=None) -> bytes:
+    output = io.BytesIO()
+    image = Image.new(mode, size, color)
+    if exif is not None:
+        image.save(output, format=format, exif=exif)
+    else:
+        image.save(output, format=format)
+    return output.getvalue()
+
+
+def decode(prepared) -> Image.Image:
+    return Image.open(io.BytesIO(prepared.data))
+
+
+def test_large_images_are_downscaled_to_jpeg():
+    data = image_bytes((3000, 1500))
+    prepared = prepare_image(io.BytesIO(data), 'report.png', max_dimension=1000, quality=80)
+    assert prepared.mime_type == 'image/jpeg' and prepared.variant == 'jpeg:1000:80'
+    assert decode(prepared).size == (1000, 500)
+    # The cache key comes from the original upload, not the re-encoded image
+    assert prepared.source_sha256 == hashlib.sha256(data).hexdigest()
+
+
+def test_small_images_keep_their_size():
+    prepared = prepare_image(io.BytesIO(image_bytes((300, 200))), 'report.png', max_dimension=1000)
+    assert decode(prepared).size == (300, 200)
+
+
+def test_photos_are_rotated_per_exif():
+    exif = Image.Exif()
+    exif[0x0112] = 6  # Orientation: rotate 90 degrees clockwise to display
+    data = image_bytes((400, 200), format='JPEG', exif=exif.tobytes())
+    prepared = prepare_image(io.BytesIO(data), 'photo.jpg', max_dimension=1000)
+    image = decode(prepared)
+    assert image.size == (200, 400)
+    assert not image.getexif()
+
+
+def test_transparency_is_flattened_onto_white():
+    data = image_bytes((50, 50), color=(0, 0, 0, 0), mode='RGBA')
+    pixel = decode(prepare_image(io.BytesIO(data), 'scan.png')).getpixel((25, 25))
+    assert all(channel > 245 for channel in pixel)
+
+
+@pytest.mark.parametrize('data', [b'', b'not an image at all', image_bytes()[:100]])
+def test_junk_uploads_are_rejected(data):
+    with pytest.raises(ValueError, match='Could not read image'):
+        prepare_image(io.BytesIO(data), 'report.png')
+
+
+def test_decompression_bombs_are_rejected(monkeypatch):
+    monkeypatch.setattr(Image, 'MAX_IMAGE_PIXELS', 1000)
+    with pytest.raises(ValueError, match='too large'):
+        prepare_image(io.BytesIO(image_bytes((400, 200))), 'report.png')
+
+
+def test_preprocessing_can_be_turned_off():
+    data = image_bytes()
+    prepared = prepare_image(io.BytesIO(data), 'report.webp', preprocess=False)
+    assert (prepared.data, prepared.mime_type, prepared.variant) == (data, 'image/webp', 'original')
+
+
+def test_data_uri_round_trips():
+    data = image_bytes()
+    uri = build_data_uri(data, 'image/png')
+    header, payload = uri.split(',', 1)
+    assert header == 'data:image/png;base64'
+    assert base64.b64decode(payload) == data
+
+
+def test_api_answers_400_for_oversized_images(monkeypatch):
+    import report_api
+    monkeypatch.setattr(Image, 'MAX_IMAGE_PIXELS', 1000)
+    response = report_api.flask_app.test_client().post(
+        '/analyze', data={'image': (io.BytesIO(image_bytes((400, 200))), 'report.png')},
+        content_type='multipart/form-data')
+    assert response.status_code == 400
+    assert 'too large' in response.get_json()['message']
@@ -0,0 +1,72 @@
+import sqlite3
+import threading
+import time
+import pytest
+from jobs import JobQueueFull, JobStore
+
+
+def wait_for(store: JobStore, job_id: str, timeout: float = 5) -> dict:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = store.get(job_id)
+        if job['status'] in ('succeeded', 'failed'):
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def test_results_are_visible_to_every_store_sharing_the_database(tmp_path):
+    path = str(tmp_path / 'jobs.db')
+    # Two stores stand in for two API worker processes
+    first, second = JobStore(path=path), JobStore(path=path)
+    job_id = first.submit(lambda x: {'doubled': x * 2}, 21)
+    assert wait_for(first, job_id)['result'] == {'doubled': 42}
+    assert second.get(job_id)['status'] == 'succeeded'
+    assert second.get('no-such-job') is None
+
+
+def test_failures_are_recorded(tmp_path):
+    store = JobStore(path=str(tmp_path / 'jobs.db'))
+
+    def fail():
+        raise RuntimeError('model unavailable')
+    job = wait_for(store, store.submit(fail))
+    assert (job['status'], job['error']) == ('failed', 'model unavailable')
+    assert store.pending() == 0
+
+
+def test_submissions_past_max_pending_are_rejected(tmp_path):
+    store = JobStore(max_workers=1, max_pending=2, path=str(tmp_path / 'jobs.db'))
+    release = threading.Event()
+    jobs = [store.submit(release.wait, 5) for _ in range(2)]
+    with pytest.raises(JobQueueFull):
+        store.submit(release.wait, 5)
+    assert store.get(jobs[1])['status'] == 'queued'
+    release.set()
+    for job_id in jobs:
+        wait_for(store, job_id)
+    store.submit(lambda: None)
+
+
+def test_finished_jobs_expire_after_the_ttl(tmp_path):
+    store = JobStore(path=str(tmp_path / 'jobs.db'), ttl=0.1)
+    job_id = store.submit(lambda: 'done')
+    wait_for(store, job_id)
+    time.sleep(0.15)
+    assert store.get(job_id) is None
+
+
+def test_jobs_lost_with_their_worker_fail_and_then_expire(tmp_path):
+    path = str(tmp_path / 'jobs.db')
+    # A job accepted by a worker process that then died: never started or never finished
+    conn = sqlite3.connect(path, isolation_level=None)
+    store = JobStore(path=path, ttl=0.2, timeout=0.1)
+    store.get('init')
+    conn.execute("INSERT INTO analyze_jobs (id, status, created_at) VALUES ('lost', 'running', ?)", (time.time(),))
+
+    assert store.get('lost')['status'] == 'running'
+    time.sleep(0.15)
+    job = store.get('lost')
+    assert job['status'] == 'failed' and 'did not finish' in job['error']
+    time.sleep(0.25)
+    assert store.get('lost') is None
@@ -0,0 +1,89 @@
+import json
+import io
+import pytest
+from openai import OpenAI
+from PIL import Image
+from analysis_cache import AnalysisCache
+from benchmarks.fakes import CANNED_ANALYSIS, StubOpenAIServer
+from storage import SQLiteBackend
+import report_api
+
+
+def image_bytes(color=(200, 30, 30)) -> bytes:
+    output = io.BytesIO()
+    Image.new('RGB', (300, 200), color).save(output, format='PNG')
+    return output.getvalue()
+
+
+@pytest.fixture
+def api(tmp_path, monkeypatch):
+    """Test client analyzing against a stub model, caching and saving under tmp_path"""
+    server = StubOpenAIServer(chunk_count=40).start()
+    storage = SQLiteBackend(str(tmp_path / 'hospital.db'))
+    monkeypatch.setattr(report_api, 'openai_client', OpenAI(api_key='stub', base_url=server.base_url))
+    monkeypatch.setattr(report_api, 'analysis_cache', AnalysisCache(
+        report_api.ANALYSIS_CACHE_VERSION, directory=str(tmp_path / 'analysis_cache')))
+    monkeypatch.setattr(report_api, 'get_storage', lambda: storage)
+    yield report_api.flask_app.test_client(), server, storage
+    server.stop()
+    storage.close()
+
+
+def test_batch_analyzes_each_image_and_saves_the_successes(api):
+    client, server, storage = api
+    response = client.post('/analyze/batch', data={'images': [
+        (io.BytesIO(image_bytes()), 'first.png'),
+        (io.BytesIO(b'not an image'), 'junk.png'),
+        (io.BytesIO(image_bytes((30, 30, 200))), 'second.png'),
+    ]}, content_type='multipart/form-data')
+
+    assert response.status_code == 200
+    body = response.get_json()
+    assert (body['total'], body['succeeded'], body['failed']) == (3, 2, 1)
+    assert [result['filename'] for result in body['results']] == ['first.png', 'junk.png', 'second.png']
+    assert 'Could not read image' in body['results'][1]['message']
+    assert server.requests == 2
+    for result in (body['results'][0], body['results'][2]):
+        saved = storage.reports_for(result['id'])
+        assert [level['name'] for level in saved[0]['levels']] == [l['name'] for l in CANNED_ANALYSIS['levels']]
+
+
+def test_batch_without_images_is_rejected(api):
+    client, _, _ = api
+    response = client.post('/analyze/batch', data={}, content_type='multipart/form-data')
+    assert response.status_code == 400
+
+
+def parse_events(body: str) -> list:
+    events = []
+    for block in body.strip().split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.splitlines())
+        events.append((fields['event'], json.loads(fields['data'])))
+    return events
+
+
+def test_stream_sends_each_part_then_the_saved_report(api):
+    client, server, storage = api
+    response = client.post('/analyze?stream=1', data={'image': (io.BytesIO(image_bytes()), 'report.png')},
+                           content_type='multipart/form-data')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+
+    events = parse_events(response.get_data(as_text=True))
+    kinds = [kind for kind, _ in events]
+    levels = CANNED_ANALYSIS['levels']
+    assert kinds == ['type'] + ['level'] * len(levels) + ['concerns', 'done']
+    assert events[0][1] == {'type': CANNED_ANALYSIS['type']}
+    assert [data['index'] for kind, data in events if kind == 'level'] == list(range(len(levels)))
+    assert [data['level']['name'] for kind, data in events if kind == 'level'] == [l['name'] for l in levels]
+    done = events[-1][1]
+    assert done['success'] and storage.reports_for(done['id'])
+
+
+def test_stream_reports_model_failures_as_an_error_event(api):
+    client, server, _ = api
+    server.stop()
+    response = client.post('/analyze?stream=1', data={'image': (io.BytesIO(image_bytes()), 'report.png')},
+                           content_type='multipart/form-data')
+    kind, data = parse_events(response.get_data(as_text=True))[-1]
+    assert kind == 'error' and data['success'] is False
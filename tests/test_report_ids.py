@@ -0,0 +1,62 @@
+import pytest
+from report_ids import (
+    ALPHABET, ReportIdAllocator, check_symbol, is_legacy_report_id, is_valid_report_id, normalize_report_id
+)
+
+def test_check_symbol_catches_every_single_symbol_mistake():
+    code = 'K7M2QX'
+    code += check_symbol(code)
+    assert is_valid_report_id(code)
+    for position in range(len(code)):
+        for symbol in ALPHABET:
+            if symbol != code[position]:
+                assert not is_valid_report_id(code[:position] + symbol + code[position + 1:])
+
+
+@pytest.mark.parametrize('code', ['', 'K7M2QX', 'K7M2QXAB', 'k7m2qxa', 'K7M2QUA'])
+def test_malformed_ids_are_rejected(code):
+    assert not is_valid_report_id(code)
+
+
+def test_spoken_ids_are_normalized():
+    assert normalize_report_id(' k7m-2qx o ') == 'K7M2QX0'
+    assert normalize_report_id('il') == '11'
+
+
+def test_legacy_ids_are_recognized():
+    assert is_legacy_report_id('7') and is_legacy_report_id('42')
+    assert not is_legacy_report_id('123') and not is_legacy_report_id('4A')
+
+
+def test_allocators_sharing_a_database_never_repeat_an_id(tmp_path):
+    path = str(tmp_path / 'ids.db')
+    first, second = ReportIdAllocator(path, length=1), ReportIdAllocator(path, length=1, max_attempts=1000)
+    # One-symbol bodies leave only 32 possible ids, so repeats would show up at once
+    issued = [first.allocate()] + [second.allocate() for _ in range(31)]
+    assert len(set(issued)) == 32
+    assert all(check_symbol(code[:-1]) == code[-1] for code in issued)
+    assert first.was_issued(issued[-1])
+    with pytest.raises(RuntimeError):
+        first.allocate()
+
+
+def test_api_issues_ids_from_the_shared_allocator(tmp_path, monkeypatch):
+    import report_api
+    allocator = ReportIdAllocator(str(tmp_path / 'ids.db'))
+    monkeypatch.setattr(report_api, 'report_id_allocator', allocator)
+    client = report_api.flask_app.test_client()
+
+    issued = [client.post('/report-ids') for _ in range(5)]
+    assert [response.status_code for response in issued] == [201] * 5
+    codes = [response.get_json()['id'] for response in issued]
+    assert len(set(codes)) == 5
+    assert all(is_valid_report_id(code) and allocator.was_issued(code) for code in codes)
+
+
+def test_api_reports_an_exhausted_allocator(tmp_path, monkeypatch):
+    import report_api
+    monkeypatch.setattr(report_api, 'report_id_allocator', ReportIdAllocator(str(tmp_path / 'ids.db'), length=0))
+    client = report_api.flask_app.test_client()
+    assert client.post('/report-ids').status_code == 201
+    response = client.post('/report-ids')
+    assert response.status_code == 503 and not response.get_json()['success']
@@ -0,0 +1,80 @@
+import sqlite3
+from benchmarks.fakes import FakeWorksheet
+from reports import REPORT_COLUMNS, flatten_report, parse_flat_report
+from sheets import ensure_header
+from storage import SheetsBackend, SQLiteBackend
+
+AWKWARD_REPORT = {
+    'id': '7K3M9QA',
+    'timestamp': '2030-01-01 09:00:00',
+    'test_type': 'Blood Test',
+    'concerns': ['Low count | recheck', 'Note: fasting, 12h'],
+    'levels': [
+        {'name': 'WBC', 'value': '1, 200 /uL', 'reference_range': '4, 500-11, 000 /uL',
+         'what_it_is': 'White cells: they fight infection', 'your_level_means': 'Low, see a doctor',
+         'why_it_matters': 'Immunity || defence', 'possible_causes': 'Infection: viral, bacterial', 'abnormal': True},
+        {'name': 'Sodium', 'value': '140 mmol/L', 'reference_range': None,
+         'what_it_is': 'Salt', 'your_level_means': 'Normal', 'why_it_matters': 'Fluids',
+         'possible_causes': None, 'abnormal': False},
+    ],
+}
+
+
+def test_rows_with_report_json_round_trip_exactly():
+    assert parse_flat_report(flatten_report(AWKWARD_REPORT)) == AWKWARD_REPORT
+
+
+def test_older_rows_without_report_json_are_parsed_best_effort():
+    record = flatten_report({**AWKWARD_REPORT, 'levels': [
+        {**AWKWARD_REPORT['levels'][0], 'value': '1,200 /uL', 'reference_range': '4,500-11,000 /uL'},
+        AWKWARD_REPORT['levels'][1],
+    ]})
+    del record['report_json']
+    report = parse_flat_report(record)
+    wbc, sodium = report['levels']
+    assert (wbc['name'], wbc['value'], wbc['reference_range']) == ('WBC', '1,200 /uL', '4,500-11,000 /uL')
+    # Only the first ': ' separates the name from the explanation
+    assert wbc['what_it_is'] == 'White cells: they fight infection'
+    assert wbc['abnormal'] and not sodium['abnormal']
+    assert sodium['reference_range'] == 'N/A'
+
+
+def test_unreadable_report_json_falls_back_to_the_joined_columns():
+    record = {**flatten_report(AWKWARD_REPORT), 'report_json': '{not json'}
+    assert [level['name'] for level in parse_flat_report(record)['levels']] == ['WBC', 'Sodium']
+
+
+def test_sheets_backend_lookups_keep_embedded_commas(tmp_path):
+    record = flatten_report(AWKWARD_REPORT)
+    reports = FakeWorksheet('reports', [REPORT_COLUMNS, [record[c] for c in REPORT_COLUMNS]])
+    appointments = FakeWorksheet('appointments', [])
+    backend = SheetsBackend(lambda: appointments, lambda: reports)
+    assert backend.get_parameter('7K3M9QA', 'wbc')[0]['value'] == '1, 200 /uL'
+    assert backend.reports_for('7K3M9QA')[0]['concerns'] == AWKWARD_REPORT['concerns']
+
+
+def test_flat_sqlite_reports_are_migrated(tmp_path):
+    path = tmp_path / 'db.sqlite'
+    conn = sqlite3.connect(path, isolation_level=None)
+    legacy_columns = REPORT_COLUMNS[:REPORT_COLUMNS.index('report_json')]
+    conn.execute(f"CREATE TABLE reports (row_id INTEGER PRIMARY KEY, {', '.join(legacy_columns)})")
+    record = flatten_report(AWKWARD_REPORT)
+    conn.execute(f"INSERT INTO reports ({', '.join(legacy_columns)}) VALUES ({', '.join('?' for _ in legacy_columns)})",
+                 [record[c] for c in legacy_columns])
+    conn.close()
+
+    backend = SQLiteBackend(str(path))
+    [report] = backend.reports_for('7K3M9QA')
+    assert [level['name'] for level in report['levels']] == ['WBC', 'Sodium']
+    assert report['levels'][0]['possible_causes'] == 'Infection: viral, bacterial'
+    assert [level['name'] for level in backend.abnormal_levels('7K3M9QA')] == ['WBC']
+    tables = {row[0] for row in backend.connection().execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert 'reports_legacy' in tables and 'reports' not in tables
+
+
+def test_header_gains_new_columns_without_moving_rows():
+    sheet = FakeWorksheet('reports', [REPORT_COLUMNS[:-1], ['row 1']])
+    ensure_header(sheet, REPORT_COLUMNS)
+    assert sheet.get_all_values() == [REPORT_COLUMNS, ['row 1']]
+    ensure_header(sheet, REPORT_COLUMNS)
+    assert sheet.calls['update'] == 1 and sheet.calls['insert_row'] == 0
@@ -0,0 +1,198 @@
+import threading
+import time
+import pytest
+from requests.exceptions import ConnectionError as RequestsConnectionError
+from appointments import SlotIndex
+from benchmarks.fakes import FakeWorksheet, api_error, appointment_slot, appointment_values
+from sheets import QuotaBucket, ScheduledWorksheet, SheetsScheduler, SheetsUnavailable
+
+
+def make_scheduler(tmp_path, **kwargs) -> SheetsScheduler:
+    options = dict(reads_per_minute=600, writes_per_minute=600, burst=100, path=str(tmp_path / 'quota.db'),
+                   max_backoff=0.01, breaker_threshold=3, breaker_cooldown=0.2)
+    options.update(kwargs)
+    return SheetsScheduler(**options)
+
+
+def flaky(*errors, result='ok'):
+    """A call that raises each of errors in turn, then returns result"""
+    remaining = list(errors)
+    calls = []
+
+    def call():
+        calls.append(1)
+        if remaining:
+            raise remaining.pop(0)
+        return result
+    call.calls = calls
+    return call
+
+
+# QuotaBucket
+
+def test_bucket_serves_the_burst_then_paces_at_the_refill_rate(tmp_path):
+    bucket = QuotaBucket('read', per_minute=60, burst=10, path=str(tmp_path / 'q.db'))
+    assert [bucket.reserve(max_wait=0) for _ in range(10)] == [0.0] * 10
+    # Refill is (60 - 10) / 60 tokens a second; later callers queue behind earlier ones
+    assert bucket.reserve(max_wait=5) == pytest.approx(1.2, abs=0.01)
+    assert bucket.reserve(max_wait=5) == pytest.approx(2.4, abs=0.01)
+    assert bucket.reserve(max_wait=1) is None
+
+
+def test_bucket_is_shared_through_the_database(tmp_path):
+    path = str(tmp_path / 'q.db')
+    first, second = QuotaBucket('read', 60, burst=2, path=path), QuotaBucket('read', 60, burst=2, path=path)
+    first.reserve(0), second.reserve(0)
+    assert first.reserve(max_wait=0) is None
+
+
+def test_drained_bucket_makes_everyone_wait(tmp_path):
+    bucket = QuotaBucket('read', 60, burst=10, path=str(tmp_path / 'q.db'))
+    bucket.drain()
+    assert bucket.reserve(max_wait=0) is None
+
+
+@pytest.mark.parametrize('per_minute', [1, 2, 3])
+def test_tiny_quotas_still_refill(tmp_path, per_minute):
+    bucket = QuotaBucket('write', per_minute, burst=10, path=str(tmp_path / 'q.db'))
+    assert bucket.rate > 0
+    # Burst plus a minute of refill never exceeds the quota
+    assert bucket.burst + bucket.rate * 60 == pytest.approx(per_minute)
+    assert bucket.reserve(max_wait=120) is not None
+
+
+@pytest.mark.parametrize('per_minute', [0, -5])
+def test_quota_must_be_positive(tmp_path, per_minute):
+    with pytest.raises(ValueError):
+        QuotaBucket('read', per_minute, path=str(tmp_path / 'q.db'))
+
+
+# SheetsScheduler
+
+def test_transient_errors_are_retried(tmp_path):
+    scheduler = make_scheduler(tmp_path)
+    call = flaky(api_error(503, 'unavailable', 'UNAVAILABLE'), RequestsConnectionError('reset by peer'))
+    assert scheduler.call('read', call) == 'ok'
+    assert len(call.calls) == 3 and scheduler.counts['retries'] == 2
+
+
+def test_client_errors_are_not_retried(tmp_path):
+    scheduler = make_scheduler(tmp_path)
+    call = flaky(api_error(400, 'bad range', 'INVALID_ARGUMENT'))
+    with pytest.raises(Exception, match='bad range'):
+        scheduler.call('read', call)
+    assert len(call.calls) == 1 and not scheduler.is_open()
+
+
+def test_rate_limit_response_drains_the_bucket(tmp_path):
+    scheduler = make_scheduler(tmp_path, reads_per_minute=60, burst=10)
+    scheduler.call('read', flaky(api_error(429, 'quota', 'RESOURCE_EXHAUSTED')))
+    # The retry waited for a fresh token instead of spending the rest of the burst
+    assert scheduler.counts['throttled'] == 1
+
+
+def test_calls_give_up_at_the_deadline(tmp_path):
+    scheduler = make_scheduler(tmp_path, reads_per_minute=2, burst=1, read_deadline=0.5)
+    scheduler.call('read', flaky())
+    started = time.monotonic()
+    with pytest.raises(SheetsUnavailable):
+        scheduler.call('read', flaky())
+    assert time.monotonic() - started < 0.5
+
+
+def test_breaker_opens_after_repeated_failures_and_probes_to_close(tmp_path):
+    scheduler = make_scheduler(tmp_path, max_retries=0)
+    for _ in range(3):
+        with pytest.raises(Exception):
+            scheduler.call('read', flaky(api_error(503, 'unavailable', 'UNAVAILABLE')))
+    assert scheduler.is_open()
+
+    healthy = flaky()
+    with pytest.raises(SheetsUnavailable):
+        scheduler.call('read', healthy)
+    assert not healthy.calls
+
+    time.sleep(0.25)
+    with pytest.raises(Exception):
+        scheduler.call('read', flaky(api_error(503, 'unavailable', 'UNAVAILABLE')))
+    # A failed probe opens the circuit for another cooldown
+    assert scheduler.is_open()
+    time.sleep(0.25)
+    assert scheduler.call('read', healthy) == 'ok'
+    assert not scheduler.is_open()
+
+
+def test_prepaid_tokens_are_spent_before_the_call(tmp_path):
+    scheduler = make_scheduler(tmp_path, reads_per_minute=120, burst=1)
+    with scheduler.prepaid('read'):
+        started = time.monotonic()
+        assert scheduler.call('read', flaky()) == 'ok'
+        assert time.monotonic() - started < 0.1
+        # Only one token was prepaid; the next call waits for its own
+        scheduler.call('read', flaky())
+    assert scheduler.counts['throttled'] == 1 and scheduler.counts['read'] == 2
+
+
+def test_unused_prepaid_tokens_are_dropped(tmp_path):
+    scheduler = make_scheduler(tmp_path)
+    with scheduler.prepaid('read', 'write'):
+        pass
+    assert scheduler._local.prepaid is None
+
+
+def test_identical_reads_in_flight_share_one_request(tmp_path):
+    scheduler = make_scheduler(tmp_path)
+    sheet = FakeWorksheet('appointments', appointment_values(5), latency=0.2)
+    wrapped = ScheduledWorksheet(sheet, scheduler, 'appointments')
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(wrapped.get_all_values())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(results) == 8 and all(r == results[0] for r in results)
+    assert sheet.calls['get_all_values'] == 1
+    assert scheduler.counts['coalesced'] == 7
+
+
+# SheetIndex
+
+def test_index_fetches_only_new_rows(tmp_path):
+    sheet = FakeWorksheet('appointments', appointment_values(10))
+    index = SlotIndex(lambda: sheet, max_staleness=0)
+    assert index.is_booked(*appointment_slot(9))
+    sheet.append_row(['now', 'New', 'new@example.com', 'General Checkup', *appointment_slot(10)])
+
+    assert index.is_booked(*appointment_slot(10))
+    assert sheet.calls['get_all_values'] == 1 and sheet.calls['get'] == 1
+
+
+def test_concurrent_syncs_join_the_one_in_flight(tmp_path):
+    sheet = FakeWorksheet('appointments', appointment_values(10), latency=0.2)
+    index = SlotIndex(lambda: sheet)
+    index.ensure_fresh()
+    threads = [threading.Thread(target=index.is_booked, args=(*appointment_slot(0),), kwargs={'max_staleness': 0})
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sheet.calls['get'] <= 2
+
+
+def test_index_serves_last_known_rows_while_sheets_fails(tmp_path):
+    scheduler = make_scheduler(tmp_path, max_retries=0)
+    sheet = FakeWorksheet('appointments', appointment_values(10))
+    index = SlotIndex(lambda: ScheduledWorksheet(sheet, scheduler, 'appointments'), max_staleness=0)
+    assert index.is_booked(*appointment_slot(3))
+
+    sheet.error_rate = 1.0
+    assert index.is_booked(*appointment_slot(3))
+    assert not index.is_booked(*appointment_slot(50))
+
+
+def test_index_without_data_raises_when_sheets_fails(tmp_path):
+    sheet = FakeWorksheet('appointments', appointment_values(10), error_rate=1.0)
+    index = SlotIndex(lambda: sheet)
+    with pytest.raises(Exception, match='503'):
+        index.is_booked(*appointment_slot(3))
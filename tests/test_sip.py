@@ -0,0 +1,142 @@
+import asyncio
+import json
+import time
+import pytest
+from livekit import api
+from benchmarks.fakes import FakeLiveKitAPI
+from sip import RateLimiter, RoomReaper, is_retryable, load_campaign, place_campaign_call, run_campaign
+
+
+class RejectingLiveKitAPI(FakeLiveKitAPI):
+    """Refuses every dial with a non-retryable error"""
+
+    async def create_sip_participant(self, request):
+        self.dial_times.append(time.monotonic())
+        raise api.TwirpError('invalid_argument', 'bad number', status=400)
+
+
+def test_rate_limiter_spaces_starts():
+    async def span() -> float:
+        limiter = RateLimiter(20)
+        started = time.monotonic()
+        for _ in range(5):
+            await limiter.wait()
+        return time.monotonic() - started
+
+    # Measured over the whole run: a late wakeup shortens the next observed gap
+    assert asyncio.run(span()) >= 4 * 0.05 - 0.005
+
+
+def test_transient_errors_are_retried():
+    lk_api = FakeLiveKitAPI(latency=0, failure_rate=0.5, seed=1)
+    entry = {'phone_number': '+15550100'}
+    results = [asyncio.run(place_campaign_call(lk_api, entry, f"room-{i}", max_attempts=20, max_backoff=0.01))
+               for i in range(10)]
+    assert any(r['attempts'] > 1 for r in results)
+    assert all(r['status'] == 'initiated' and 'error' not in r for r in results)
+    assert sum(r['attempts'] for r in results) == len(lk_api.dial_times)
+
+
+def test_retries_stop_at_max_attempts():
+    lk_api = FakeLiveKitAPI(latency=0, failure_rate=1.0)
+    result = asyncio.run(place_campaign_call(lk_api, {'phone_number': '+15550100'}, 'room', max_attempts=3,
+                                             max_backoff=0.01))
+    assert result['status'] == 'failed' and result['attempts'] == 3
+    assert result['error'] == 'unavailable: callee busy'
+    assert len(lk_api.dial_times) == 3
+
+
+def test_permanent_errors_fail_without_retrying():
+    lk_api = RejectingLiveKitAPI()
+    result = asyncio.run(place_campaign_call(lk_api, {'phone_number': '+15550100'}, 'room', max_attempts=3,
+                                             max_backoff=0.01))
+    assert result['status'] == 'failed' and result['attempts'] == 1
+    assert not is_retryable(api.TwirpError('invalid_argument', 'bad number', status=400))
+    assert is_retryable(api.TwirpError('resource_exhausted', 'slow down', status=429))
+
+
+def test_retries_wait_on_the_rate_limiter():
+    lk_api = FakeLiveKitAPI(latency=0, failure_rate=1.0)
+    started = time.monotonic()
+    asyncio.run(place_campaign_call(lk_api, {'phone_number': '+15550100'}, 'room', max_attempts=3,
+                                    max_backoff=0, limiter=RateLimiter(10)))
+    assert len(lk_api.dial_times) == 3
+    assert lk_api.dial_times[-1] - started >= 2 * 0.1 - 0.005
+
+
+def test_campaign_respects_concurrency_and_rate(tmp_path):
+    lk_api = FakeLiveKitAPI(latency=0, call_duration=(0.2, 0.3))
+    entries = [{'phone_number': f"+1555010{i}", 'name': f"Patient {i}"} for i in range(8)]
+    results_path = tmp_path / 'results.jsonl'
+    started = time.monotonic()
+    results = asyncio.run(run_campaign(entries, lk_api, str(results_path), max_concurrent=2, calls_per_second=20,
+                                       max_backoff=0.01, poll_interval=0.02, max_duration=5))
+    assert [r['status'] for r in results] == ['completed'] * 8
+    assert lk_api.peak_active_calls == 2
+    assert lk_api.dial_times[-1] - started >= 7 * 0.05 - 0.005
+    logged = [json.loads(line) for line in results_path.read_text().splitlines()]
+    assert sorted(r['phone_number'] for r in logged) == sorted(e['phone_number'] for e in entries)
+
+
+def test_load_campaign_requires_phone_numbers(tmp_path):
+    path = tmp_path / 'campaign.csv'
+    path.write_text('phone_number,name\n +15550100 ,Ann\n,Bob\n')
+    with pytest.raises(ValueError, match='Entry 2'):
+        load_campaign(str(path))
+    path.write_text('phone_number,name\n +15550100 ,Ann\n')
+    assert load_campaign(str(path)) == [{'phone_number': '+15550100', 'name': 'Ann'}]
+
+
+@pytest.mark.parametrize('max_attempts', [0, -1])
+def test_campaign_needs_at_least_one_attempt(tmp_path, max_attempts):
+    lk_api = FakeLiveKitAPI(latency=0)
+    results_path = tmp_path / 'results.jsonl'
+    with pytest.raises(ValueError, match='max_attempts'):
+        asyncio.run(run_campaign([{'phone_number': '+15550100'}], lk_api, str(results_path),
+                                 max_attempts=max_attempts))
+    assert not lk_api.dial_times and not results_path.exists()
+    with pytest.raises(ValueError, match='max_attempts'):
+        asyncio.run(place_campaign_call(lk_api, {'phone_number': '+15550100'}, 'room', max_attempts=max_attempts))
+
+
+def sweep(reaper: RoomReaper) -> dict:
+    return asyncio.run(reaper.sweep())
+
+
+def test_reaper_keeps_live_calls_and_ends_hung_up_ones():
+    lk_api = FakeLiveKitAPI(latency=0)
+    lk_api.add_room('call-live', sip_seconds=60)
+    lk_api.add_room('call-dropped', sip_seconds=60)
+    reaper = RoomReaper(lk_api, idle_seconds=300)
+
+    assert sweep(reaper)['live'] == 2
+    lk_api.hang_up('call-dropped')
+    counts = sweep(reaper)
+    assert (counts['live'], counts['reaped'], counts['reaped_total']) == (1, 1, 1)
+    assert lk_api.deleted == ['call-dropped'] and 'call-live' in lk_api.rooms
+
+
+def test_reaper_ends_rooms_that_stay_idle():
+    lk_api = FakeLiveKitAPI(latency=0)
+    lk_api.add_room('call-new')
+    lk_api.add_room('call-stale', created=time.time() - 600)
+    counts = sweep(RoomReaper(lk_api, idle_seconds=300))
+    assert (counts['idle'], counts['reaped']) == (1, 1)
+    assert lk_api.deleted == ['call-stale']
+
+
+def test_reaper_dry_run_deletes_nothing():
+    lk_api = FakeLiveKitAPI(latency=0)
+    lk_api.add_room('call-stale', created=time.time() - 600)
+    counts = sweep(RoomReaper(lk_api, idle_seconds=300, dry_run=True))
+    assert (counts['abandoned'], counts['reaped']) == (1, 0)
+    assert not lk_api.deleted and 'call-stale' in lk_api.rooms
+
+
+def test_reaper_only_touches_rooms_with_its_prefix():
+    lk_api = FakeLiveKitAPI(latency=0)
+    lk_api.add_room('call-stale', created=time.time() - 600)
+    lk_api.add_room('meeting-stale', created=time.time() - 600)
+    counts = sweep(RoomReaper(lk_api, idle_seconds=300, prefix='call-', batch_size=1))
+    assert counts['reaped'] == 1
+    assert lk_api.deleted == ['call-stale'] and 'meeting-stale' in lk_api.rooms
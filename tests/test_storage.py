@@ -0,0 +1,217 @@
+import os
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+import pytest
+from benchmarks.fakes import (
+    FakeWorksheet, CANNED_ANALYSIS, appointment_slot, appointment_values, canned_report, report_values
+)
+from reports import REPORT_COLUMNS, flatten_report
+from sheets import ScheduledWorksheet, SheetsScheduler
+from storage import SCHEMA, SQLiteBackend, SheetsBackend, SheetsInboundSync, SheetsReplicator
+
+
+@pytest.fixture
+def sheets():
+    reports, ids = report_values(3, CANNED_ANALYSIS)
+    return {
+        'appointments': FakeWorksheet('appointments', appointment_values(4)),
+        'reports': FakeWorksheet('reports', reports),
+        'ids': ids,
+    }
+
+
+def make_backend(path, sheets) -> SQLiteBackend:
+    return SQLiteBackend(str(path), sheet_getters={
+        'appointments': lambda: sheets['appointments'],
+        'reports': lambda: sheets['reports'],
+    })
+
+
+def report_count(backend) -> int:
+    return backend.connection().execute('SELECT COUNT(*) FROM report_headers').fetchone()[0]
+
+
+def sheet_row(report: dict) -> list:
+    record = flatten_report(report)
+    return [record[c] for c in REPORT_COLUMNS]
+
+
+def test_first_connection_imports_the_sheets(tmp_path, sheets):
+    backend = make_backend(tmp_path / 'db.sqlite', sheets)
+    assert report_count(backend) == 3
+    assert len(backend.booked_between('2030-01-01', '2030-01-31')['2030-01-01']) == 4
+    assert backend.reports_for(sheets['ids'][0])[0]['test_type'] == 'Blood Test'
+
+
+def test_import_is_idempotent_across_restarts(tmp_path, sheets):
+    path = tmp_path / 'db.sqlite'
+    make_backend(path, sheets).connection()
+    # A restart that lost its import marks must not store the rows a second time
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute("DELETE FROM meta")
+    restarted = make_backend(path, sheets)
+    assert report_count(restarted) == 3
+    assert restarted.connection().execute('SELECT COUNT(*) FROM appointments').fetchone()[0] == 4
+
+
+def test_rows_uploaded_to_the_sheet_later_are_pulled_in(tmp_path, sheets):
+    backend = make_backend(tmp_path / 'db.sqlite', sheets)
+    backend.connection()
+    uploaded = canned_report('7ABCDEZ', CANNED_ANALYSIS)
+    sheets['reports'].append_row(sheet_row(uploaded))
+
+    assert backend.sync_from_sheets() == 1
+    assert backend.reports_for('7ABCDEZ')[0]['id'] == '7ABCDEZ'
+    # Only the rows past the last import are fetched
+    assert sheets['reports'].calls['get'] == 1
+    assert backend.sync_from_sheets() == 0
+
+
+def test_new_processes_resume_from_the_stored_mark(tmp_path, sheets):
+    path = tmp_path / 'db.sqlite'
+    for _ in range(3):
+        make_backend(path, sheets).connection()
+    # Later processes check the header row and fetch the (empty) tail instead of the whole sheet
+    assert sheets['reports'].calls['get_all_values'] == 1
+    assert sheets['reports'].calls['row_values'] == 2 and sheets['reports'].calls['get'] == 2
+
+    sheets['reports'].append_row(sheet_row(canned_report('6ABCDEZ', CANNED_ANALYSIS)))
+    assert len(make_backend(path, sheets).reports_for('6ABCDEZ')) == 1
+    assert sheets['reports'].calls['get_all_values'] == 1
+
+
+def test_a_changed_header_row_triggers_a_full_import(tmp_path, sheets):
+    path = tmp_path / 'db.sqlite'
+    make_backend(path, sheets).connection()
+    sheets['reports'].insert_row(['Report export'], 1)
+
+    make_backend(path, sheets).connection()
+    assert sheets['reports'].calls['get_all_values'] == 2
+
+
+def test_rows_replicated_from_sqlite_are_not_imported_back(tmp_path, sheets):
+    backend = make_backend(tmp_path / 'db.sqlite', sheets)
+    backend.save_report(canned_report('8ABCDEZ', CANNED_ANALYSIS))
+    assert SheetsReplicator(backend).run_once() == 1
+    assert sheets['reports'].row_count() == 5
+
+    assert backend.sync_from_sheets() == 0
+    assert len(backend.reports_for('8ABCDEZ')) == 1
+
+
+def test_duplicates_from_an_earlier_import_are_removed(tmp_path, sheets):
+    path = tmp_path / 'db.sqlite'
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.executescript(SCHEMA)
+    for _ in range(2):
+        conn.execute("INSERT INTO report_headers (id, timestamp, test_type) VALUES ('12', '2024-01-01', 'Blood')")
+    conn.execute("INSERT INTO report_headers (id, timestamp, test_type) VALUES ('12', '2024-02-01', 'Urine')")
+    conn.close()
+
+    backend = SQLiteBackend(str(path))
+    assert [r['test_type'] for r in backend.reports_for('12')] == ['Blood', 'Urine']
+
+
+def test_inbound_sync_runs_once_per_interval_across_processes(tmp_path, sheets):
+    path = tmp_path / 'db.sqlite'
+    first, second = make_backend(path, sheets), make_backend(path, sheets)
+    first.connection(), second.connection()
+    sheets['reports'].append_row(sheet_row(canned_report('9ABCDEZ', CANNED_ANALYSIS)))
+
+    assert SheetsInboundSync(first, interval=60).run_once() == 1
+    assert SheetsInboundSync(second, interval=60).run_once() == 0
+    assert len(second.reports_for('9ABCDEZ')) == 1
+
+
+def test_replicator_leases_rows_and_backs_off_on_failure(tmp_path, sheets):
+    backend = make_backend(tmp_path / 'db.sqlite', sheets)
+    backend.book_appointment({'timestamp': 'now', 'name': 'A', 'email': 'a@example.com',
+                              'appointment_type': 'General Checkup', 'date': '2031-01-01', 'time': '09:00'})
+    # Rows claimed by one replicator are left alone by another until the lease ends
+    claimed = SheetsReplicator(backend)._claim()
+    assert len(claimed) == 1
+    assert SheetsReplicator(backend).run_once() == 0
+
+    def broken():
+        raise ConnectionError('offline')
+    backend.sheet_getters['appointments'] = broken
+    replicator = SheetsReplicator(backend, lease=0)
+    replicator._release(claimed, 'expired')
+    backend.connection().execute('UPDATE outbox SET next_attempt_at = 0')
+    assert replicator.run_once() == 0
+    row = backend.connection().execute('SELECT attempts, next_attempt_at, last_error FROM outbox').fetchone()
+    assert row['attempts'] == 2 and row['next_attempt_at'] > 0 and row['last_error'] == 'offline'
+    assert backend.pending_writes() == 1
+
+    backend.sheet_getters['appointments'] = lambda: sheets['appointments']
+    backend.connection().execute('UPDATE outbox SET next_attempt_at = 0')
+    assert replicator.run_once() == 1
+    assert sheets['appointments'].get_all_values()[-1][4:] == ['2031-01-01', '09:00']
+    assert backend.pending_writes() == 0
+
+
+class TimedLock:
+    """Lock that records how long each holder kept it"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.holds = []
+
+    def __enter__(self):
+        self._lock.acquire()
+        self._acquired_at = time.monotonic()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.holds.append(time.monotonic() - self._acquired_at)
+        self._lock.release()
+
+
+def test_sheets_bookings_wait_for_quota_outside_the_lock(tmp_path, sheets):
+    scheduler = SheetsScheduler(reads_per_minute=240, writes_per_minute=240, burst=1, path=str(tmp_path / 'q.db'))
+    appointments = ScheduledWorksheet(sheets['appointments'], scheduler, 'appointments')
+    backend = SheetsBackend(lambda: appointments, lambda: sheets['reports'], scheduler=scheduler)
+    backend.is_slot_booked(*appointment_slot(0))
+    backend._booking_lock = TimedLock()
+
+    results = []
+    threads = [threading.Thread(target=lambda i=i: results.append(backend.book_appointment({
+        'timestamp': 'now', 'name': f"Patient {i}", 'email': 'p@example.com', 'appointment_type': 'Physical',
+        'date': appointment_slot(10 + i)[0], 'time': appointment_slot(10 + i)[1],
+    }))) for i in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == [True] * 5
+    assert scheduler.counts['throttled'] > 0
+    # Each booking paced at about 0.25s per token, but only the calls themselves ran under the lock
+    assert max(backend._booking_lock.holds) < 0.1
+
+
+def test_importing_backends_starts_no_storage(tmp_path):
+    script = 'import threading, backends; print(backends._storage is None, len(threading.enumerate()))'
+    output = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout
+    assert output.split() == ['True', '1']
+
+
+def test_sheets_report_writer_starts_with_the_first_report(tmp_path, sheets):
+    backend = SheetsBackend(lambda: sheets['appointments'], lambda: sheets['reports'])
+    assert backend.report_writer._thread is None
+    backend.save_report(canned_report('5ABCDEZ', CANNED_ANALYSIS))
+    assert backend.report_writer._thread.is_alive()
+    backend.report_writer.stop()
+    assert sheets['reports'].row_count() == 5
+
+
+def test_warmed_sheets_backend_answers_without_a_full_download(tmp_path, sheets):
+    backend = SheetsBackend(lambda: sheets['appointments'], lambda: sheets['reports'])
+    backend.warm()
+    assert sheets['appointments'].calls['get_all_values'] == 1 and sheets['reports'].calls['get_all_values'] == 1
+    assert backend.is_slot_booked(*appointment_slot(0))
+    assert backend.reports_for(sheets['ids'][0])
+    assert sheets['appointments'].calls['get_all_values'] == 1 and sheets['reports'].calls['get_all_values'] == 1
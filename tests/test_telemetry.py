@@ -0,0 +1,73 @@
+import os
+import subprocess
+import sys
+import pytest
+from prometheus_client import CollectorRegistry, multiprocess
+import telemetry
+
+OBSERVE = """
+import telemetry
+telemetry.TOOL_DURATION.labels(tool='lookup').observe({seconds})
+telemetry.LOOP_LAG.set(0.5)
+"""
+
+
+def run_job(directory, seconds: float):
+    env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=str(directory))
+    subprocess.run([sys.executable, '-c', OBSERVE.format(seconds=seconds)], env=env, check=True,
+                   cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def samples(directory) -> dict:
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry, path=str(directory))
+    return {
+        (sample.name, tuple(sorted(sample.labels.items()))): sample.value
+        for metric in registry.collect() for sample in metric.samples
+    }
+
+
+def test_dead_process_files_are_folded_into_the_archive(tmp_path):
+    for seconds in (0.1, 0.4, 2.5):
+        run_job(tmp_path, seconds)
+    before = samples(tmp_path)
+    assert before[('voice_tool_duration_seconds_count', (('tool', 'lookup'),))] == 3
+
+    assert telemetry.prune_dead_processes(str(tmp_path)) == 3
+    after = samples(tmp_path)
+    assert sorted(name for name in os.listdir(tmp_path) if name.endswith('.db')) == ['histogram_archive.db']
+    # Histogram totals are unchanged; the dead processes' live gauges are gone
+    assert {k: v for k, v in before.items() if not k[0].startswith('agent_event_loop')} == after
+    assert telemetry.prune_dead_processes(str(tmp_path)) == 0
+
+
+def test_archive_keeps_adding_up(tmp_path):
+    run_job(tmp_path, 0.1)
+    telemetry.prune_dead_processes(str(tmp_path))
+    run_job(tmp_path, 0.2)
+    telemetry.prune_dead_processes(str(tmp_path))
+    assert samples(tmp_path)[('voice_tool_duration_seconds_sum', (('tool', 'lookup'),))] == pytest.approx(0.3)
+
+
+def test_live_processes_are_left_alone(tmp_path):
+    path = tmp_path / f"histogram_{os.getpid()}.db"
+    path.write_bytes(b'')
+    assert telemetry.prune_dead_processes(str(tmp_path)) == 0
+    assert path.exists()
+
+
+def test_render_reads_every_process(tmp_path, monkeypatch):
+    run_job(tmp_path, 0.1)
+    monkeypatch.setenv('PROMETHEUS_MULTIPROC_DIR', str(tmp_path))
+    body, _ = telemetry.render()
+    assert b'voice_tool_duration_seconds_count{tool="lookup"} 1.0' in body
+
+
+def test_render_merges_every_role_directory(tmp_path, monkeypatch):
+    for role in ('api', 'agent'):
+        (tmp_path / role).mkdir()
+        run_job(tmp_path / role, 0.1)
+    monkeypatch.setenv('PROMETHEUS_MULTIPROC_DIR', str(tmp_path / 'api'))
+    monkeypatch.setattr(telemetry, 'METRICS_DIR', str(tmp_path))
+    body, _ = telemetry.render()
+    assert b'voice_tool_duration_seconds_count{tool="lookup"} 2.0' in body
@@ -0,0 +1,70 @@
+import asyncio
+from types import SimpleNamespace
+from livekit import rtc
+from tts_cache import PhraseAudioCache
+
+
+class FakeTTS:
+    """Yields frame_count silent frames per synthesis, optionally failing after fail_after"""
+
+    def __init__(self, frame_count: int = 3, fail_after: int = None):
+        self.frame_count = frame_count
+        self.fail_after = fail_after
+        self.calls = 0
+
+    def synthesize(self, text: str):
+        self.calls += 1
+        return FakeStream(self)
+
+
+class FakeStream:
+    def __init__(self, tts: FakeTTS):
+        self.tts = tts
+        self.closed = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.closed = True
+
+    async def _events(self):
+        for i in range(self.tts.frame_count):
+            if self.tts.fail_after is not None and i >= self.tts.fail_after:
+                raise ConnectionError('tts dropped')
+            yield SimpleNamespace(frame=rtc.AudioFrame(b'\0' * 320, 8000, 1, 160))
+
+    def __aiter__(self):
+        return self._events()
+
+
+async def collect(generator, limit: int = None) -> list:
+    frames = []
+    async for frame in generator:
+        frames.append(frame)
+        if limit is not None and len(frames) >= limit:
+            break
+    await generator.aclose()
+    return frames
+
+
+def test_record_plays_and_caches_one_synthesis(tmp_path):
+    cache, tts = PhraseAudioCache('voice', str(tmp_path)), FakeTTS()
+    played = asyncio.run(collect(cache.record(tts, 'Hello')))
+    assert len(played) == 3
+    assert cache.get('Hello') == played
+    assert tts.calls == 1
+
+
+def test_interrupted_phrase_is_not_cached(tmp_path):
+    cache = PhraseAudioCache('voice', str(tmp_path))
+    asyncio.run(collect(cache.record(FakeTTS(), 'Hello'), limit=1))
+    assert cache.get('Hello') is None
+
+
+def test_failed_synthesis_ends_playback_without_caching(tmp_path, capsys):
+    cache = PhraseAudioCache('voice', str(tmp_path))
+    played = asyncio.run(collect(cache.record(FakeTTS(fail_after=2), 'Hello')))
+    assert len(played) == 2
+    assert cache.get('Hello') is None
+    assert 'tts dropped' in capsys.readouterr().out
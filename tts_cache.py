@@ -0,0 +1,145 @@
+import hashlib
+import os
+import threading
+import wave
+from collections import OrderedDict
+from livekit import rtc
+
+TTS_CACHE_DIR = os.getenv('TTS_CACHE_DIR', '.tts_cache')
+# Spoken phrases kept in memory besides the pinned canned ones
+TTS_CACHE_MAX_DYNAMIC = int(os.getenv('TTS_CACHE_MAX_DYNAMIC', '32'))
+# Length of each frame played back from the cache
+FRAME_MS = 20
+
+
+class PhraseAudioCache:
+    """Synthesized speech for fixed phrases, kept as PCM frames.
+
+    Entries are keyed by the TTS settings (model, voice, speed, ...) and the
+    text, so changing the voice naturally misses old audio. Canned phrases are
+    pinned in memory and written to disk as WAV files, so only the first
+    process to start has to synthesize them. Other phrases are kept in a
+    small LRU.
+    """
+
+    def __init__(self, voice_key: str, directory: str = TTS_CACHE_DIR, max_dynamic: int = TTS_CACHE_MAX_DYNAMIC):
+        self.voice_key = voice_key
+        self.directory = directory
+        self.max_dynamic = max_dynamic
+        self._lock = threading.Lock()
+        self._pinned = {}
+        self._dynamic = OrderedDict()
+
+    def key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.voice_key}:{text}".encode('utf-8')).hexdigest()
+
+    def get(self, text: str):
+        """Return the cached frames for text, or None"""
+        key = self.key(text)
+        with self._lock:
+            frames = self._pinned.get(key)
+            if frames is None:
+                frames = self._dynamic.get(key)
+                if frames is not None:
+                    self._dynamic.move_to_end(key)
+        return frames
+
+    def put(self, text: str, frames: list, pin: bool = False):
+        key = self.key(text)
+        with self._lock:
+            if pin:
+                self._dynamic.pop(key, None)
+                self._pinned[key] = frames
+                return
+            self._dynamic[key] = frames
+            self._dynamic.move_to_end(key)
+            while len(self._dynamic) > self.max_dynamic:
+                self._dynamic.popitem(last=False)
+
+    def load(self, phrases: list) -> list:
+        """Pin phrases already rendered on disk; returns the ones still missing"""
+        missing = []
+        for text in phrases:
+            frames = self._read(self.key(text))
+            if frames is None:
+                missing.append(text)
+            else:
+                self.put(text, frames, pin=True)
+        return missing
+
+    async def render(self, tts, phrases: list):
+        """Synthesize phrases that are not on disk yet, then pin all of them"""
+        for text in self.load(phrases):
+            frames = [event.frame async for event in tts.synthesize(text)]
+            if not frames:
+                print(f"TTS returned no audio for cached phrase: {text[:40]}")
+                continue
+            self._write(self.key(text), frames)
+            self.put(text, frames, pin=True)
+
+    async def record(self, tts, text: str):
+        """Synthesize text, yielding frames as they arrive, and cache them once the phrase is complete.
+
+        Pass it to session.say(text, audio=...) so the audio played and the
+        audio cached come from one synthesis. An interrupted phrase is not cached.
+        """
+        frames = []
+        try:
+            async with tts.synthesize(text) as stream:
+                async for event in stream:
+                    frames.append(event.frame)
+                    yield event.frame
+        except Exception as e:
+            print(f"Error synthesizing TTS audio: {str(e)}")
+            return
+        if frames:
+            self.put(text, frames)
+
+    async def audio(self, text: str):
+        """Async iterator over the cached frames, for session.say(text, audio=...)"""
+        for frame in self.get(text) or []:
+            yield frame
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.wav")
+
+    def _read(self, key: str):
+        try:
+            with wave.open(self._path(key), 'rb') as f:
+                sample_rate = f.getframerate()
+                num_channels = f.getnchannels()
+                pcm = f.readframes(f.getnframes())
+        except (FileNotFoundError, wave.Error, EOFError):
+            return None
+        return split_frames(pcm, sample_rate, num_channels)
+
+    def _write(self, key: str, frames: list):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with wave.open(tmp_path, 'wb') as f:
+                f.setnchannels(frames[0].num_channels)
+                f.setsampwidth(2)
+                f.setframerate(frames[0].sample_rate)
+                for frame in frames:
+                    f.writeframes(bytes(frame.data))
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Error writing TTS cache entry: {str(e)}")
+
+
+def split_frames(pcm: bytes, sample_rate: int, num_channels: int) -> list:
+    """Cut 16-bit PCM into FRAME_MS audio frames"""
+    samples_per_frame = sample_rate * FRAME_MS // 1000
+    frame_bytes = samples_per_frame * num_channels * 2
+    frames = []
+    for start in range(0, len(pcm), frame_bytes):
+        chunk = pcm[start:start + frame_bytes]
+        frames.append(rtc.AudioFrame(
+            data=chunk,
+            sample_rate=sample_rate,
+            num_channels=num_channels,
+            samples_per_channel=len(chunk) // (2 * num_channels),
+        ))
+    return frames